@@ -20,8 +20,10 @@ Flask 后端服务
 import os
 import sys
 import json
+import time
 import uuid
 import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 
@@ -34,11 +36,20 @@ import requests
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # 导入后端服务
-from backend.services.converter import convert_markdown_to_wechat_html, extract_metadata, generate_custom_style_html
-from backend.services.cover_generator import generate_cover_image, generate_fallback_cover
-from backend.services.image_uploader import process_markdown_images, upload_image
+from backend.services.converter import convert_markdown_to_wechat_html, convert_markdown_body_html, compile_theme, wrap_wechat_html, extract_metadata, generate_custom_style_html, warmup_converter, conversion_cache_stats, convert_markdown_multi_theme, split_markdown_sections
+from backend.services.block_converter import convert_markdown_incremental, block_cache_stats, StreamingConverter
+from backend.services.code_highlight import highlight_cache_stats
+from backend.services.html_optimizer import optimize_wechat_html
+from backend.services.font_registry import scan_fonts, font_registry_stats
+from backend.services.custom_theme import get_cached_theme, get_custom_theme, theme_cache_stats
+from backend.services.cover_generator import generate_cover_image, generate_cover_hedged, get_cover_job, find_cached_cover
+from backend.services.cover_store import enforce_size_limit, remove_expired_files, cover_store_stats, EXCLUDED_DIRS
+from backend.services.image_uploader import process_markdown_images, upload_image, upload_to_imgbb
+from backend.services.upload_cache import upload_cache_stats, start_upload_cache_verifier
+from backend.services.image_normalizer import normalize_for_upload
 from backend.services.wechat_publisher import WeChatPublisher, get_access_token
-from backend.config import THEMES
+from backend.config import (THEMES, COVER_AI_DEADLINE, COVER_CACHE_MAX_MB, UPLOADS_MAX_MB, UPLOADS_MAX_AGE_HOURS,
+                            UPLOAD_NORMALIZE_DIR, UPLOAD_NORMALIZE_MAX_MB)
 
 # 加载 .env 文件
 def load_env_file():
@@ -212,7 +223,10 @@ PROMPT_DEFAULTS = {
     "blockquote_border": "#引用边框（与primary一致或灰色）",
     "blockquote_bg": "#引用背景（极浅色）",
     "font_family": "字体（优先系统字体，衬线用于深度阅读）",
-    "heading_style": "minimal/editorial/border-left/normal",
+    "heading_style": "minimal/editorial/border-left/underline/background/normal",
+    "blockquote_style": "border-left/center/card（引用样式）",
+    "list_bullet": "dot/square/none（列表圆点）",
+    "hr_style": "gradient/solid/dashed（分割线）",
     "paragraph_indent": false,
     "line_height": 2.0,
     "letter_spacing": 0.5
@@ -220,6 +234,7 @@ PROMPT_DEFAULTS = {
 
 注意：
 - heading_style 推荐 minimal（极简）或 editorial（社论风）
+- 装饰项（blockquote_style、list_bullet、hr_style）不确定时可省略
 - 背景色保持白或接近白，不要彩色背景
 - 配色要克制，宁可单调也不要花哨""",
 
@@ -325,31 +340,46 @@ USERS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 # ==================== 临时文件清理 ====================
-def cleanup_temp_files(max_age_hours: int = 24):
-    """清理超过指定小时数的临时文件"""
-    import time
-    now = time.time()
-    max_age_seconds = max_age_hours * 3600
-    cleaned = 0
-    
-    for temp_dir in [TEMP_DIR, UPLOADS_DIR]:
-        if not temp_dir.exists():
-            continue
-        for f in temp_dir.iterdir():
-            if f.is_file():
-                try:
-                    file_age = now - f.stat().st_mtime
-                    if file_age > max_age_seconds:
-                        f.unlink()
-                        cleaned += 1
-                except Exception:
-                    pass
-    
-    if cleaned > 0:
-        print(f"🧹 清理了 {cleaned} 个过期临时文件")
+def cleanup_temp_files():
+    """
+    上传目录删除超过保留时间的文件；临时目录（封面缓存）、规范化结果目录、上传目录
+    超过各自的大小上限时，删除最久未使用的文件
+    """
+    remove_expired_files(UPLOADS_DIR, UPLOADS_MAX_AGE_HOURS)
+    enforce_size_limit(UPLOADS_DIR, int(UPLOADS_MAX_MB * 1024 * 1024))
+    enforce_size_limit(TEMP_DIR, int(COVER_CACHE_MAX_MB * 1024 * 1024), exclude=EXCLUDED_DIRS)
+    enforce_size_limit(UPLOAD_NORMALIZE_DIR, int(UPLOAD_NORMALIZE_MAX_MB * 1024 * 1024))
 
 # 启动时清理临时文件
-cleanup_temp_files(24)
+cleanup_temp_files()
+
+
+# ==================== 转换器预热 ====================
+# gunicorn --preload 时在主进程执行，fork 出的 worker 以写时复制方式共享预热好的实例
+# CONVERTER_POOL_SIZE 建议与 gunicorn 的 --threads 一致
+def warmup_services():
+    """预建 Markdown 实例、编译主题样式表、扫描封面字体"""
+    import gc
+    try:
+        warmup_converter(int(os.environ.get('CONVERTER_POOL_SIZE', '2')))
+    except Exception as e:
+        print(f"Converter warmup failed (non-fatal): {e}")
+    try:
+        scan_fonts()
+    except Exception as e:
+        print(f"Font scan failed (non-fatal): {e}")
+    # 冻结启动期对象，避免 GC 扫描时写入对象头导致 fork 后的共享页被复制
+    gc.freeze()
+
+warmup_services()
+
+
+# ==================== 后台任务 ====================
+# gunicorn --preload 时主进程里启动的线程不会进入 fork 出的 worker，所以在 worker 收到第一个请求时启动
+@app.before_request
+def start_background_tasks():
+    """启动上传缓存的定期抽样校验（每个进程只启动一次）"""
+    start_upload_cache_verifier()
 
 
 # ==================== 用户管理 ====================
@@ -722,6 +752,16 @@ def convert_content():
     if not content:
         return jsonify({"error": "内容不能为空"}), 400
     
+    # 增量模式（实时预览）：只返回前端没有的块，前端按块 id 更新 DOM
+    if data.get('incremental'):
+        result = convert_markdown_incremental(content, theme, data.get('known_blocks'))
+        metadata = extract_metadata(content)
+        return jsonify({
+            **result,
+            "title": metadata["title"],
+            "summary": metadata["summary"]
+        })
+    
     html = convert_markdown_to_wechat_html(content, theme)
     metadata = extract_metadata(content)
     
@@ -732,6 +772,51 @@ def convert_content():
     })
 
 
+@app.route('/api/convert/batch', methods=['POST'])
+def convert_batch():
+    """一次解析，批量渲染多个主题（主题选择器预览）"""
+    data = request.json
+    content = data.get('content', '')
+    themes = data.get('themes') or list(THEMES.keys())
+    
+    if not content:
+        return jsonify({"error": "内容不能为空"}), 400
+    
+    unknown = [t for t in themes if t not in THEMES]
+    if unknown:
+        return jsonify({"error": f"未知主题: {', '.join(map(str, unknown))}"}), 400
+    
+    # BATCH_RENDER_PROCESSES > 1 时用进程池并行套用主题
+    html_by_theme = convert_markdown_multi_theme(content, themes)
+    metadata = extract_metadata(content)
+    
+    return jsonify({
+        "themes": html_by_theme,
+        "title": metadata["title"],
+        "summary": metadata["summary"]
+    })
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """缓存命中统计（需要登录）"""
+    if not (request.headers.get('X-User-Id') or session.get('user_id')):
+        return jsonify({"error": "请先登录"}), 401
+    return jsonify({
+        "conversion": conversion_cache_stats(),
+        "blocks": block_cache_stats(),
+        "code_highlight": highlight_cache_stats(),
+        "custom_themes": theme_cache_stats(),
+        "fonts": font_registry_stats(),
+        "covers": cover_store_stats(str(TEMP_DIR)),
+        "uploads": upload_cache_stats()
+    })
+
+
+# 自定义风格默认模式：theme | html（可被请求参数 mode 覆盖）
+CUSTOM_LAYOUT_MODE = os.environ.get('CUSTOM_LAYOUT_MODE', 'theme')
+
+
 @app.route('/api/convert-custom', methods=['POST'])
 def convert_custom():
     """使用自定义风格转换"""
@@ -756,11 +841,23 @@ def convert_custom():
         print(f"[DEBUG convert_custom] content_length: {len(content)}")
         print(f"[DEBUG convert_custom] iflow_api_key exists: {bool(api_key)}")
         
-        html = generate_custom_style_html(content, style_description, api_key)
+        # mode: theme（默认，LLM 只生成主题配置，本地渲染）| html（LLM 直接生成整篇 HTML）
+        mode = data.get('mode') or CUSTOM_LAYOUT_MODE
+        print(f"[DEBUG convert_custom] mode: {mode}")
+        
+        if mode == 'html':
+            html = generate_custom_style_html(content, style_description, api_key)
+            theme, cached = None, False
+        else:
+            result = render_custom_theme_html(content, style_description, api_key)
+            html, theme, cached = result["html"], result["theme"], result["cached"]
         metadata = extract_metadata(content)
         
         return jsonify({
             "html": html,
+            "mode": mode,
+            "theme": theme,
+            "theme_cached": cached,
             "title": metadata["title"],
             "summary": metadata["summary"]
         })
@@ -785,7 +882,7 @@ def parse_content():
         "title": metadata["title"],
         "summary": metadata["summary"],
         "images": metadata["images"],
-        "word_count": len(content)
+        "word_count": metadata["word_count"]
     })
 
 
@@ -801,10 +898,76 @@ def generate_cover():
     user_id = request.headers.get('X-User-Id')
     cfg = load_user_config(user_id)
     
-    # 判断逻辑：
-    # 1. 如果用户明确输入了封面描述（style），以用户输入为主
-    # 2. 如果没有输入，则用 AI 根据文章内容自动生成
+    output_dir = str(TEMP_DIR)
+    
+    # 检查并打印 POE API Key 状态
+    poe_key = cfg.get("poe_api_key", "")
+    if poe_key:
+        print(f"✓ 已配置 POE API Key: {poe_key[:10]}...")
+    else:
+        print("✗ 未配置 POE API Key，将使用 fallback 封面")
+    
+    # 封面缓存按请求内容（而不是 AI 改写后的提示词）计算，同样的请求直接返回已生成的封面
+    request_prompt = "\n".join([style.strip(), title, summary])
+    use_cache = not data.get('regenerate', False)
+    
+    def ai_cover():
+        if use_cache:
+            cached = find_cached_cover(request_prompt, theme, output_dir)
+            if cached:
+                cached["prompt"] = cached["metadata"].get("prompt", "")
+                return cached
+        # 提示词生成 + 绘图都在后台任务中，整体受截止时间约束
+        cover_prompt = build_cover_prompt(title, summary, style, cfg)
+        print(f"正在生成封面图，提示词: {cover_prompt[:50]}...")
+        result = generate_cover_image(title=cover_prompt, theme_name=theme, output_dir=output_dir, poe_api_key=poe_key,
+                                      cache_prompt=request_prompt, use_cache=False)
+        result["prompt"] = cover_prompt
+        if result["success"]:
+            print(f"✓ POE 生成封面成功: {result['file_path']}")
+        else:
+            print(f"✗ POE 生成封面失败: {result.get('error', '未知错误')}")
+        return result
+    
+    # 请求只能缩短截止时间，不能超过服务端配置
+    try:
+        deadline = min(float(data.get('deadline', COVER_AI_DEADLINE)), COVER_AI_DEADLINE)
+    except (TypeError, ValueError):
+        deadline = COVER_AI_DEADLINE
+    
+    # AI 封面与备用封面并行，超过截止时间先返回备用封面，AI 封面完成后可凭 job_id 取回
+    result = generate_cover_hedged(title, theme, output_dir, ai_task=ai_cover if poe_key else None,
+                                   deadline=deadline)
+    if not result["success"]:
+        return jsonify({"success": False, "error": result["error"]}), 500
     
+    filename = os.path.basename(result["file_path"])
+    response = {"success": True, "image_url": f"/api/cover/{filename}", "prompt": result.get("prompt", "")}
+    if result.get("method") != "ai":
+        response["fallback"] = True
+        response["job_id"] = result.get("job_id")
+    return jsonify(response)
+
+
+@app.route('/api/generate-cover/<job_id>', methods=['GET'])
+def get_cover_job_status(job_id):
+    """查询后台 AI 封面任务：pending / done（返回 image_url）/ failed / unknown"""
+    job = get_cover_job(job_id)
+    response = {"success": job["status"] == "done", "status": job["status"]}
+    if job["status"] == "done":
+        response["image_url"] = f"/api/cover/{os.path.basename(job['result']['file_path'])}"
+        response["prompt"] = job["result"].get("prompt", "")
+    elif job["error"]:
+        response["error"] = job["error"]
+    return jsonify(response), (404 if job["status"] == "unknown" else 200)
+
+
+def build_cover_prompt(title: str, summary: str, style: str, cfg: dict) -> str:
+    """
+    生成封面绘图提示词
+    1. 如果用户明确输入了封面描述（style），以用户输入为主
+    2. 如果没有输入，则用 AI 根据文章内容自动生成
+    """
     cover_prompt = ""
     
     # 用户明确输入了封面描述
@@ -897,54 +1060,43 @@ def generate_cover():
     else:
         cover_prompt = f"{title}，专业简约风格"
     
-    # 2. 调用绘图服务
-    output_dir = str(TEMP_DIR)
-    
-    # 检查并打印 POE API Key 状态
-    poe_key = cfg.get("poe_api_key", "")
-    if poe_key:
-        print(f"✓ 已配置 POE API Key: {poe_key[:10]}...")
-    else:
-        print("✗ 未配置 POE API Key，将使用 fallback 封面")
-    
-    print(f"正在生成封面图，提示词: {cover_prompt[:50]}...")
-    result = generate_cover_image(title=cover_prompt, theme_name=theme, output_dir=output_dir, poe_api_key=poe_key)
-    
-    if result["success"]:
-        print(f"✓ POE 生成封面成功: {result['file_path']}")
-        filename = os.path.basename(result["file_path"])
-        return jsonify({"success": True, "image_url": f"/api/cover/{filename}", "prompt": cover_prompt})
-    else:
-        print(f"✗ POE 生成封面失败: {result.get('error', '未知错误')}")
-        print("使用 fallback 封面...")
-        result = generate_fallback_cover(title, theme, output_dir)
-        if result["success"]:
-            filename = os.path.basename(result["file_path"])
-            return jsonify({"success": True, "image_url": f"/api/cover/{filename}", "prompt": cover_prompt, "fallback": True})
-        return jsonify({"success": False, "error": result["error"]}), 500
+    return cover_prompt
 
 
-def generate_custom_style_html(md_content: str, style_description: str, iflow_api_key: str = None) -> str:
-    """根据用户自定义风格描述，让 AI 直接生成完整的微信公众号 HTML"""
-    import openai
-    import re
-    
-    print(f"[DEBUG generate_custom_style_html] 开始处理, style: {style_description}")
-    print(f"[DEBUG generate_custom_style_html] 文章长度: {len(md_content)} 字符")
+def render_custom_theme_html(md_content: str, style_description: str, iflow_api_key: str = None) -> dict:
+    """
+    主题模式：LLM 只生成主题配置（按风格描述缓存），文章在本地渲染
     
-    # 用户配置优先，环境变量作为备选
+    耗时与文章长度无关，输出不会被 max_tokens 截断。
+    Returns: {"html": HTML, "theme": 主题配置（失败时为 None）, "cached": 是否命中主题缓存}
+    """
     api_key = iflow_api_key or os.environ.get("IFLOW_API_KEY")
-    
     if not api_key:
-        print("[DEBUG generate_custom_style_html] ❌ 无 API Key，使用默认主题")
-        return convert_markdown_to_wechat_html(md_content, "professional")
+        print("[DEBUG render_custom_theme_html] ❌ 无 API Key，使用默认主题")
+        return {"html": convert_markdown_to_wechat_html(md_content, "professional"), "theme": None, "cached": False}
     
     try:
-        # 使用 layout_html prompt（支持环境变量覆盖）
-        prompt_template = get_prompt('layout_html')
-        
-        if not prompt_template:
-            prompt_template = """你是顶级的微信公众号排版设计师。
+        result = get_custom_theme(style_description, api_key, get_prompt('layout'))
+    except Exception as e:
+        print(f"[DEBUG render_custom_theme_html] ❌ 主题生成失败: {e}")
+        return {"html": convert_markdown_to_wechat_html(md_content, "professional"), "theme": None, "cached": False}
+    
+    return {
+        "html": convert_markdown_to_wechat_html(md_content, result["theme"]),
+        "theme": result["theme"],
+        "cached": result["cached"]
+    }
+
+
+# ==================== 整篇 HTML 模式：按二级标题分节并发排版 ====================
+# 每节一次 LLM 调用，共享同一段风格前言（描述 + 主题配色）；
+# 超时或失败的节按同一主题本地渲染，整篇耗时约等于最慢的一节。
+# 每个请求使用自己的线程池：超时被放弃的调用不会占住下一个请求的 worker
+CUSTOM_LAYOUT_WORKERS = int(os.environ.get('CUSTOM_LAYOUT_WORKERS', '6'))
+CUSTOM_LAYOUT_DEADLINE = float(os.environ.get('CUSTOM_LAYOUT_DEADLINE', '60'))  # 整篇排版的截止时间（秒）
+CUSTOM_LAYOUT_RETRIES = 1  # 每节失败后的重试次数（截止时间内）
+
+DEFAULT_LAYOUT_HTML_PROMPT = """你是顶级的微信公众号排版设计师。
 
 ## 用户风格要求
 {style_description}
@@ -965,42 +1117,132 @@ def generate_custom_style_html(md_content: str, style_description: str, iflow_ap
 
 直接输出 HTML 代码："""
 
-        prompt = prompt_template.format(
-            style_description=style_description,
-            md_content=md_content
-        )
 
-        print(f"[DEBUG generate_custom_style_html] 🚀 正在调用 AI (iFlow) 生成完整 HTML...")
-        api_base = "https://apis.iflow.cn/v1"
-        model_name = "deepseek-v3"
+def _style_preamble(style_description: str, theme: dict) -> str:
+    """各节共享的风格前言：保证分节生成的配色、字体一致"""
+    if not theme:
+        return style_description
+    palette = {key: theme[key] for key in (
+        'primary_color', 'secondary_color', 'text_color', 'heading_color', 'link_color',
+        'code_bg', 'blockquote_border', 'blockquote_bg', 'font_family', 'line_height'
+    ) if key in theme}
+    return f"""{style_description}
+
+统一使用以下配色和字体（文章分节排版，所有部分必须保持一致）：
+{json.dumps(palette, ensure_ascii=False)}"""
+
+
+def _clean_ai_html(html_content: str) -> str:
+    """去掉可能的代码块标记，不像 HTML 时返回 None"""
+    import re
+    html_content = html_content.strip()
+    if html_content.startswith('```'):
+        html_content = re.sub(r'^```(?:html)?\s*\n?', '', html_content)
+        html_content = re.sub(r'\n?```\s*$', '', html_content)
+    return html_content if '<' in html_content and '>' in html_content else None
+
+
+def _layout_section(client, prompt: str, deadline: float, label: str):
+    """请求一节的 HTML，失败时在截止时间内重试；最终失败返回 None"""
+    model_name = "deepseek-v3"
+    messages = [{"role": "user", "content": prompt}]
+    for attempt in range(CUSTOM_LAYOUT_RETRIES + 1):
+        remaining = deadline - time.time()
+        if remaining < 5:
+            break
+        try:
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                max_tokens=4000,
+                timeout=remaining
+            )
+            html_content = _clean_ai_html(response.choices[0].message.content)
+            log_ai_call(f"/api/convert-custom [Full HTML {label}]", messages, (html_content or '')[:300] + "...", model=model_name)
+            if html_content:
+                return html_content
+            print(f"[DEBUG generate_custom_style_html] ⚠ {label} 返回内容不像 HTML（第 {attempt + 1} 次）")
+        except Exception as e:
+            print(f"[DEBUG generate_custom_style_html] ⚠ {label} 请求失败（第 {attempt + 1} 次）: {e}")
+    return None
+
+
+def generate_custom_style_html(md_content: str, style_description: str, iflow_api_key: str = None) -> str:
+    """根据用户自定义风格描述，让 AI 直接生成完整的微信公众号 HTML（长文按二级标题分节并发生成）"""
+    import openai
+    
+    print(f"[DEBUG generate_custom_style_html] 开始处理, style: {style_description}")
+    print(f"[DEBUG generate_custom_style_html] 文章长度: {len(md_content)} 字符")
+    
+    # 用户配置优先，环境变量作为备选
+    api_key = iflow_api_key or os.environ.get("IFLOW_API_KEY")
+    
+    if not api_key:
+        print("[DEBUG generate_custom_style_html] ❌ 无 API Key，使用默认主题")
+        return convert_markdown_to_wechat_html(md_content, "professional")
+    
+    # 同样的风格描述已有缓存的主题：跳过 LLM，直接本地渲染
+    layout_prompt = get_prompt('layout')
+    cached_theme = get_cached_theme(style_description, layout_prompt)
+    if cached_theme:
+        print(f"[DEBUG generate_custom_style_html] 🎨 主题缓存命中，本地渲染")
+        return convert_markdown_to_wechat_html(md_content, cached_theme)
+    
+    try:
+        # 使用 layout_html prompt（支持环境变量覆盖）
+        prompt_template = get_prompt('layout_html') or DEFAULT_LAYOUT_HTML_PROMPT
         
-        client = openai.OpenAI(api_key=api_key, base_url=api_base)
-        messages = [{"role": "user", "content": prompt}]
+        # 截止时间从这里开始计算，主题配置的 LLM 请求也计入
+        deadline = time.time() + CUSTOM_LAYOUT_DEADLINE
         
-        # 使用合理的超时和 token 限制
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            max_tokens=4000,  # 减少到4000，够用且更快
-            timeout=60  # 60秒超时
-        )
-        html_content = response.choices[0].message.content.strip()
+        # 风格前言：生成的主题配置写入缓存，下次相同描述直接本地渲染；本地降级渲染也使用这套主题
+        # 主题请求最多占用一半时间，留给分节排版
+        try:
+            theme = get_custom_theme(style_description, api_key, layout_prompt,
+                                     timeout=CUSTOM_LAYOUT_DEADLINE / 2)["theme"]
+        except Exception as e:
+            print(f"[DEBUG generate_custom_style_html] ⚠ 主题配置生成失败，仅使用风格描述: {e}")
+            theme = None
+        preamble = _style_preamble(style_description, theme)
         
-        log_ai_call("/api/convert-custom [Full HTML]", messages, html_content[:300] + "...", model=model_name)
-        print(f"[DEBUG generate_custom_style_html] ✅ AI 返回 HTML 长度: {len(html_content)}")
+        # 每节一个 worker，所有节在同一轮并发完成
+        sections = split_markdown_sections(md_content, max_sections=CUSTOM_LAYOUT_WORKERS)
+        print(f"[DEBUG generate_custom_style_html] 🚀 分 {len(sections)} 节并发调用 AI (iFlow) 生成 HTML...")
         
-        # 清理可能的代码块标记
-        if html_content.startswith('```'):
-            html_content = re.sub(r'^```(?:html)?\s*\n?', '', html_content)
-            html_content = re.sub(r'\n?```\s*$', '', html_content)
+        client = openai.OpenAI(api_key=api_key, base_url="https://apis.iflow.cn/v1")
+        executor = ThreadPoolExecutor(max_workers=max(1, len(sections)), thread_name_prefix='layout')
+        futures = []
+        for i, section in enumerate(sections):
+            section_style = preamble
+            if len(sections) > 1:
+                section_style += f"\n\n这是整篇文章的第 {i + 1}/{len(sections)} 部分，只输出这一部分的 HTML，不要添加全文外层容器。"
+            prompt = prompt_template.format(style_description=section_style, md_content=section)
+            futures.append(executor.submit(_layout_section, client, prompt, deadline, f"第 {i + 1} 节"))
         
-        # 验证返回的是有效 HTML
-        if '<' in html_content and '>' in html_content:
-            print(f"[DEBUG generate_custom_style_html] ✅ 生成成功")
-            return html_content
-        else:
-            print(f"[DEBUG generate_custom_style_html] ⚠ 返回内容不像 HTML，降级处理")
-            return convert_markdown_to_wechat_html(md_content, "professional")
+        done, _ = wait(futures, timeout=max(deadline - time.time(), 0) + 1)
+        # 不等待超时的节：其请求的超时时间不超过截止时间，结束后线程自行退出
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+        fragments = []
+        fallback_count = 0
+        for i, (section, future) in enumerate(zip(sections, futures)):
+            html_content = future.result() if future in done else None
+            if html_content is None:
+                # 超时或失败的节按同一主题本地渲染（只要正文，根容器在拼接后统一添加）
+                fallback_count += 1
+                html_content = convert_markdown_body_html(section, theme or "professional")
+            fragments.append(html_content)
+        
+        if fallback_count == len(sections):
+            print(f"[DEBUG generate_custom_style_html] ⚠ 全部分节失败，降级为本地渲染")
+        elif fallback_count:
+            print(f"[DEBUG generate_custom_style_html] ⚠ {fallback_count}/{len(sections)} 节超时或失败，已本地渲染")
+        
+        # 整篇只包一层主题根容器，AI 生成的部分也继承根容器的字体、字号、行高
+        body_html = wrap_wechat_html('\n'.join(fragments), compile_theme(theme or "professional"))
+        html_content, saved = optimize_wechat_html(body_html)
+        print(f"[DEBUG generate_custom_style_html] ✅ 生成成功，样式优化节省 {saved} 字节")
+        return html_content
         
     except Exception as e:
         print(f"[DEBUG generate_custom_style_html] ❌ 自定义风格生成失败: {e}")
@@ -1078,7 +1320,7 @@ def publish():
             print(f"获取 access_token 失败: {error_msg}")
             return jsonify({"error": f"获取 access_token 失败: {error_msg}"}), 500
         
-        publisher = WeChatPublisher(auto_token=False)
+        publisher = WeChatPublisher(auto_token=False, app_id=cfg["wechat_app_id"])
         publisher.access_token = token_result["access_token"]
         
         if not publisher.access_token:
@@ -1189,6 +1431,7 @@ def chat():
     data = request.json
     messages = data.get('messages', [])
     stream = data.get('stream', False)
+    stream_theme = data.get('stream_theme')  # 流式输出时同步渲染样式化预览（主题名）
     context = data.get('context', {})  # 前端传入的文章上下文
     use_react = data.get('use_react', True)  # 是否使用 ReAct 模式
     
@@ -1312,7 +1555,11 @@ def chat():
         if stream:
             def generate():
                 chunk_count = 0
+                # 边生成边排版：每个块闭合后立即推送样式化 HTML
+                preview = StreamingConverter(stream_theme) if stream_theme else None
                 try:
+                    if preview:
+                        yield f"data: {json.dumps({'preview_container': preview.container}, ensure_ascii=False)}\n\n"
                     gc.collect()  # 请求前清理内存
                     response = client.chat.completions.create(
                         model=model_name,
@@ -1325,6 +1572,9 @@ def chat():
                         if chunk.choices and chunk.choices[0].delta.content:
                             content = chunk.choices[0].delta.content
                             yield f"data: {json.dumps({'choices': [{'delta': {'content': content}}]}, ensure_ascii=False)}\n\n"
+                            if preview:
+                                for block in preview.feed(content):
+                                    yield f"data: {json.dumps({'preview_block': block}, ensure_ascii=False)}\n\n"
                             chunk_count += 1
                             # 每 50 个 chunk 做一次小垃圾回收
                             if chunk_count % 50 == 0:
@@ -1334,6 +1584,9 @@ def chat():
                     print(f"Stream error: {error_msg}")
                     yield f"data: {json.dumps({'error': error_msg}, ensure_ascii=False)}\n\n"
                 finally:
+                    if preview:
+                        for block in preview.finish():
+                            yield f"data: {json.dumps({'preview_block': block}, ensure_ascii=False)}\n\n"
                     yield "data: [DONE]\n\n"
                     gc.collect()  # 完成后清理内存
                 
@@ -1573,31 +1826,28 @@ def upload_image_file():
     if not cfg.get("imgbb_api_key"):
         return jsonify({"error": "请先配置 ImgBB API Key"}), 400
     
+    # 上传内容由 werkzeug 分块写入临时文件，规范化（缩小、去元数据、压缩）后从磁盘流式上传
+    # （同一图片命中上传缓存时不再发送）
+    suffix = Path(image_file.filename or '').suffix.lower() or '.png'
+    temp_path = TEMP_DIR / f"upload_{uuid.uuid4().hex}{suffix}"
     try:
-        import base64
-        import requests
-        
-        image_data = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        response = requests.post(
-            "https://api.imgbb.com/1/upload",
-            data={"key": cfg["imgbb_api_key"], "image": image_data},
-            timeout=30
-        )
-        
-        result = response.json()
+        image_file.save(str(temp_path))
+        normalized = normalize_for_upload(str(temp_path))
+        result = upload_to_imgbb(normalized["path"], api_key=cfg["imgbb_api_key"])
         
-        if result.get("success"):
+        if result["success"]:
             return jsonify({
                 "success": True,
-                "url": result["data"]["url"],
-                "display_url": result["data"]["display_url"]
+                "url": result["url"],
+                "display_url": result["display_url"]
             })
         else:
-            return jsonify({"error": "上传失败"}), 500
+            return jsonify({"error": result.get("error") or "上传失败"}), 500
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        temp_path.unlink(missing_ok=True)
 
 
 # ==================== 主入口 ====================
@@ -3,6 +3,8 @@
 注意：所有 API Key 都应该从用户配置或环境变量加载，不要硬编码！
 """
 
+import os
+
 # =============================================
 # Poe API 配置（用于 AI 生成封面图）
 # 从用户配置动态加载
@@ -15,6 +17,35 @@ POE_BASE_URL = "https://api.poe.com/v1"
 # =============================================
 IMGBB_API_KEY = ""  # 如需使用请让用户自行配置
 
+# 图片批量上传：线程池大小、每个图床的并发上限（"imgbb:4,wechat:2"）、失败重试次数和退避基数（秒）
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "8"))
+UPLOAD_DEFAULT_HOST_CONCURRENCY = int(os.environ.get("UPLOAD_DEFAULT_HOST_CONCURRENCY", "4"))
+UPLOAD_HOST_CONCURRENCY = {
+    host.strip(): int(limit)
+    for host, _, limit in (item.partition(':') for item in os.environ.get("UPLOAD_HOST_CONCURRENCY", "").split(','))
+    if host.strip() and limit.strip().isdigit()
+}
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", "2"))
+UPLOAD_RETRY_BACKOFF = float(os.environ.get("UPLOAD_RETRY_BACKOFF", "1.0"))
+# 上传缓存（图片内容哈希 -> 图床链接，SQLite）：条目上限、图床未给出过期时间时的有效期、后台抽样校验的条数和间隔（0 不校验）
+UPLOAD_CACHE_PATH = os.environ.get("UPLOAD_CACHE_PATH", "data/upload_cache.sqlite3")
+UPLOAD_CACHE_MAX_ENTRIES = int(os.environ.get("UPLOAD_CACHE_MAX_ENTRIES", "20000"))
+UPLOAD_CACHE_TTL_DAYS = float(os.environ.get("UPLOAD_CACHE_TTL_DAYS", "180"))
+UPLOAD_CACHE_VERIFY_SAMPLE = int(os.environ.get("UPLOAD_CACHE_VERIFY_SAMPLE", "20"))
+UPLOAD_CACHE_VERIFY_INTERVAL_HOURS = float(os.environ.get("UPLOAD_CACHE_VERIFY_INTERVAL_HOURS", "24"))
+# 上传前图片规范化：限制尺寸、应用 EXIF 方向后去掉元数据、转成 JPEG / PNG、按字节预算压缩
+# 公众号正文图片只支持 jpg/png 且小于 1MB；最大高度用于限制长截图
+UPLOAD_MAX_WIDTH = int(os.environ.get("UPLOAD_MAX_WIDTH", "1080"))
+UPLOAD_MAX_HEIGHT = int(os.environ.get("UPLOAD_MAX_HEIGHT", "8000"))
+UPLOAD_MAX_KB = int(os.environ.get("UPLOAD_MAX_KB", "1000"))
+UPLOAD_MIN_SSIM = float(os.environ.get("UPLOAD_MIN_SSIM", "0.985"))
+UPLOAD_NORMALIZE_DIR = os.environ.get("UPLOAD_NORMALIZE_DIR", "data/temp/normalized")
+# 规范化在进程池里执行（图片解码 / 编码不占用请求线程的 GIL）
+UPLOAD_NORMALIZE_WORKERS = int(os.environ.get("UPLOAD_NORMALIZE_WORKERS", "2"))
+UPLOAD_NORMALIZE_TIMEOUT = float(os.environ.get("UPLOAD_NORMALIZE_TIMEOUT", "60"))  # 秒
+# 规范化结果目录的大小上限（MB），超出时删除最久未使用的文件（不计入封面目录的上限）
+UPLOAD_NORMALIZE_MAX_MB = float(os.environ.get("UPLOAD_NORMALIZE_MAX_MB", "200"))
+
 # =============================================
 # 微信公众号 API 配置（从用户配置加载）
 # =============================================
@@ -25,6 +56,47 @@ WECHAT_APP_SECRET = ""  # 从用户配置动态加载
 WECHAT_API_URL = ""  # 例如：https://wx.limyai.com/api/openapi/wechat-accounts
 WECHAT_API_KEY = ""  # 你的微信 API Key
 
+# =============================================
+# Markdown 渲染后端（环境变量可覆盖）
+# =============================================
+# python-markdown（默认）| markdown-it（需安装 markdown-it-py，CommonMark，更快）
+MARKDOWN_ENGINE = os.environ.get("MARKDOWN_ENGINE", "python-markdown")
+# BeautifulSoup 解析器：html.parser（默认）| lxml（需安装 lxml，更快）
+HTML_TREE_PARSER = os.environ.get("HTML_TREE_PARSER", "html.parser")
+# 多主题批量渲染的进程数：大于 1 时用进程池并行套用主题（内存充足时再开启）
+BATCH_RENDER_PROCESSES = int(os.environ.get("BATCH_RENDER_PROCESSES", "0"))
+
+# =============================================
+# AI 自定义主题缓存（相同风格描述不再重复调用 LLM）
+# =============================================
+THEME_CACHE_DIR = os.environ.get("THEME_CACHE_DIR", "data/theme_cache")
+THEME_CACHE_MAX_ENTRIES = int(os.environ.get("THEME_CACHE_MAX_ENTRIES", "500"))
+THEME_CACHE_TTL_DAYS = float(os.environ.get("THEME_CACHE_TTL_DAYS", "30"))
+
+# =============================================
+# 封面字体（启动时扫描系统字体目录）
+# =============================================
+# 额外的字体目录，多个用系统路径分隔符（; 或 :）分隔，优先于系统目录
+FONT_DIRS = [p for p in os.environ.get("FONT_DIRS", "").split(os.pathsep) if p]
+
+# =============================================
+# 封面生成：AI 封面与本地备用封面并行，超过截止时间先返回备用封面
+# =============================================
+COVER_AI_DEADLINE = float(os.environ.get("COVER_AI_DEADLINE", "20"))  # 秒
+COVER_AI_WORKERS = int(os.environ.get("COVER_AI_WORKERS", "4"))
+# 后台 AI 封面任务结果保留时间（秒），过期后无法再取回
+COVER_JOB_TTL = int(os.environ.get("COVER_JOB_TTL", "3600"))
+# 封面 / 临时文件目录的大小上限（MB），超出时删除最久未使用的文件
+COVER_CACHE_MAX_MB = float(os.environ.get("COVER_CACHE_MAX_MB", "500"))
+# 用户上传目录：超过保留时间（小时）的文件删除，总大小另有上限
+UPLOADS_MAX_AGE_HOURS = float(os.environ.get("UPLOADS_MAX_AGE_HOURS", "24"))
+UPLOADS_MAX_MB = float(os.environ.get("UPLOADS_MAX_MB", "500"))
+# AI 封面原图下载大小上限（MB）
+COVER_DOWNLOAD_MAX_MB = float(os.environ.get("COVER_DOWNLOAD_MAX_MB", "20"))
+# 封面编码：文件大小预算（KB）和与原图的最低 SSIM（亮度），在两者约束下选择 JPEG / PNG 和 JPEG 质量
+COVER_MAX_KB = int(os.environ.get("COVER_MAX_KB", "200"))
+COVER_MIN_SSIM = float(os.environ.get("COVER_MIN_SSIM", "0.985"))
+
 # =============================================
 # 主题风格配置 - 差异化设计
 # =============================================
@@ -153,6 +225,7 @@ THEMES = {
         "heading_style": "background",
         "paragraph_indent": False,
         "line_height": 1.7,
+        "cover_gradient": "diagonal",  # 备用封面渐变方向：vertical（默认）/ diagonal
     },
     
     # ========== 文艺/生活类 ==========
@@ -345,7 +418,8 @@ THEMES = {
         "heading_style": "futuristic",  # 新增
         "paragraph_indent": False,
         "line_height": 1.7,
-        "decorative": True
+        "decorative": True,
+        "cover_gradient": "diagonal",
     },
     
     "magazine": {
@@ -0,0 +1,328 @@
+"""
+分块增量转换器
+将 Markdown 按顶层块（段落、代码块、表格、列表……）拆分，逐块转换并缓存，
+实时预览时只重新渲染有变化的块
+"""
+
+import re
+import hashlib
+from collections import Counter
+
+from markdown.extensions.toc import unique as toc_unique
+
+from backend.services.converter import (
+    CONVERTER_VERSION,
+    apply_wechat_styles,
+    compile_theme,
+    optimize_tree_styles,
+    parse_html_tree,
+    preprocess_markdown_tables,
+    render_markdown,
+    root_inherited_context,
+    theme_fingerprint,
+    tree_to_html,
+    wrap_wechat_html,
+)
+from backend.utils.cache import LRUCache, content_hash
+
+# 单块渲染结果缓存：(块哈希, 主题指纹, 斑马纹奇偶, 转换器版本) -> 渲染结果
+BLOCK_CACHE_MAX_BYTES = 8 * 1024 * 1024
+_block_cache = LRUCache(BLOCK_CACHE_MAX_BYTES)
+
+HEADING_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+_FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+_LIST_ITEM_RE = re.compile(r'^ {0,3}(?:[*+-]|\d+[.)])\s', re.M)
+_HTML_OPEN_RE = re.compile(r'^<([a-zA-Z][a-zA-Z0-9]*)')
+_TABLE_RULE_RE = re.compile(r'^\|?[\s\-:|]+\|?$')
+# 引用式链接、脚注、缩写、[TOC] 会跨块引用，出现时整篇作为一个块
+_CROSS_BLOCK_RE = re.compile(r'^ {0,3}\*?\[[^\]]+\]:|^\s*\[TOC\]\s*$', re.M)
+
+
+def split_markdown_blocks(md_content: str) -> list[str]:
+    """
+    将 Markdown 拆分为可以独立转换的顶层块
+    
+    按空行切分后，再把属于同一结构的片段合并回去：
+    围栏代码块内的空行、松散列表、连续引用、缩进续行、定义列表、跨空行的 HTML 块。
+    合并只会让块变大，不会改变转换结果。
+    """
+    if _CROSS_BLOCK_RE.search(md_content):
+        return [md_content] if md_content.strip() else []
+    
+    # 第一步：按空行切分（围栏代码块内部不切）
+    chunks = []
+    current = []
+    fence = None
+    for line in md_content.split('\n'):
+        if fence:
+            current.append(line)
+            if line.strip().startswith(fence) and not line.strip().strip(fence[0]):
+                fence = None
+            continue
+        
+        m = _FENCE_RE.match(line)
+        if m:
+            fence = m.group(1)
+            current.append(line)
+        elif line.strip():
+            current.append(line)
+        elif current:
+            chunks.append('\n'.join(current))
+            current = []
+    if current:
+        chunks.append('\n'.join(current))
+    
+    # 第二步：合并属于同一结构的片段
+    blocks = []
+    open_html_tag = None
+    for chunk in chunks:
+        if blocks and (open_html_tag or _continues_block(blocks[-1], chunk)):
+            blocks[-1] += '\n\n' + chunk
+        else:
+            blocks.append(chunk)
+        
+        # 未闭合的 HTML 块会吞掉后续空行
+        block = blocks[-1]
+        m = _HTML_OPEN_RE.match(block)
+        open_html_tag = m.group(1) if m and f'</{m.group(1)}' not in block else None
+    
+    return blocks
+
+
+def _continues_block(previous: str, chunk: str) -> bool:
+    """chunk 是否是上一个块的延续"""
+    first = chunk[0]
+    if first in ' \t':
+        return True  # 缩进续行（列表项内容、缩进代码）
+    if first == '>' and previous.startswith('>'):
+        return True  # 被空行隔开的引用会合并为同一个引用块
+    if chunk.startswith(': ') or chunk.startswith(':\t'):
+        return True  # 定义列表的定义部分
+    if _LIST_ITEM_RE.match(chunk) and _LIST_ITEM_RE.search(previous):
+        return True  # 松散列表
+    if _is_table_line(chunk.split('\n', 1)[0]) and _is_table_line(previous.rsplit('\n', 1)[-1]):
+        return True  # 表格行之间的空行（与 preprocess_markdown_tables 的判断一致）
+    return False
+
+
+def _is_table_line(line: str) -> bool:
+    stripped = line.strip()
+    return bool(stripped) and (stripped.startswith('|') or stripped.endswith('|') or _TABLE_RULE_RE.match(stripped))
+
+
+def _render_block(block_md: str, sheet, tr_parity: int) -> dict:
+    """转换并套用样式（单个块）"""
+    soup = parse_html_tree(render_markdown(block_md))
+    tr_count = apply_wechat_styles(soup, sheet, tr_parity)
+    optimize_tree_styles(soup, root_inherited_context(sheet['root_open']))
+    heading_ids = [h['id'] for h in soup.find_all(HEADING_TAGS, id=True)]
+    return {"html": tree_to_html(soup), "heading_ids": heading_ids, "tr_count": tr_count}
+
+
+def _rename_heading_ids(html: str, new_ids: list[str]) -> str:
+    """按出现顺序替换标题 id（与全文转换时目录 id 去重保持一致）"""
+    soup = parse_html_tree(html)
+    for heading, new_id in zip(soup.find_all(HEADING_TAGS, id=True), new_ids):
+        heading['id'] = new_id
+    return tree_to_html(soup)
+
+
+class _BlockAssembler:
+    """按文档顺序逐块转换，维护跨块状态（斑马纹行号、标题 id 去重、块 id）"""
+    
+    def __init__(self, theme_name="professional"):
+        self.sheet = compile_theme(theme_name)
+        self.fingerprint = theme_fingerprint(theme_name)
+        self.used_ids = set()
+        self.tr_offset = 0
+        self.occurrences = Counter()
+    
+    def add(self, block_md: str) -> dict:
+        """转换一个块，返回 {"id": 块 id, "html": 块 HTML}"""
+        tr_parity = self.tr_offset % 2
+        key = ('block', content_hash(block_md), self.fingerprint, tr_parity, CONVERTER_VERSION)
+        rendered = _block_cache.get(key)
+        if rendered is None:
+            rendered = _render_block(block_md, self.sheet, tr_parity)
+            _block_cache.set(key, rendered, size=len(rendered["html"]) + 64)
+        self.tr_offset += rendered["tr_count"]
+        
+        html = rendered["html"]
+        new_ids = [toc_unique(heading_id, self.used_ids) for heading_id in rendered["heading_ids"]]
+        if new_ids != rendered["heading_ids"]:
+            html = _rename_heading_ids(html, new_ids)
+        
+        digest = hashlib.sha1(repr((key, new_ids)).encode('utf-8')).hexdigest()[:12]
+        self.occurrences[digest] += 1
+        count = self.occurrences[digest]
+        block_id = f"wb-{digest}" if count == 1 else f"wb-{digest}-{count}"
+        return {"id": block_id, "html": html}
+
+
+def convert_markdown_blocks(md_content: str, theme_name="professional") -> list[dict]:
+    """
+    分块转换 Markdown，返回 [{"id": 块 id, "html": 块 HTML}, ...]
+    
+    块 id 由块内容、主题和跨块状态决定：内容不变的块 id 不变，前端可据此增量更新 DOM。
+    跨块状态：表格斑马纹按全文行号计算；标题 id 在全文范围内去重。
+    """
+    assembler = _BlockAssembler(theme_name)
+    return [assembler.add(block_md)
+            for block_md in split_markdown_blocks(preprocess_markdown_tables(md_content))]
+
+
+def convert_markdown_incremental(md_content: str, theme_name="professional",
+                                 known_ids=None) -> dict:
+    """
+    增量转换（实时预览）
+    
+    Args:
+        md_content: Markdown 内容
+        theme_name: 主题名或自定义主题字典
+        known_ids: 前端已有的块 id，这些块只返回 id，不再返回 HTML
+    
+    Returns:
+        {"blocks": [{"id", "html"?}], "changed": [新块 id], "container_open": str, "container_close": str}
+    """
+    known = set(known_ids or [])
+    sheet = compile_theme(theme_name)
+    
+    blocks = []
+    changed = []
+    for block in convert_markdown_blocks(md_content, theme_name):
+        if block["id"] in known:
+            blocks.append({"id": block["id"]})
+        else:
+            blocks.append(block)
+            changed.append(block["id"])
+    
+    return {
+        "blocks": blocks,
+        "changed": changed,
+        "container_open": sheet['root_open'],
+        "container_close": sheet['root_close'],
+    }
+
+
+def render_blocks_html(blocks: list[dict], theme_name="professional") -> str:
+    """将分块结果拼成完整的公众号 HTML"""
+    return wrap_wechat_html('\n'.join(block["html"] for block in blocks), compile_theme(theme_name))
+
+
+def block_cache_stats() -> dict:
+    """分块缓存的命中/未命中/淘汰统计"""
+    return _block_cache.stats()
+
+
+class StreamingConverter:
+    """
+    流式转换器：边接收 LLM 输出的 Markdown 片段，边输出已闭合块的样式化 HTML
+    
+    只缓冲当前未闭合的块，已输出的块不会重新渲染。
+    流式场景下无法预知后文，引用式链接、脚注按块内内容渲染。
+    
+    用法:
+        converter = StreamingConverter("professional")
+        for chunk in token_stream:
+            for block in converter.feed(chunk):
+                ...  # {"id": 块 id, "html": 块 HTML}
+        for block in converter.finish():
+            ...
+    """
+    
+    def __init__(self, theme_name="professional", max_block_chars: int = 64 * 1024):
+        """
+        Args:
+            theme_name: 主题名或自定义主题字典
+            max_block_chars: 单个未闭合块（以及未换行的一行）的最大缓冲字符数，超出时强制输出，保证内存有上界；
+                代码块超出时先补上结束围栏输出，下一块重新打开同样的围栏；超长的一行按此长度断开
+        """
+        self.max_block_chars = max_block_chars
+        self._assembler = _BlockAssembler(theme_name)
+        self._partial_line = ''
+        self._block_lines = []  # 当前未闭合块的行
+        self._block_chars = 0
+        self._blank_pending = False  # 当前块后面是否出现了空行
+        self._fence = None
+        self._fence_open = None  # 当前代码块的开始围栏行（拆分代码块时重新打开）
+    
+    @property
+    def container(self) -> dict:
+        """根容器的起止标签，前端把块依次插入其中"""
+        sheet = self._assembler.sheet
+        return {"open": sheet['root_open'], "close": sheet['root_close']}
+    
+    def feed(self, chunk: str) -> list[dict]:
+        """接收一段 Markdown 文本，返回其间闭合的块"""
+        emitted = []
+        lines = (self._partial_line + chunk).split('\n')
+        self._partial_line = lines.pop()  # 最后一行可能尚未完整
+        for line in lines:
+            self._feed_line(line, emitted)
+        # 一直不换行的输出：按上限断开，不无限缓冲
+        while len(self._partial_line) > self.max_block_chars:
+            self._feed_line(self._partial_line[:self.max_block_chars], emitted)
+            self._partial_line = self._partial_line[self.max_block_chars:]
+        return emitted
+    
+    def finish(self) -> list[dict]:
+        """输入结束，输出剩余内容"""
+        emitted = []
+        if self._partial_line:
+            self._feed_line(self._partial_line, emitted)
+            self._partial_line = ''
+        if self._fence:
+            self._append(self._fence)  # 输出在代码块中途结束：补上结束围栏
+            self._fence = None
+        self._flush(emitted)
+        return emitted
+    
+    def _feed_line(self, line: str, emitted: list) -> None:
+        if self._fence:
+            self._append(line)
+            if line.strip().startswith(self._fence) and not line.strip().strip(self._fence[0]):
+                self._fence = None
+            elif self._block_chars > self.max_block_chars:
+                # 超长（或未闭合）的代码块：补上结束围栏输出，下一块重新打开
+                self._append(self._fence)
+                self._flush(emitted)
+                self._append(self._fence_open)
+            return
+        
+        if not line.strip():
+            if self._block_lines:
+                self._blank_pending = True
+            return
+        
+        # 空行之后的新片段：不属于当前块则当前块已闭合
+        if self._blank_pending:
+            block = '\n'.join(self._block_lines)
+            m = _HTML_OPEN_RE.match(block)
+            html_open = m and f'</{m.group(1)}' not in block
+            if html_open or _continues_block(block, line):
+                self._append('')
+            else:
+                self._flush(emitted)
+            self._blank_pending = False
+        
+        m = _FENCE_RE.match(line)
+        if m:
+            self._fence = m.group(1)
+            self._fence_open = line.lstrip()
+        self._append(line)
+        
+        if self._block_chars > self.max_block_chars and not self._fence:
+            self._flush(emitted)
+    
+    def _append(self, line: str) -> None:
+        self._block_lines.append(line)
+        self._block_chars += len(line) + 1
+    
+    def _flush(self, emitted: list) -> None:
+        if self._block_lines:
+            block_md = preprocess_markdown_tables('\n'.join(self._block_lines))
+            emitted.append(self._assembler.add(block_md))
+        self._block_lines = []
+        self._block_chars = 0
+        self._blank_pending = False
@@ -0,0 +1,111 @@
+"""
+代码块高亮
+使用 Pygments 输出内联样式（公众号会过滤 class，基于 class 的高亮发布后会丢失颜色），
+高亮结果按 (代码哈希, 语言, 配色) 缓存
+"""
+
+import re
+import threading
+
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.lexers.special import TextLexer
+from pygments.util import ClassNotFound
+
+from backend.services.html_optimizer import minify_style_attributes
+from backend.utils.cache import LRUCache, content_hash
+
+# 高亮结果缓存：(代码哈希, 语言, 配色) -> 内联样式 HTML
+HIGHLIGHT_CACHE_MAX_BYTES = 4 * 1024 * 1024
+_highlight_cache = LRUCache(HIGHLIGHT_CACHE_MAX_BYTES)
+
+# 浅色 / 深色代码背景默认使用的 Pygments 配色
+LIGHT_CODE_STYLE = 'default'
+DARK_CODE_STYLE = 'monokai'
+
+# 预加载的常用语言
+PRELOAD_LANGUAGES = [
+    'python', 'javascript', 'typescript', 'java', 'go', 'rust', 'c', 'cpp', 'csharp',
+    'bash', 'shell', 'sql', 'json', 'yaml', 'html', 'css', 'xml', 'markdown', 'diff',
+    'kotlin', 'swift', 'php', 'ruby',
+]
+
+# 只包着空白的着色 span（如 Pygments 的 Whitespace 记号）不影响显示
+_WHITESPACE_SPAN_RE = re.compile(r'<span style="[^"]*">(\s+)</span>')
+
+_lexers = {}
+_formatters = {}
+_lock = threading.Lock()
+
+
+def code_style_for_background(code_bg: str) -> str:
+    """根据代码块背景色的亮度选择配色（无法解析的颜色按浅色处理）"""
+    value = (code_bg or '').strip().lstrip('#')
+    if len(value) == 3:
+        value = ''.join(c * 2 for c in value)
+    try:
+        r, g, b = (int(value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        return LIGHT_CODE_STYLE
+    luminance = 0.299 * r + 0.587 * g + 0.114 * b
+    return DARK_CODE_STYLE if luminance < 128 else LIGHT_CODE_STYLE
+
+
+def _get_lexer(lang: str):
+    """按语言名获取词法分析器（实例复用），未知语言按纯文本处理"""
+    lang = (lang or '').lower()
+    lexer = _lexers.get(lang)
+    if lexer is None:
+        try:
+            lexer = get_lexer_by_name(lang, stripnl=False) if lang else TextLexer(stripnl=False)
+        except ClassNotFound:
+            lexer = TextLexer(stripnl=False)
+        with _lock:
+            lexer = _lexers.setdefault(lang, lexer)
+    return lexer
+
+
+def _get_formatter(style: str) -> HtmlFormatter:
+    formatter = _formatters.get(style)
+    if formatter is None:
+        try:
+            formatter = HtmlFormatter(style=style, noclasses=True, nowrap=True)
+        except ClassNotFound:
+            formatter = HtmlFormatter(style=LIGHT_CODE_STYLE, noclasses=True, nowrap=True)
+        with _lock:
+            formatter = _formatters.setdefault(style, formatter)
+    return formatter
+
+
+def highlight_code(code: str, lang: str = None, style: str = LIGHT_CODE_STYLE) -> str:
+    """
+    高亮代码，返回带内联样式的 <span> 片段（不含外层 pre/code）
+
+    Args:
+        code: 代码原文
+        lang: 语言名，未知或为空时按纯文本处理
+        style: Pygments 配色名
+    """
+    key = (content_hash(code), (lang or '').lower(), style)
+    html = _highlight_cache.get(key)
+    if html is None:
+        html = highlight(code, _get_lexer(lang), _get_formatter(style))
+        html = minify_style_attributes(_WHITESPACE_SPAN_RE.sub(r'\1', html))
+        _highlight_cache.set(key, html)
+    return html
+
+
+def preload_lexers(languages=None, styles=(LIGHT_CODE_STYLE, DARK_CODE_STYLE)) -> None:
+    """预加载常用语言的词法分析器和配色（Pygments 首次加载某个语言需要导入模块、编译正则）"""
+    for lang in languages or PRELOAD_LANGUAGES:
+        lexer = _get_lexer(lang)
+        # 词法规则在第一次分析时才编译
+        list(lexer.get_tokens('x'))
+    for style in styles:
+        _get_formatter(style)
+
+
+def highlight_cache_stats() -> dict:
+    """高亮缓存的命中/未命中/淘汰统计"""
+    return _highlight_cache.stats()
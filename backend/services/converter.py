@@ -4,9 +4,40 @@ Markdown 转 HTML 转换器
 """
 
 import re
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import repeat
+from types import MappingProxyType
+from typing import Mapping
+
 import markdown
-from bs4 import BeautifulSoup
-from backend.config import THEMES
+from bs4 import BeautifulSoup, NavigableString, Tag
+from markdown.extensions.codehilite import CodeHilite, CodeHiliteExtension
+from markdown.extensions.toc import slugify, unique
+from backend.config import THEMES, MARKDOWN_ENGINE, HTML_TREE_PARSER, BATCH_RENDER_PROCESSES
+from backend.services.code_highlight import code_style_for_background, highlight_code, preload_lexers
+from backend.services.html_optimizer import inherited_context, minify_style_attributes, optimize_tree_styles
+from backend.utils.cache import LRUCache, content_hash
+from backend.utils.process_pool import SpawnProcessPool
+
+# 转换器版本：输出 HTML 有变化时递增，使旧缓存失效
+CONVERTER_VERSION = 3
+
+# 转换结果缓存：(类型, 内容哈希, 主题指纹, 转换器版本) -> 结果
+CONVERSION_CACHE_MAX_BYTES = 16 * 1024 * 1024
+_conversion_cache = LRUCache(CONVERSION_CACHE_MAX_BYTES)
+
+
+# 预编译的正则（预处理、元数据提取共用）
+_TABLE_RULE_RE = re.compile(r'^\|?[\s\-:|]+\|?$')
+_IMAGE_URL_RE = re.compile(r'!\[.*?\]\((.*?)\)')
+_SUMMARY_IMAGE_RE = re.compile(r'!\[.*?\]\(.*?\)')
+_SUMMARY_LINK_RE = re.compile(r'\[([^\]]+)\]\([^\)]+\)')
+_SUMMARY_MARK_RE = re.compile(r'[#*`_~>\-]')
+_WHITESPACE_RE = re.compile(r'\s+')
 
 
 def extract_title_from_markdown(md_content: str) -> tuple[str, str]:
@@ -14,40 +45,71 @@ def extract_title_from_markdown(md_content: str) -> tuple[str, str]:
     从 Markdown 内容中提取标题
     返回 (标题, 去除标题后的内容)
     """
-    lines = md_content.strip().split('\n')
-    title = ""
-    content_start = 0
-    
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        if stripped.startswith('# ') and not stripped.startswith('## '):
-            title = stripped[2:].strip()
-            content_start = i + 1
-            break
-    
-    if not title:
-        for i, line in enumerate(lines):
-            if line.strip():
-                title = line.strip().lstrip('#').strip()
-                content_start = i + 1
-                break
-    
-    remaining_content = '\n'.join(lines[content_start:]).strip()
-    return title, remaining_content
+    scan = scan_markdown(md_content)
+    return scan["title"], scan["content"]
+
+
+def _clean_summary_text(text: str) -> str:
+    """去掉图片、链接语法和 Markdown 标记，压缩空白"""
+    text = _SUMMARY_IMAGE_RE.sub('', text)
+    text = _SUMMARY_LINK_RE.sub(r'\1', text)
+    text = _SUMMARY_MARK_RE.sub('', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
 
 
 def extract_summary(md_content: str, max_length: int = 120) -> str:
     """从 Markdown 内容中提取摘要"""
-    text = re.sub(r'!\[.*?\]\(.*?\)', '', md_content)
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-    text = re.sub(r'[#*`_~>\-]', '', text)
-    text = re.sub(r'\n+', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
+    builder = _SummaryBuilder(max_length)
+    for line in md_content.split('\n'):
+        if builder.done:
+            break
+        builder.add_line(line)
+    return builder.result()
+
+
+class _SummaryBuilder:
+    """
+    按段落增量生成摘要，凑够 max_length 个字符后不再处理后续内容
+    
+    与整篇清理的差别：链接 / 图片的方括号或地址跨空行时（Markdown 也不把它渲染为链接），
+    整篇清理的链接正则会跨段匹配并只保留文字，逐段清理则保留原样的语法。段内换行不受影响。
+    """
+    
+    def __init__(self, max_length: int = 120):
+        self.max_length = max_length
+        self.parts = []
+        self.length = 0
+        self.paragraph = []
+        self.done = False
     
-    if len(text) > max_length:
-        text = text[:max_length] + '...'
+    def add_line(self, line: str) -> None:
+        if line.strip():
+            self.paragraph.append(line)
+        else:
+            self._flush()
+    
+    def _flush(self) -> None:
+        if self.paragraph:
+            cleaned = _clean_summary_text('\n'.join(self.paragraph))
+            self.paragraph = []
+            if cleaned:
+                self.parts.append(cleaned)
+                self.length += len(cleaned) + 1
+        # 已超过最大长度，后续内容不影响截断结果
+        if self.length > self.max_length + 1:
+            self.done = True
     
-    return text
+    def result(self) -> str:
+        self._flush()
+        text = ' '.join(self.parts)
+        if len(text) > self.max_length:
+            text = text[:self.max_length] + '...'
+        return text
+
+
+def _is_table_line(stripped: str) -> bool:
+    """检测表格行（以 | 开头或结尾，或是分隔行）"""
+    return stripped.startswith('|') or stripped.endswith('|') or _TABLE_RULE_RE.match(stripped) is not None
 
 
 def preprocess_markdown_tables(md_content: str) -> str:
@@ -55,95 +117,243 @@ def preprocess_markdown_tables(md_content: str) -> str:
     预处理 Markdown 内容，修复表格格式问题
     主要解决：表格行之间有空行导致无法正确解析的问题
     """
-    lines = md_content.split('\n')
+    return scan_markdown(md_content, with_metadata=False)["normalized"]
+
+
+def scan_markdown(md_content: str, max_summary_length: int = 120, with_metadata: bool = True) -> dict:
+    """
+    单次扫描 Markdown，同时完成表格预处理和元数据提取
+    
+    Returns:
+        {
+            "normalized": 修复表格后的 Markdown（供转换器使用）,
+            "title": 标题（第一个一级标题，没有则取第一行）,
+            "content": 去除标题后的内容,
+            "summary": 摘要,
+            "images": 图片地址列表,
+            "word_count": 字数
+        }
+        with_metadata=False 时只返回 normalized
+    """
     result = []
     in_table = False
     table_lines = []
+    has_table = False
+    
+    images = []
+    first_title = None  # 第一行非空内容（没有一级标题时作为标题）
+    first_end = 0
+    h1_title = None
+    h1_end = 0
+    summary = _SummaryBuilder(max_summary_length) if with_metadata else None
+    offset = 0
     
-    for line in lines:
+    for line in md_content.split('\n'):
+        line_end = offset + len(line) + 1
+        offset = line_end
         stripped = line.strip()
         
-        # 检测表格行（以 | 开头或结尾）
-        is_table_line = stripped.startswith('|') or stripped.endswith('|') or re.match(r'^\|?[\s\-:|]+\|?$', stripped)
-        
-        if is_table_line and stripped:
-            if not in_table:
-                in_table = True
+        # ==================== 表格预处理 ====================
+        if stripped and _is_table_line(stripped):
+            in_table = has_table = True
             table_lines.append(line)
         elif in_table:
-            if not stripped:
-                # 空行，可能是表格内的空行，先跳过
-                continue
-            else:
+            if stripped:
                 # 非表格行，输出之前积累的表格
-                if table_lines:
-                    result.extend(table_lines)
-                    result.append('')  # 表格后加空行
-                    table_lines = []
+                result.extend(table_lines)
+                result.append('')  # 表格后加空行
+                table_lines = []
                 in_table = False
                 result.append(line)
+            # 空行，可能是表格内的空行，跳过
         else:
             result.append(line)
+        
+        if not with_metadata:
+            continue
+        
+        # ==================== 元数据 ====================
+        if '![' in line:
+            images.extend(_IMAGE_URL_RE.findall(line))
+        
+        if h1_title is not None:
+            if not summary.done:
+                summary.add_line(line)
+        elif stripped.startswith('# '):
+            # 一级标题：标题之后的内容才是正文
+            h1_title = stripped[2:].strip()
+            h1_end = line_end
+            if first_title is not None:
+                summary = _SummaryBuilder(max_summary_length)
+        elif first_title is None:
+            if stripped:
+                first_title = stripped.lstrip('#').strip()
+                first_end = line_end
+        elif not summary.done:
+            summary.add_line(line)
+        
+        if h1_title is not None and first_title is None:
+            first_title = h1_title
+            first_end = h1_end
     
     # 处理末尾的表格
     if table_lines:
         result.extend(table_lines)
     
-    return '\n'.join(result)
+    normalized = '\n'.join(result) if has_table else md_content
+    if not with_metadata:
+        return {"normalized": normalized}
+    
+    if h1_title is not None:
+        title, content_start = h1_title, h1_end
+    elif first_title is not None:
+        title, content_start = first_title, first_end
+    else:
+        title, content_start = "", 0
+    
+    return {
+        "normalized": normalized,
+        "title": title,
+        "content": md_content[content_start:].strip(),
+        "summary": summary.result(),
+        "images": images,
+        "word_count": len(md_content),
+    }
 
 
-def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professional", custom_style: str = None) -> str:
+_FENCE_OPEN_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+
+def split_markdown_sections(md_content: str, max_sections: int = None) -> list[str]:
     """
-    将 Markdown 转换为适配微信公众号的精美 HTML
+    按二级标题（##）拆分文章，标题之前的内容（一级标题、导语）归入第一节
     
-    排版标准参考：
-    - 正文字号: 15-16px，行高 1.75-2.0
-    - 段落间距: 1.2-1.5em
-    - 侧边距: 内置 padding 保证手机端阅读
-    - 字间距: 0.5-1px 提升阅读体验
+    围栏代码块内的 ## 不作为分节点。max_sections 限制节数：超出时把相邻小节合并，各组长度尽量均衡。
     """
-    # 预处理：修复表格格式
-    md_content = preprocess_markdown_tables(md_content)
+    sections = []
+    current = []
+    fence = None
+    for line in md_content.split('\n'):
+        if fence:
+            if line.strip().startswith(fence) and not line.strip().strip(fence[0]):
+                fence = None
+        else:
+            m = _FENCE_OPEN_RE.match(line)
+            if m:
+                fence = m.group(1)
+            elif line.startswith('## ') and any(l.strip() for l in current):
+                sections.append('\n'.join(current).strip())
+                current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        sections.append('\n'.join(current).strip())
     
+    if max_sections and len(sections) > max_sections:
+        target = sum(len(section) for section in sections) / max_sections
+        merged = []
+        for section in sections:
+            # 当前组未达到平均长度，或组数已满时并入当前组
+            if merged and (len(merged[-1]) < target or len(merged) == max_sections):
+                merged[-1] += '\n\n' + section
+            else:
+                merged.append(section)
+        sections = merged
+    return sections
+
+
+DEFAULT_FONT_FAMILY = "-apple-system, BlinkMacSystemFont, 'PingFang SC', 'Hiragino Sans GB', 'Microsoft YaHei', sans-serif"
+
+# 标题层级配置（视觉层次感）
+HEADING_CONFIGS = {
+    1: {'size': 22, 'margin_top': 32, 'margin_bottom': 20, 'weight': 700},
+    2: {'size': 19, 'margin_top': 28, 'margin_bottom': 16, 'weight': 700},
+    3: {'size': 17, 'margin_top': 24, 'margin_bottom': 12, 'weight': 600},
+    4: {'size': 16, 'margin_top': 20, 'margin_bottom': 10, 'weight': 600},
+    5: {'size': 15, 'margin_top': 16, 'margin_bottom': 8, 'weight': 600},
+    6: {'size': 14, 'margin_top': 12, 'margin_bottom': 6, 'weight': 600},
+}
+
+
+# 主题的可选装饰项：字段 -> 可选值（第一个为默认值；blockquote_style 默认随 heading_style）
+HEADING_STYLES = ('border-left', 'minimal', 'editorial', 'underline', 'background', 'normal')
+DECORATIVE_OPTIONS = {
+    'blockquote_style': ('border-left', 'center', 'card'),
+    'list_bullet': ('dot', 'square', 'none'),
+    'hr_style': ('gradient', 'solid', 'dashed'),
+}
+
+
+def resolve_theme(theme_name) -> dict:
+    """主题名或自定义主题字典 -> 主题字典（未知主题回退到 professional）"""
     if isinstance(theme_name, dict):
-        theme = theme_name
-    else:
-        theme = THEMES.get(theme_name, THEMES["professional"])
-    
-    # 使用 markdown 库转换基础 HTML
-    md = markdown.Markdown(extensions=[
-        'extra',
-        'tables',  # 显式启用表格支持
-        'codehilite',
-        'toc',
-        'sane_lists',
-        # 注意：移除 nl2br，因为它会干扰表格解析
-    ])
-    
-    html_content = md.convert(md_content)
-    soup = BeautifulSoup(html_content, 'html.parser')
+        return theme_name
+    return THEMES.get(theme_name, THEMES["professional"])
+
+
+def _theme_key(theme: dict) -> str:
+    """主题字典的规范化 JSON（键排序），相同配置得到相同结果"""
+    return json.dumps(theme, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def theme_fingerprint(theme_name) -> str:
+    """主题指纹：用于缓存键，自定义主题字典也能稳定哈希"""
+    theme = resolve_theme(theme_name)
+    return hashlib.sha1(_theme_key(theme).encode('utf-8')).hexdigest()
+
+
+def compile_theme(theme_name) -> Mapping[str, str]:
+    """
+    将主题编译为只读的「标签 -> 内联样式」表
     
+    每个主题（含自定义主题字典）只编译一次，转换时直接查表，
+    不再为每个元素重新拼接 f-string。
+    """
+    return _compile_theme_cached(_theme_key(resolve_theme(theme_name)))
+
+
+@lru_cache(maxsize=128)
+def _compile_theme_cached(theme_key: str) -> Mapping[str, str]:
+    sheet = _build_style_sheet(json.loads(theme_key))
+    # 根容器只有一个，直接压缩；元素样式在 optimize_tree_styles 中按继承关系压缩
+    sheet['root_open'] = minify_style_attributes(sheet['root_open'].strip())
+    sheet['root_close'] = sheet['root_close'].strip()
+    return MappingProxyType(sheet)
+
+
+@lru_cache(maxsize=128)
+def root_inherited_context(root_open: str) -> tuple:
+    """根容器 style 中会被正文继承的声明（体积优化时用于省略重复声明）"""
+    match = re.search(r'style="([^"]*)"', root_open)
+    return inherited_context(match.group(1)) if match else ()
+
+
+def _build_style_sheet(theme: dict) -> dict:
+    """根据主题配置生成全部元素的内联样式"""
     # 主题配置
     primary = theme['primary_color']
     secondary = theme['secondary_color']
     text_color = theme['text_color']
     heading_color = theme['heading_color']
-    accent = theme.get('accent_color', primary)
     line_height = theme.get('line_height', 1.85)
     paragraph_indent = theme.get('paragraph_indent', False)
     blockquote_bg = theme.get('blockquote_bg', '#f8f9fa')
     blockquote_border = theme.get('blockquote_border', primary)
     code_bg = theme.get('code_bg', '#f6f8fa')
-    font_family = theme.get('font_family', "-apple-system, BlinkMacSystemFont, 'PingFang SC', 'Hiragino Sans GB', 'Microsoft YaHei', sans-serif")
+    font_family = theme.get('font_family', DEFAULT_FONT_FAMILY)
     heading_style = theme.get('heading_style', 'border-left')
+    # 装饰选项（见 DECORATIVE_OPTIONS），未指定时保持各内置主题原有效果
+    blockquote_style = theme.get('blockquote_style') or ('center' if heading_style == 'editorial' else 'border-left')
+    list_bullet = theme.get('list_bullet', 'dot')
+    hr_style = theme.get('hr_style', 'gradient')
+    
+    sheet = {}
     
     # ==================== 段落样式（核心阅读体验） ====================
     letter_spacing = theme.get('letter_spacing', 0.8)
     font_size = 16 if heading_style == 'editorial' else 15  # 社论风格用稍大字号
     
-    for p in soup.find_all('p'):
-        indent = 'text-indent: 2em;' if paragraph_indent else ''
-        p['style'] = f'''
+    indent = 'text-indent: 2em;' if paragraph_indent else ''
+    sheet['p'] = f'''
             margin: 0 0 1.4em 0;
             padding: 0;
             font-size: {font_size}px;
@@ -155,19 +365,9 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
         '''.strip().replace('\n', ' ').replace('  ', ' ')
     
     # ==================== 标题样式（视觉层次感） ====================
-    heading_configs = {
-        1: {'size': 22, 'margin_top': 32, 'margin_bottom': 20, 'weight': 700},
-        2: {'size': 19, 'margin_top': 28, 'margin_bottom': 16, 'weight': 700},
-        3: {'size': 17, 'margin_top': 24, 'margin_bottom': 12, 'weight': 600},
-        4: {'size': 16, 'margin_top': 20, 'margin_bottom': 10, 'weight': 600},
-        5: {'size': 15, 'margin_top': 16, 'margin_bottom': 8, 'weight': 600},
-        6: {'size': 14, 'margin_top': 12, 'margin_bottom': 6, 'weight': 600},
-    }
-    
     for level in range(1, 7):
-        cfg = heading_configs[level]
-        for h in soup.find_all(f'h{level}'):
-            base_style = f'''
+        cfg = HEADING_CONFIGS[level]
+        base_style = f'''
                 margin: {cfg['margin_top']}px 0 {cfg['margin_bottom']}px 0;
                 font-size: {cfg['size']}px;
                 font-weight: {cfg['weight']};
@@ -175,10 +375,10 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
                 line-height: 1.35;
                 letter-spacing: 0.5px;
             '''
-            
-            if level == 1 and heading_style == 'minimal':
-                # 极简风格大标题 - 无装饰，靠字重和留白
-                h['style'] = f'''
+        
+        if level == 1 and heading_style == 'minimal':
+            # 极简风格大标题 - 无装饰，靠字重和留白
+            style = f'''
                     margin: 32px 0 28px 0;
                     font-size: 24px;
                     font-weight: 600;
@@ -186,18 +386,18 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
                     line-height: 1.4;
                     letter-spacing: 1px;
                 '''.strip().replace('\n', ' ')
-            elif level == 2 and heading_style == 'minimal':
-                # 极简风格二级标题 - 只靠字重区分
-                h['style'] = f'''
+        elif level == 2 and heading_style == 'minimal':
+            # 极简风格二级标题 - 只靠字重区分
+            style = f'''
                     margin: 28px 0 16px 0;
                     font-size: 17px;
                     font-weight: 600;
                     color: {heading_color};
                     line-height: 1.4;
                 '''.strip().replace('\n', ' ')
-            elif level == 1 and heading_style == 'editorial':
-                # 社论风格大标题 - 居中、大气、衬线
-                h['style'] = f'''
+        elif level == 1 and heading_style == 'editorial':
+            # 社论风格大标题 - 居中、大气、衬线
+            style = f'''
                     margin: 40px 0 32px 0;
                     font-size: 26px;
                     font-weight: 700;
@@ -207,9 +407,9 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
                     text-align: center;
                     font-family: 'Noto Serif SC', Georgia, serif;
                 '''.strip().replace('\n', ' ')
-            elif level == 2 and heading_style == 'editorial':
-                # 社论风格二级标题 - 上方分隔线，克制有力
-                h['style'] = f'''
+        elif level == 2 and heading_style == 'editorial':
+            # 社论风格二级标题 - 上方分隔线，克制有力
+            style = f'''
                     margin: 36px 0 20px 0;
                     padding-top: 24px;
                     font-size: 18px;
@@ -219,33 +419,33 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
                     letter-spacing: 1px;
                     border-top: 1px solid #e0e0e0;
                 '''.strip().replace('\n', ' ')
-            elif level <= 2 and heading_style == 'border-left':
-                # 左边框风格 - 经典公众号样式
-                h['style'] = (base_style + f'''
+        elif level <= 2 and heading_style == 'border-left':
+            # 左边框风格 - 经典公众号样式
+            style = (base_style + f'''
                     padding: 10px 0 10px 14px;
                     border-left: 3px solid {primary};
                     background: linear-gradient(90deg, {primary}06 0%, transparent 60%);
                 ''').strip().replace('\n', ' ')
-            elif level <= 2 and heading_style == 'underline':
-                # 下划线风格
-                h['style'] = (base_style + f'''
+        elif level <= 2 and heading_style == 'underline':
+            # 下划线风格
+            style = (base_style + f'''
                     padding-bottom: 10px;
                     border-bottom: 2px solid {primary};
                 ''').strip().replace('\n', ' ')
-            elif level <= 2 and heading_style == 'background':
-                # 背景高亮风格
-                h['style'] = (base_style + f'''
+        elif level <= 2 and heading_style == 'background':
+            # 背景高亮风格
+            style = (base_style + f'''
                     padding: 12px 16px;
                     background: {primary}0d;
                     border-radius: 6px;
                 ''').strip().replace('\n', ' ')
-            else:
-                # 简洁风格
-                h['style'] = base_style.strip().replace('\n', ' ')
+        else:
+            # 简洁风格
+            style = base_style.strip().replace('\n', ' ')
+        sheet[f'h{level}'] = style
     
     # ==================== 链接样式 ====================
-    for a in soup.find_all('a'):
-        a['style'] = f'''
+    sheet['a'] = f'''
             color: {primary};
             text-decoration: none;
             border-bottom: 1px solid {primary}50;
@@ -253,23 +453,18 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
         '''.strip().replace('\n', ' ')
     
     # ==================== 图片样式 ====================
-    for img in soup.find_all('img'):
-        img['style'] = '''
+    sheet['img'] = '''
             max-width: 100%;
             height: auto;
             display: block;
             margin: 20px auto;
             border-radius: 6px;
         '''.strip().replace('\n', ' ')
-        
-        # 图片容器，增加上下间距
-        wrapper = soup.new_tag('section')
-        wrapper['style'] = 'text-align: center; margin: 20px 0; padding: 0;'
-        img.wrap(wrapper)
+    # 图片容器，增加上下间距
+    sheet['img_wrapper'] = 'text-align: center; margin: 20px 0; padding: 0;'
     
     # ==================== 代码块样式 ====================
-    for pre in soup.find_all('pre'):
-        pre['style'] = f'''
+    sheet['pre'] = f'''
             background: {code_bg};
             padding: 14px 18px;
             border-radius: 6px;
@@ -280,14 +475,12 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
             line-height: 1.55;
             border: 1px solid {primary}12;
         '''.strip().replace('\n', ' ')
-        
-        for code in pre.find_all('code'):
-            code['style'] = f'color: {text_color}; font-family: inherit; background: none;'
+    sheet['pre_code'] = f'color: {text_color}; font-family: inherit; background: none;'
+    # 代码高亮配色（Pygments 配色名），默认按代码背景亮度选择
+    sheet['code_highlight'] = theme.get('code_highlight') or code_style_for_background(code_bg)
     
     # 行内代码
-    for code in soup.find_all('code'):
-        if code.parent.name != 'pre':
-            code['style'] = f'''
+    sheet['code'] = f'''
                 background: {code_bg};
                 padding: 2px 6px;
                 border-radius: 3px;
@@ -297,10 +490,9 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
             '''.strip().replace('\n', ' ')
     
     # ==================== 引用块样式（公众号特色，重要内容高亮） ====================
-    for blockquote in soup.find_all('blockquote'):
-        if heading_style == 'editorial':
-            # 社论风格引用 - 居中、斜体、有分隔线，像书籍中的金句
-            blockquote['style'] = f'''
+    if blockquote_style == 'center':
+        # 社论风格引用 - 居中、斜体、有分隔线，像书籍中的金句
+        sheet['blockquote'] = f'''
                 margin: 32px 24px;
                 padding: 20px 0;
                 background: transparent;
@@ -309,58 +501,48 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
                 border-left: none;
                 text-align: center;
             '''.strip().replace('\n', ' ')
-            
-            for p in blockquote.find_all('p'):
-                p['style'] = f'''
-                    margin: 0;
-                    font-size: 15px;
-                    line-height: 1.9;
-                    color: #4a4a4a;
-                    font-style: italic;
-                    font-family: 'Noto Serif SC', Georgia, serif;
-                '''.strip().replace('\n', ' ')
-        else:
-            # 默认引用样式
-            blockquote['style'] = f'''
+    elif blockquote_style == 'card':
+        # 卡片引用 - 浅色底、圆角，无边框
+        sheet['blockquote'] = f'''
+                margin: 20px 0;
+                padding: 16px 18px;
+                background: {blockquote_bg};
+                border-radius: 8px;
+            '''.strip().replace('\n', ' ')
+    else:
+        # 默认引用样式
+        sheet['blockquote'] = f'''
                 margin: 20px 0;
                 padding: 16px 18px;
                 background: {blockquote_bg};
                 border-left: 3px solid {blockquote_border};
                 border-radius: 0 6px 6px 0;
             '''.strip().replace('\n', ' ')
-        
-        for p in blockquote.find_all('p'):
-            p['style'] = '''
+    
+    sheet['blockquote_p'] = '''
                 margin: 0 0 8px 0;
                 font-size: 14px;
                 line-height: 1.75;
                 color: #5c6370;
             '''.strip().replace('\n', ' ')
-        # 最后一个段落去掉底部 margin
-        last_p = blockquote.find_all('p')
-        if last_p:
-            style = last_p[-1].get('style', '')
-            last_p[-1]['style'] = style.replace('margin: 0 0 8px 0', 'margin: 0')
+    # 最后一个段落去掉底部 margin
+    sheet['blockquote_p_last'] = sheet['blockquote_p'].replace('margin: 0 0 8px 0', 'margin: 0')
     
     # ==================== 列表样式（清晰的层次结构） ====================
-    for ul in soup.find_all('ul'):
-        ul['style'] = f'''
+    sheet['ul'] = f'''
             margin: 16px 0;
             padding-left: 0;
             list-style: none;
         '''.strip().replace('\n', ' ')
     
-    for ol in soup.find_all('ol'):
-        ol['style'] = f'''
+    sheet['ol'] = f'''
             margin: 16px 0;
             padding-left: 24px;
             color: {text_color};
         '''.strip().replace('\n', ' ')
     
     # 列表项
-    for li in soup.find_all('li'):
-        if li.parent.name == 'ul':
-            li['style'] = f'''
+    sheet['ul_li'] = f'''
                 margin: 8px 0;
                 line-height: 1.75;
                 font-size: 15px;
@@ -369,22 +551,21 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
                 position: relative;
                 letter-spacing: 0.5px;
             '''.strip().replace('\n', ' ')
-            
-            # 自定义圆点 - 使用主题色
-            bullet = soup.new_tag('span')
-            bullet['style'] = f'''
-                position: absolute;
-                left: 0;
-                top: 8px;
+    
+    # 自定义圆点 - 使用主题色
+    # 公众号会过滤 position: absolute，圆点用 inline-block 放进列表项的左侧留白
+    bullet_radius = '1px' if list_bullet == 'square' else '50%'
+    sheet['li_bullet'] = f'''
+                display: {'none' if list_bullet == 'none' else 'inline-block'};
                 width: 6px;
                 height: 6px;
+                margin: 0 8px 0 -14px;
+                vertical-align: middle;
                 background: {primary};
-                border-radius: 50%;
+                border-radius: {bullet_radius};
             '''.strip().replace('\n', ' ')
-            bullet.string = ''
-            li.insert(0, bullet)
-        else:
-            li['style'] = f'''
+    
+    sheet['li'] = f'''
                 margin: 8px 0;
                 line-height: 1.75;
                 font-size: 15px;
@@ -393,8 +574,7 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
             '''.strip().replace('\n', ' ')
     
     # ==================== 表格样式（清晰的数据展示） ====================
-    for table in soup.find_all('table'):
-        table['style'] = '''
+    sheet['table'] = '''
             width: 100%;
             border-collapse: collapse;
             margin: 20px 0;
@@ -404,8 +584,7 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
             border: 1px solid #e5e7eb;
         '''.strip().replace('\n', ' ')
     
-    for th in soup.find_all('th'):
-        th['style'] = f'''
+    sheet['th'] = f'''
             padding: 10px 14px;
             background: {primary};
             color: white;
@@ -416,14 +595,10 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
         '''.strip().replace('\n', ' ')
     
     # 表格行斑马纹
-    for i, tr in enumerate(soup.find_all('tr')):
-        if tr.find('th'):  # 跳过表头行
-            continue
-        bg = '#f9fafb' if i % 2 == 1 else 'white'
-        tr['style'] = f'background: {bg};'
+    sheet['tr_even'] = 'background: white;'
+    sheet['tr_odd'] = 'background: #f9fafb;'
     
-    for td in soup.find_all('td'):
-        td['style'] = f'''
+    sheet['td'] = f'''
             padding: 10px 14px;
             border-bottom: 1px solid #e5e7eb;
             color: {text_color};
@@ -432,8 +607,12 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
         '''.strip().replace('\n', ' ')
     
     # ==================== 分割线（装饰性元素） ====================
-    for hr in soup.find_all('hr'):
-        hr['style'] = f'''
+    if hr_style == 'dashed':
+        sheet['hr'] = f'border: none; border-top: 1px dashed {primary}60; height: 0; margin: 28px 0;'
+    elif hr_style == 'solid':
+        sheet['hr'] = f'border: none; border-top: 1px solid {primary}30; height: 0; margin: 28px 0;'
+    else:
+        sheet['hr'] = f'''
             border: none;
             height: 1px;
             background: linear-gradient(90deg, transparent 0%, {primary}25 50%, transparent 100%);
@@ -441,15 +620,12 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
         '''.strip().replace('\n', ' ')
     
     # ==================== 加粗/斜体（重点强调） ====================
-    for strong in soup.find_all(['strong', 'b']):
-        strong['style'] = f'font-weight: 600; color: {heading_color};'
-    
-    for em in soup.find_all(['em', 'i']):
-        em['style'] = f'font-style: italic; color: {text_color};'
+    sheet['strong'] = f'font-weight: 600; color: {heading_color};'
+    sheet['em'] = f'font-style: italic; color: {text_color};'
     
     # ==================== 最终包装（根容器） ====================
     # 微信公众号最佳实践：适当内边距，保证移动端阅读体验
-    final_html = f'''<section style="
+    sheet['root_open'] = f'''<section style="
         max-width: 100%;
         padding: 8px 0;
         background: {secondary};
@@ -462,72 +638,437 @@ def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professi
         -webkit-font-smoothing: antialiased;
         -moz-osx-font-smoothing: grayscale;
 ">
-{str(soup)}
-    </section>'''.strip()
+'''.lstrip()
+    sheet['root_close'] = '''
+    </section>'''
     
-    return final_html
+    return sheet
 
 
-def generate_custom_style_html(md_content: str, style_description: str, iflow_api_key: str = None) -> str:
-    """根据用户自定义风格描述生成 HTML"""
-    import openai
-    import os
-    import json
+def wrap_wechat_html(body_html: str, sheet: Mapping[str, str]) -> str:
+    """用主题根容器包装正文 HTML"""
+    return (sheet['root_open'] + body_html + sheet['root_close']).strip()
+
+
+MARKDOWN_EXTENSIONS = [
+    'extra',
+    'tables',  # 显式启用表格支持
+    'codehilite',
+    'toc',
+    'sane_lists',
+    # 注意：移除 nl2br，因为它会干扰表格解析
+]
+
+# 渲染阶段只标注语言，高亮在套用主题样式时按主题配色内联输出（见 _highlight_code_block）
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {'use_pygments': False},
+}
+
+# markdown.Markdown 实例池：创建实例要加载扩展、构建处理器注册表，开销不小
+MARKDOWN_POOL_MAX = 8
+_markdown_pool = []
+_markdown_pool_lock = threading.Lock()
+
+
+@contextmanager
+def pooled_markdown():
+    """从实例池借出一个 Markdown 实例，用完 reset() 后归还"""
+    md = None
+    with _markdown_pool_lock:
+        if _markdown_pool:
+            md = _markdown_pool.pop()
+    if md is None:
+        md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS, extension_configs=MARKDOWN_EXTENSION_CONFIGS)
     
-    if not iflow_api_key:
-        return convert_markdown_to_wechat_html(md_content, "professional")
+    try:
+        yield md
+    finally:
+        md.reset()
+        with _markdown_pool_lock:
+            if len(_markdown_pool) < MARKDOWN_POOL_MAX:
+                _markdown_pool.append(md)
+
+
+def _render_python_markdown(md_content: str) -> str:
+    with pooled_markdown() as md:
+        return md.convert(md_content)
+
+
+# ==================== markdown-it 渲染后端（可选） ====================
+# CommonMark 解析，速度明显快于 python-markdown；
+# 代码高亮、标题 id 沿用 codehilite / toc 扩展的实现，输出尽量与默认后端一致
+_markdown_it = None
+_markdown_it_lock = threading.Lock()
+
+
+def _codehilite_block(code: str, lang: str = None, shebang: bool = False) -> str:
+    config = CodeHiliteExtension(**MARKDOWN_EXTENSION_CONFIGS['codehilite']).getConfigs()
+    return CodeHilite(code, lang=lang, style=config.pop('pygments_style'), **config).hilite(shebang=shebang)
+
+
+def _render_fence(self, tokens, idx, options, env):
+    # 与 fenced_code 扩展的输出一致：只标注语言，高亮在套用样式时进行
+    from markdown_it.common.utils import escapeHtml
     
+    info = tokens[idx].info.strip()
+    lang = f' class="language-{escapeHtml(info.split()[0])}"' if info else ''
+    return f'<pre><code{lang}>{escapeHtml(tokens[idx].content)}</code></pre>\n'
+
+
+def _render_code_block(self, tokens, idx, options, env):
+    return _codehilite_block(tokens[idx].content, shebang=True) + '\n'
+
+
+def _heading_ids(state) -> None:
+    """与 toc 扩展一致的标题 id（slugify + 全文去重）"""
+    used_ids = set()
+    tokens = state.tokens
+    for i, token in enumerate(tokens):
+        if token.type == 'heading_open':
+            inline = tokens[i + 1]
+            text = ''.join(child.content for child in (inline.children or [])
+                           if child.type in ('text', 'code_inline'))
+            token.attrSet('id', unique(slugify(text, '-'), used_ids))
+
+
+def _get_markdown_it():
+    global _markdown_it
+    with _markdown_it_lock:
+        if _markdown_it is None:
+            from markdown_it import MarkdownIt
+            
+            md = MarkdownIt('commonmark', {'html': True}).enable('table')
+            try:
+                from mdit_py_plugins.footnote import footnote_plugin
+                from mdit_py_plugins.deflist import deflist_plugin
+                md = md.use(footnote_plugin).use(deflist_plugin)
+            except ImportError:
+                pass
+            md.add_render_rule('fence', _render_fence)
+            md.add_render_rule('code_block', _render_code_block)
+            md.core.ruler.push('heading_ids', _heading_ids)
+            _markdown_it = md
+        return _markdown_it
+
+
+def _render_markdown_it(md_content: str) -> str:
+    return _get_markdown_it().render(md_content).rstrip('\n')
+
+
+MARKDOWN_ENGINES = {
+    'python-markdown': _render_python_markdown,
+    'markdown-it': _render_markdown_it,
+}
+
+
+def _resolve_engine(engine: str = None) -> str:
+    """检查渲染后端是否可用，不可用时回退到 python-markdown"""
+    engine = engine or MARKDOWN_ENGINE
+    if engine == 'markdown-it':
+        try:
+            _get_markdown_it()
+        except ImportError:
+            print("⚠ 未安装 markdown-it-py，使用 python-markdown 渲染")
+            return 'python-markdown'
+    return engine if engine in MARKDOWN_ENGINES else 'python-markdown'
+
+
+def render_markdown(md_content: str, engine: str = None) -> str:
+    """Markdown -> 基础 HTML（未套用样式），engine 默认取配置 MARKDOWN_ENGINE"""
+    return MARKDOWN_ENGINES[_resolve_engine(engine)](md_content)
+
+
+def parse_html_tree(html_content: str, parser: str = None) -> BeautifulSoup:
+    """基础 HTML -> DOM 树，parser 默认取配置 HTML_TREE_PARSER（lxml 不可用时回退 html.parser）"""
+    parser = parser or HTML_TREE_PARSER
     try:
-        client = openai.OpenAI(
-            api_key=iflow_api_key,
-            base_url="https://apis.iflow.cn/v1"
-        )
+        return BeautifulSoup(html_content, parser)
+    except Exception:
+        return BeautifulSoup(html_content, 'html.parser')
+
+
+def tree_to_html(soup: BeautifulSoup) -> str:
+    """DOM 树 -> HTML 片段（lxml 会补上 html/body，只输出 body 内容）"""
+    if soup.body is not None and soup.html is not None:
+        return ''.join(str(node) for node in soup.body.contents)
+    return str(soup)
+
+
+def warmup_converter(pool_size: int = 2) -> None:
+    """
+    预热转换器：预建 Markdown 实例、预加载代码高亮的词法分析器、编译全部内置主题
+    
+    在 gunicorn --preload 的主进程中调用，fork 出的 worker 以写时复制方式共享这些对象。
+    pool_size 建议与 worker 线程数一致。
+    """
+    pool_size = min(pool_size, MARKDOWN_POOL_MAX)
+    preload_lexers()
+    instances = [markdown.Markdown(extensions=MARKDOWN_EXTENSIONS, extension_configs=MARKDOWN_EXTENSION_CONFIGS) for _ in range(pool_size)]
+    for md in instances:
+        # 跑一遍示例文档，触发扩展内部的惰性加载（如代码高亮）
+        md.convert("# warmup\n\n| a |\n|---|\n| b |\n\n```python\nx = 1\n```")
+        md.reset()
+    with _markdown_pool_lock:
+        _markdown_pool.extend(instances[:MARKDOWN_POOL_MAX - len(_markdown_pool)])
+    
+    for name in THEMES:
+        compile_theme(name)
+
+
+# 只依赖标签名的样式规则：标签 -> 样式表键
+_SIMPLE_STYLE_RULES = {
+    'h1': 'h1', 'h2': 'h2', 'h3': 'h3', 'h4': 'h4', 'h5': 'h5', 'h6': 'h6',
+    'a': 'a',
+    'pre': 'pre',
+    'blockquote': 'blockquote',
+    'ul': 'ul',
+    'ol': 'ol',
+    'table': 'table',
+    'th': 'th',
+    'td': 'td',
+    'hr': 'hr',
+    'strong': 'strong', 'b': 'strong',
+    'em': 'em', 'i': 'em',
+}
+
+
+class _RawHTML(NavigableString):
+    """输出时不转义的文本节点，用于插入缓存的高亮 HTML 片段（省去再解析成 DOM 的开销）"""
+    
+    def output_ready(self, formatter=None):
+        return str(self)
+
+
+def _highlight_code_block(code: Tag, style: str) -> None:
+    """把代码块内容替换为内联样式的高亮结果（语言取自 language-xxx 类名）"""
+    if code.find(True) is not None:
+        return  # 已含标签（如用户手写的 HTML），保持原样
+    lang = None
+    for cls in code.get('class') or []:
+        if cls.startswith('language-'):
+            lang = cls[len('language-'):]
+            break
+    html = highlight_code(code.get_text(), lang, style)
+    del code['class']
+    code.clear()
+    code.append(_RawHTML(html))
+
+
+def apply_wechat_styles(soup: BeautifulSoup, sheet: Mapping[str, str], tr_offset: int = 0) -> int:
+    """
+    单次遍历 DOM，根据标签和父节点上下文套用全部样式规则
+    
+    节点列表先一次性收集（文档顺序），遍历中插入的图片容器、列表圆点不会被重复处理。
+    tr_offset 为之前已出现的表格行数（分块转换时保持斑马纹连续），返回本次处理的表格行数。
+    """
+    quote_last_p = {}  # id(引用块) -> (引用块, 其中最后一个段落)
+    tr_index = tr_offset - 1  # 斑马纹按全文 tr 顺序计数（含表头行）
+    
+    for node in soup.find_all(True):
+        name = node.name
+        key = _SIMPLE_STYLE_RULES.get(name)
+        if key is not None:
+            node['style'] = sheet[key]
         
-        messages = [{
-            "role": "user",
-            "content": f"""你是一个顶级排版设计师。请根据用户描述，生成一个公众号样式的 JSON 配置。
-风格描述：{style_description}
-
-请返回以下格式的 JSON（只返回 JSON，不要其他回复）：
-{{
-    "primary_color": "#主题主色",
-    "secondary_color": "#背景色",
-    "accent_color": "#强调色",
-    "text_color": "#正文颜色",
-    "heading_color": "#标题颜色",
-    "link_color": "#链接颜色",
-    "code_bg": "#代码背景",
-    "blockquote_border": "#引用边框色",
-    "blockquote_bg": "#引用背景色",
-    "font_family": "字体栈",
-    "line_height": 1.9,
-    "paragraph_indent": false
-}}"""
-        }]
+        elif name == 'p':
+            # 引用块内的段落使用引用样式，并记录为每层外围引用块的「当前最后段落」
+            quotes = node.find_parents('blockquote')
+            if not quotes:
+                node['style'] = sheet['p']
+            else:
+                node['style'] = sheet['blockquote_p']
+                for quote in quotes:
+                    quote_last_p[id(quote)] = (quote, node)
         
-        response = client.chat.completions.create(
-            model="deepseek-v3",
-            messages=messages,
-            max_tokens=800
-        )
+        elif name == 'code':
+            # 代码块内 vs 行内代码
+            if node.parent.name == 'pre':
+                node['style'] = sheet['pre_code']
+                _highlight_code_block(node, sheet['code_highlight'])
+            else:
+                node['style'] = sheet['code']
         
-        style_json_raw = response.choices[0].message.content.strip()
+        elif name == 'li':
+            if node.parent.name == 'ul':
+                node['style'] = sheet['ul_li']
+                
+                # 自定义圆点 - 使用主题色
+                bullet = soup.new_tag('span')
+                bullet['style'] = sheet['li_bullet']
+                bullet.string = ''
+                node.insert(0, bullet)
+            else:
+                node['style'] = sheet['li']
         
-        if '```' in style_json_raw:
-            style_json = style_json_raw.split('```')[1]
-            if style_json.startswith('json'):
-                style_json = style_json[4:]
-        else:
-            style_json = style_json_raw
+        elif name == 'tr':
+            tr_index += 1
+            if node.find('th'):  # 跳过表头行
+                continue
+            node['style'] = sheet['tr_odd'] if tr_index % 2 == 1 else sheet['tr_even']
         
-        custom_theme = json.loads(style_json)
+        elif name == 'img':
+            node['style'] = sheet['img']
+            
+            # 图片容器，增加上下间距
+            wrapper = soup.new_tag('section')
+            wrapper['style'] = sheet['img_wrapper']
+            node.wrap(wrapper)
+    
+    # 引用块最后一个段落去掉底部 margin
+    for _, last_p in quote_last_p.values():
+        last_p['style'] = sheet['blockquote_p_last']
+    
+    return tr_index + 1 - tr_offset
+
+
+def convert_markdown_to_wechat_html(md_content: str, theme_name: str = "professional", custom_style: str = None) -> str:
+    """
+    将 Markdown 转换为适配微信公众号的精美 HTML
+    
+    排版标准参考：
+    - 正文字号: 15-16px，行高 1.75-2.0
+    - 段落间距: 1.2-1.5em
+    - 侧边距: 内置 padding 保证手机端阅读
+    - 字间距: 0.5-1px 提升阅读体验
+    
+    结果按 (内容哈希, 主题指纹, 转换器版本) 缓存，切换主题再切回来不会重复转换。
+    """
+    key = ('html', content_hash(md_content), theme_fingerprint(theme_name), CONVERTER_VERSION)
+    html = _conversion_cache.get(key)
+    if html is None:
+        stats = {}
+        html = _render_wechat_html(md_content, theme_name, stats=stats)
+        _conversion_cache.set(key, html)
+        if stats.get("bytes_saved"):
+            total = stats["bytes_saved"] + len(html)
+            print(f"🗜️ 样式优化节省 {stats['bytes_saved']} 字节 ({stats['bytes_saved'] / total:.0%})")
+    return html
+
+
+def convert_markdown_body_html(md_content: str, theme_name: str = "professional") -> str:
+    """
+    转换为套用主题样式的正文 HTML，不包装根容器
+    
+    用于拼接多段内容（如分节排版），拼接后由调用方用 wrap_wechat_html 统一包装一次。
+    """
+    key = ('body', content_hash(md_content), theme_fingerprint(theme_name), CONVERTER_VERSION)
+    html = _conversion_cache.get(key)
+    if html is None:
+        html = _render_wechat_html(md_content, theme_name, wrap=False)
+        _conversion_cache.set(key, html)
+    return html
+
+
+def _render_wechat_html(md_content: str, theme_name, optimize: bool = True, stats: dict = None,
+                        wrap: bool = True) -> str:
+    """实际的转换流程（不经过缓存）"""
+    # 预处理：修复表格格式（与元数据共用一次扫描）
+    md_content = get_markdown_scan(md_content)["normalized"]
+    
+    # 使用 markdown 库转换基础 HTML（复用池中的实例）
+    html_content = render_markdown(md_content)
+    return _style_tree(parse_html_tree(html_content), theme_name, optimize, stats, wrap)
+
+
+def _style_tree(soup: BeautifulSoup, theme_name, optimize: bool = True, stats: dict = None,
+                wrap: bool = True) -> str:
+    """
+    给基础 HTML 树套用主题样式并包装根容器（会修改传入的树）
+    
+    optimize: 压缩内联样式（见 html_optimizer），节省的字节数写入 stats["bytes_saved"]
+    wrap: False 时只返回正文，不包装根容器
+    """
+    # 预编译的主题样式表（每个主题只编译一次）
+    sheet = compile_theme(theme_name)
+    
+    # 单次遍历套用全部样式规则
+    apply_wechat_styles(soup, sheet)
+    
+    # 体积优化：压缩样式、省略与根容器继承值重复的声明
+    if optimize:
+        saved = optimize_tree_styles(soup, root_inherited_context(sheet['root_open']))
+        if stats is not None:
+            stats["bytes_saved"] = saved
+    
+    # ==================== 最终包装（根容器） ====================
+    if not wrap:
+        return tree_to_html(soup)
+    return wrap_wechat_html(tree_to_html(soup), sheet)
+
+
+def _style_html_for_theme(html_content: str, theme_name) -> str:
+    """进程池任务：解析基础 HTML 并套用主题"""
+    return _style_tree(parse_html_tree(html_content), theme_name)
+
+
+# 多主题批量渲染的进程池（按需创建，大小为 BATCH_RENDER_PROCESSES）
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def _get_batch_pool() -> SpawnProcessPool:
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            # spawn：Flask 多线程服务中 fork 会把其他线程持有的锁复制进子进程，可能死锁
+            _batch_pool = SpawnProcessPool(max_workers=BATCH_RENDER_PROCESSES)
+        return _batch_pool
+
+
+def convert_markdown_multi_theme(md_content: str, theme_names=None, parallel: bool = None) -> dict:
+    """
+    一次解析，多主题渲染（主题选择器预览）
+    
+    Markdown 只转换一次，每个主题解析同一份基础 HTML 后套用样式。
+    
+    Args:
+        md_content: Markdown 内容
+        theme_names: 主题名列表，默认全部内置主题
+        parallel: 是否使用进程池并行套用主题，默认 BATCH_RENDER_PROCESSES 大于 1 时使用
+    
+    Returns:
+        {主题名: HTML}
+    """
+    theme_names = list(THEMES) if theme_names is None else list(dict.fromkeys(theme_names))
+    digest = content_hash(md_content)
+    
+    results = {}
+    missing = []
+    for name in theme_names:
+        key = ('html', digest, theme_fingerprint(name), CONVERTER_VERSION)
+        html = _conversion_cache.get(key)
+        if html is None:
+            missing.append((name, key))
+        else:
+            results[name] = html
+    
+    if missing:
+        html_content = render_markdown(get_markdown_scan(md_content)["normalized"])
+        names = [name for name, _ in missing]
         
-        # 补充缺失字段
-        default_theme = THEMES["professional"]
-        for key in default_theme:
-            if key not in custom_theme:
-                custom_theme[key] = default_theme[key]
+        # 进程池大小由 BATCH_RENDER_PROCESSES 决定，不足 2 个进程时不并行
+        if parallel is not False and BATCH_RENDER_PROCESSES > 1 and len(names) > 1:
+            rendered = list(_get_batch_pool().map(_style_html_for_theme, repeat(html_content), names))
+        else:
+            # 每个主题从共享的 Markdown 输出重新解析（bs4 复制整棵树并不比重新解析快）
+            rendered = [_style_html_for_theme(html_content, name) for name in names]
         
+        for (name, key), html in zip(missing, rendered):
+            _conversion_cache.set(key, html)
+            results[name] = html
+    
+    return {name: results[name] for name in theme_names}
+
+
+def generate_custom_style_html(md_content: str, style_description: str, iflow_api_key: str = None) -> str:
+    """根据用户自定义风格描述生成 HTML（主题配置按风格描述缓存，重复描述不再调用 LLM）"""
+    from backend.services.custom_theme import get_custom_theme
+    
+    if not iflow_api_key:
+        return convert_markdown_to_wechat_html(md_content, "professional")
+    
+    try:
+        custom_theme = get_custom_theme(style_description, iflow_api_key)["theme"]
         return convert_markdown_to_wechat_html(md_content, custom_theme)
 
     except Exception as e:
@@ -535,15 +1076,29 @@ def generate_custom_style_html(md_content: str, style_description: str, iflow_ap
         return convert_markdown_to_wechat_html(md_content, "professional")
 
 
+def get_markdown_scan(md_content: str) -> dict:
+    """scan_markdown 的缓存版本：转换与元数据提取共用同一次扫描结果（调用方不要修改）"""
+    key = ('scan', content_hash(md_content), CONVERTER_VERSION)
+    scan = _conversion_cache.get(key)
+    if scan is None:
+        scan = scan_markdown(md_content)
+        _conversion_cache.set(key, scan)
+    return scan
+
+
 def extract_metadata(md_content: str) -> dict:
-    """从 Markdown 内容中提取元数据"""
-    title, remaining = extract_title_from_markdown(md_content)
-    summary = extract_summary(remaining)
-    images = re.findall(r'!\[.*?\]\((.*?)\)', md_content)
-    
+    """从 Markdown 内容中提取元数据（复用缓存的扫描结果）"""
+    scan = get_markdown_scan(md_content)
+    # 返回副本，调用方修改不影响缓存
     return {
-        "title": title,
-        "summary": summary,
-        "images": images,
-        "content": remaining
+        "title": scan["title"],
+        "summary": scan["summary"],
+        "images": list(scan["images"]),
+        "content": scan["content"],
+        "word_count": scan["word_count"]
     }
+
+
+def conversion_cache_stats() -> dict:
+    """转换缓存的命中/未命中/淘汰统计"""
+    return _conversion_cache.stats()
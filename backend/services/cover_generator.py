@@ -4,16 +4,33 @@
 支持备用方案：使用 Pillow 生成简单渐变封面图
 """
 
+import io
 import os
 import base64
 import re
+import time
+import uuid
+import threading
 import requests
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
 import openai
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-from backend.config import POE_API_KEY, POE_BASE_URL, THEMES
+from PIL import Image, ImageDraw
+from backend.config import (POE_API_KEY, POE_BASE_URL, THEMES, COVER_AI_DEADLINE, COVER_AI_WORKERS, COVER_JOB_TTL,
+                            COVER_DOWNLOAD_MAX_MB)
+from backend.services.font_registry import layout_text, text_width
+from backend.services.cover_store import cover_key, get_cached_cover, store_cover
+from backend.services.image_encoder import to_rgb
+
+# 微信公众号头条封面推荐尺寸 900x383 (2.35:1)
+COVER_SIZE = (900, 383)
+COVER_MODEL = "nano-banana"
+# 备用封面 / 标题叠加的绘制方式有变化时递增，使缓存的封面失效
+FALLBACK_RENDER_VERSION = 1
 
 
 def generate_cover_prompt(title: str, theme_name: str = "professional") -> str:
@@ -46,19 +63,105 @@ def generate_cover_prompt(title: str, theme_name: str = "professional") -> str:
     return prompt
 
 
+def _crop_box(width: int, height: int, size: tuple = COVER_SIZE) -> tuple:
+    """居中裁剪到封面比例的区域 (left, top, right, bottom)"""
+    target_ratio = size[0] / size[1]  # 2.35:1
+    current_ratio = width / height
+    
+    if current_ratio > target_ratio:
+        # 图片太宽，裁剪左右
+        new_width = int(height * target_ratio)
+        left = (width - new_width) // 2
+        return (left, 0, left + new_width, height)
+    # 图片太高，裁剪上下
+    new_height = int(width / target_ratio)
+    top = (height - new_height) // 2
+    return (0, top, width, top + new_height)
+
+
+def download_image(url: str, max_bytes: int = None, timeout: int = 30) -> bytes:
+    """
+    流式下载图片到内存，超过 max_bytes 立即中止（不落盘）
+    
+    Raises:
+        ValueError: 图片超过大小上限
+        requests.RequestException: 下载失败
+    """
+    max_bytes = max_bytes or int(COVER_DOWNLOAD_MAX_MB * 1024 * 1024)
+    with requests.get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ValueError(f"图片过大: {int(declared)} 字节，上限 {max_bytes} 字节")
+        
+        data = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ValueError(f"图片过大: 超过 {max_bytes} 字节")
+    return bytes(data)
+
+
+def fit_cover(data: bytes, size: tuple = COVER_SIZE) -> tuple:
+    """
+    从内存解码图片，居中裁剪并缩放到封面尺寸
+    
+    JPEG 先用 draft 按接近目标的分辨率解码（DCT 阶段直接缩小 1/2~1/8），
+    裁剪和缩放由一次 resize(box=...) 完成。
+    
+    Returns:
+        (封面图片, 元数据 {"original_size", "decoded_size", "crop_box"})
+    """
+    img = Image.open(io.BytesIO(data))
+    original_size = img.size
+    crop_box = _crop_box(*original_size, size)
+    
+    if img.format == 'JPEG':
+        # 裁剪区域缩放后仍不小于目标尺寸的最小解码分辨率
+        crop_width, crop_height = crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]
+        scale = max(size[0] / crop_width, size[1] / crop_height)
+        img.draft('RGB', (int(original_size[0] * scale) + 1, int(original_size[1] * scale) + 1))
+    
+    if img.mode not in ('RGB', 'RGBA', 'L', 'CMYK'):
+        img = to_rgb(img)  # 调色板等模式不能用 LANCZOS 缩放
+    
+    # draft 后图片尺寸按比例缩小，裁剪区域同比换算
+    scale_x = img.width / original_size[0]
+    scale_y = img.height / original_size[1]
+    box = (crop_box[0] * scale_x, crop_box[1] * scale_y, crop_box[2] * scale_x, crop_box[3] * scale_y)
+    decoded_size = img.size
+    cover = to_rgb(img.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=3.0))
+    return cover, {
+        "original_size": list(original_size),
+        "decoded_size": list(decoded_size),
+        "crop_box": list(crop_box),
+    }
+
+
+def find_cached_cover(prompt: str, theme_name: str, output_dir: str = "temp") -> dict:
+    """按 (提示词, 主题) 查找已生成的 AI 封面，未命中返回 None"""
+    cached = get_cached_cover(output_dir, cover_key(prompt, theme_name, COVER_MODEL, COVER_SIZE))
+    if cached:
+        print(f"🖼️ 封面缓存命中: {cached['file_path']}")
+    return cached
+
+
 def generate_cover_image(title: str, theme_name: str = "professional", 
-                         output_dir: str = "temp", poe_api_key: str = None) -> dict:
+                         output_dir: str = "temp", poe_api_key: str = None,
+                         cache_prompt: str = None, use_cache: bool = True) -> dict:
     """
-    使用 nano-banana 生成封面图
+    使用 nano-banana 生成封面图（按 提示词+主题+模型+尺寸 缓存，命中时不调用 AI）
     
     Args:
         title: 文章标题
         theme_name: 主题名称
         output_dir: 输出目录
         poe_api_key: POE API Key (优先使用传入的值)
+        cache_prompt: 计算缓存键用的提示词（默认为实际发给模型的提示词）
+        use_cache: 是否查找已生成的封面（重新生成时传 False）
     
     Returns:
-        包含生成结果的字典 {"success": bool, "file_path": str, "error": str}
+        包含生成结果的字典 {"success": bool, "file_path": str, "error": str, "cached": bool}
     """
     # 创建输出目录
     output_path = Path(output_dir)
@@ -66,6 +169,11 @@ def generate_cover_image(title: str, theme_name: str = "professional",
     
     # 生成提示词
     prompt = generate_cover_prompt(title, theme_name)
+    key = cover_key(cache_prompt or prompt, theme_name, COVER_MODEL, COVER_SIZE)
+    if use_cache:
+        cached = find_cached_cover(cache_prompt or prompt, theme_name, output_dir)
+        if cached:
+            return cached
     
     # 使用传入的 API Key 或全局配置
     api_key = poe_api_key or POE_API_KEY
@@ -89,11 +197,11 @@ def generate_cover_image(title: str, theme_name: str = "professional",
         # 调用 nano-banana 生成图片
         # 微信公众号封面图要求：2.35:1 比例
         print(f"正在生成封面图（等待 AI 响应，约需 30 秒）...")
-        print(f"使用模型: nano-banana")
+        print(f"使用模型: {COVER_MODEL}")
         print(f"提示词: {prompt}")
         
         chat = client.chat.completions.create(
-            model="nano-banana",
+            model=COVER_MODEL,
             messages=[{
                 "role": "user",
                 "content": prompt
@@ -120,74 +228,28 @@ def generate_cover_image(title: str, theme_name: str = "professional",
                 image_url = url
                 break
         
+        metadata = {"prompt": prompt, "theme": theme_name, "model": COVER_MODEL}
+        
         if image_url:
-            # 下载图片
+            # 流式下载到内存，解码时直接裁剪缩放到微信公众号要求的 900x383 (2.35:1)
             print(f"下载图片: {image_url}")
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            file_name = f"cover_{timestamp}.png"
-            file_path = output_path / file_name
-            
-            # 保存原始图片
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            
-            # 调整图片尺寸为微信公众号要求的 900x383 (2.35:1)
-            print("调整图片尺寸为 900x383...")
-            img = Image.open(file_path)
-            
-            # 计算裁剪区域，保持中心
-            target_ratio = 900 / 383  # 2.35:1
-            current_ratio = img.width / img.height
-            
-            if current_ratio > target_ratio:
-                # 图片太宽，裁剪左右
-                new_width = int(img.height * target_ratio)
-                left = (img.width - new_width) // 2
-                img = img.crop((left, 0, left + new_width, img.height))
-            else:
-                # 图片太高，裁剪上下
-                new_height = int(img.width / target_ratio)
-                top = (img.height - new_height) // 2
-                img = img.crop((0, top, img.width, top + new_height))
-            
-            # 缩放到精确尺寸
-            img = img.resize((900, 383), Image.Resampling.LANCZOS)
-            
-            # 保存调整后的图片
-            img.save(file_path, "PNG", quality=95)
-            print(f"图片已调整为 {img.size}")
-            
-            return {
-                "success": True,
-                "file_path": str(file_path),
-                "url": image_url,
-                "error": None
-            }
+            img, fit_info = fit_cover(download_image(image_url))
+            print(f"图片已调整为 {img.size}（原图 {fit_info['original_size'][0]}x{fit_info['original_size'][1]}）")
+            return store_cover(output_dir, key, img, {
+                **metadata, **fit_info, "source": "ai_url", "source_url": image_url,
+            })
         
         # 如果没有找到 URL，可能是 base64 编码的图片
         base64_pattern = r'data:image/[^;]+;base64,([A-Za-z0-9+/=]+)'
         base64_match = re.search(base64_pattern, response_content)
         
         if base64_match:
-            image_data = base64.b64decode(base64_match.group(1))
-            
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            file_name = f"cover_{timestamp}.png"
-            file_path = output_path / file_name
-            
-            with open(file_path, 'wb') as f:
-                f.write(image_data)
-            
-            return {
-                "success": True,
-                "file_path": str(file_path),
-                "url": None,
-                "error": None
-            }
+            encoded = base64_match.group(1)
+            max_bytes = int(COVER_DOWNLOAD_MAX_MB * 1024 * 1024)
+            if len(encoded) * 3 // 4 > max_bytes:
+                raise ValueError(f"图片过大: 超过 {max_bytes} 字节")
+            img, fit_info = fit_cover(base64.b64decode(encoded))
+            return store_cover(output_dir, key, img, {**metadata, **fit_info, "source": "ai_base64"})
         
         # 如果都没有找到，返回原始响应
         return {
@@ -208,6 +270,27 @@ def generate_cover_image(title: str, theme_name: str = "professional",
         }
 
 
+def draw_title(draw: ImageDraw.ImageDraw, title: str, size: tuple, max_size: int, min_size: int,
+               shadow_offset: int = 3, shadow_fill: tuple = (0, 0, 0), fill: tuple = (255, 255, 255)) -> dict:
+    """
+    在画面中央绘制标题：文字区域为画面宽 80%、高 60%，自动折行并缩放字号（最多 3 行）
+    
+    Returns:
+        排版结果（见 layout_text）
+    """
+    width, height = size
+    layout = layout_text(title, int(width * 0.8), int(height * 0.6), max_size, min_size)
+    font = layout["font"]
+    y = (height - layout["height"]) // 2
+    for line in layout["lines"]:
+        x = int((width - text_width(font, line)) // 2)
+        # 文字阴影 + 白色文字
+        draw.text((x + shadow_offset, y + shadow_offset), line, font=font, fill=shadow_fill)
+        draw.text((x, y), line, font=font, fill=fill)
+        y += layout["line_height"]
+    return layout
+
+
 def generate_cover_with_text(title: str, theme_name: str = "professional",
                              output_dir: str = "temp") -> dict:
     """
@@ -221,17 +304,21 @@ def generate_cover_with_text(title: str, theme_name: str = "professional",
     Returns:
         包含生成结果的字典
     """
-    from PIL import Image, ImageDraw, ImageFont
-    
     # 先生成背景图
     result = generate_cover_image(title, theme_name, output_dir)
     
     if not result["success"]:
         return result
     
+    # 叠加文字后的图片单独缓存，不修改缓存中的背景图
+    key = cover_key(f"{result['cache_key']}\n{title}", theme_name, f"text-overlay-{FALLBACK_RENDER_VERSION}", COVER_SIZE)
+    cached = get_cached_cover(output_dir, key)
+    if cached:
+        return cached
+    
     try:
         # 打开生成的图片
-        img = Image.open(result["file_path"])
+        img = to_rgb(Image.open(result["file_path"]))
         
         # 创建绘图对象
         draw = ImageDraw.Draw(img)
@@ -239,49 +326,14 @@ def generate_cover_with_text(title: str, theme_name: str = "professional",
         # 获取图片尺寸
         width, height = img.size
         
-        # 尝试加载字体（Windows 系统字体）
-        font_paths = [
-            "C:/Windows/Fonts/msyh.ttc",      # 微软雅黑
-            "C:/Windows/Fonts/simhei.ttf",    # 黑体
-            "C:/Windows/Fonts/simsun.ttc",    # 宋体
-            "/System/Library/Fonts/PingFang.ttc",  # macOS
-            "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",  # Linux
-        ]
-        
-        font = None
-        font_size = int(height * 0.08)  # 字体大小为图片高度的 8%
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    font = ImageFont.truetype(font_path, font_size)
-                    break
-                except:
-                    continue
-        
-        if font is None:
-            font = ImageFont.load_default()
-        
-        # 计算文字位置（居中）
-        text_bbox = draw.textbbox((0, 0), title, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-        
-        x = (width - text_width) // 2
-        y = (height - text_height) // 2
-        
-        # 添加文字阴影
-        shadow_offset = 2
-        draw.text((x + shadow_offset, y + shadow_offset), title, 
-                  font=font, fill=(0, 0, 0, 128))
-        
-        # 添加白色文字
-        draw.text((x, y), title, font=font, fill=(255, 255, 255))
+        # 标题自动折行、缩放字号放进画面中部
+        draw_title(draw, title, (width, height), max_size=int(height * 0.12), min_size=int(height * 0.06),
+                   shadow_offset=2, shadow_fill=(0, 0, 0, 128))
         
         # 保存图片
-        img.save(result["file_path"])
-        
-        return result
+        return store_cover(output_dir, key, img, {
+            **result["metadata"], "source": "text_overlay", "base_cover": result["cache_key"], "title": title,
+        })
         
     except Exception as e:
         # 如果添加文字失败，返回原始图片
@@ -289,6 +341,81 @@ def generate_cover_with_text(title: str, theme_name: str = "professional",
         return result
 
 
+def _hex_to_rgb(color: str) -> tuple:
+    value = color.lstrip('#')
+    return tuple(int(value[i:i+2], 16) for i in (0, 2, 4))
+
+
+def gradient_image(size: tuple, start_rgb: tuple, end_rgb: tuple,
+                   direction: str = "vertical") -> Image.Image:
+    """
+    生成渐变背景（NumPy 数组运算，代替逐行画线）
+    
+    Args:
+        size: (宽, 高)
+        start_rgb / end_rgb: 起止颜色
+        direction: vertical（从上到下）| diagonal（左上到右下）
+    """
+    width, height = size
+    if direction == "diagonal":
+        # ratio = (y/h + x/w) / 2，整幅计算用 float32 即可
+        ratio = (np.arange(height, dtype=np.float32)[:, None] / (2 * height)
+                 + np.arange(width, dtype=np.float32)[None, :] / (2 * width))
+    else:
+        # 垂直渐变每行颜色相同：只算一列
+        ratio = np.arange(height, dtype=np.float64)[:, None] / height
+    
+    # 按通道分别计算（连续的单通道数组比 (高, 宽, 3) 交错数组快得多），由 Image.merge 合并
+    channels = []
+    for start, end in zip(start_rgb, end_rgb):
+        plane = (start * (1 - ratio) + end * ratio).astype(np.uint8)
+        channels.append(Image.fromarray(np.ascontiguousarray(np.broadcast_to(plane, (height, width)))))
+    return Image.merge('RGB', channels)
+
+
+@lru_cache(maxsize=32)
+def _fallback_background(primary_color: str, direction: str, size: tuple) -> Image.Image:
+    primary_rgb = _hex_to_rgb(primary_color)
+    
+    # 从主色渐变到压暗的主色（与原逐行画线的公式一致：主色 * (1 - 0.5r) + (30, 30, 60) * r）
+    end_rgb = (primary_rgb[0] * 0.5 + 30, primary_rgb[1] * 0.5 + 30, primary_rgb[2] * 0.5 + 60)
+    img = gradient_image(size, primary_rgb, end_rgb, direction)
+    draw = ImageDraw.Draw(img)
+    
+    # 添加一些装饰元素（圆形）
+    circle_color = tuple(min(255, c + 50) for c in primary_rgb)
+    for i in range(5):
+        x = 100 + i * 180
+        y = 50 + (i % 2) * 100
+        radius = 30 + i * 10
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=circle_color, outline=None)
+    return img
+
+
+def fallback_cover_background(primary_color: str, direction: str = "vertical",
+                              size: tuple = COVER_SIZE) -> Image.Image:
+    """备用封面背景（渐变 + 装饰圆形），按 (主色, 渐变方向, 尺寸) 缓存，返回可修改的副本"""
+    return _fallback_background(primary_color, direction, tuple(size)).copy()
+
+
+def render_fallback_cover(title: str, theme_name: str = "professional") -> Image.Image:
+    """
+    在内存中渲染备用封面（缓存的主题背景 + 标题文字），不写文件
+    
+    Returns:
+        900x383 的 RGB 图片
+    """
+    theme = THEMES.get(theme_name, THEMES["professional"])
+    width, height = COVER_SIZE
+    
+    # 背景（渐变 + 装饰圆形）按主题缓存，这里只需叠加文字
+    img = fallback_cover_background(theme['primary_color'], theme.get('cover_gradient', 'vertical'))
+    draw = ImageDraw.Draw(img)
+    
+    draw_title(draw, title, (width, height), max_size=52, min_size=28, shadow_offset=3)
+    return img
+
+
 def generate_fallback_cover(title: str, theme_name: str = "professional", 
                             output_dir: str = "temp") -> dict:
     """
@@ -301,104 +428,23 @@ def generate_fallback_cover(title: str, theme_name: str = "professional",
         output_dir: 输出目录
     
     Returns:
-        {"success": bool, "file_path": str, "error": str}
+        {"success": bool, "file_path": str, "error": str, "cached": bool}
     """
-    theme = THEMES.get(theme_name, THEMES["professional"])
-    
-    # 创建输出目录
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
+    key = cover_key(title, theme_name, f"fallback-{FALLBACK_RENDER_VERSION}", COVER_SIZE)
+    cached = get_cached_cover(output_dir, key)
+    if cached:
+        cached["method"] = "fallback"
+        return cached
     
     try:
-        # 封面图尺寸 (微信公众号推荐尺寸)
-        # 官方推荐：头条封面 900x383 (2.35:1)
-        width, height = 900, 383
-        
-        # 解析主题颜色
-        primary = theme['primary_color'].lstrip('#')
-        primary_rgb = tuple(int(primary[i:i+2], 16) for i in (0, 2, 4))
-        
-        # 创建渐变背景
-        img = Image.new('RGB', (width, height))
-        draw = ImageDraw.Draw(img)
-        
-        # 生成渐变效果
-        for y in range(height):
-            # 从深到浅的渐变
-            ratio = y / height
-            r = int(primary_rgb[0] * (1 - ratio * 0.5) + 30 * ratio)
-            g = int(primary_rgb[1] * (1 - ratio * 0.5) + 30 * ratio)
-            b = int(primary_rgb[2] * (1 - ratio * 0.5) + 60 * ratio)
-            draw.line([(0, y), (width, y)], fill=(r, g, b))
-        
-        # 添加一些装饰元素（圆形）
-        for i in range(5):
-            x = 100 + i * 180
-            y = 50 + (i % 2) * 100
-            size = 30 + i * 10
-            opacity_color = (
-                min(255, primary_rgb[0] + 50),
-                min(255, primary_rgb[1] + 50),
-                min(255, primary_rgb[2] + 50)
-            )
-            draw.ellipse([x - size, y - size, x + size, y + size], 
-                        fill=opacity_color, outline=None)
-        
-        # 添加标题文字
-        font_paths = [
-            "C:/Windows/Fonts/msyh.ttc",      # 微软雅黑
-            "C:/Windows/Fonts/msyhbd.ttc",    # 微软雅黑粗体
-            "C:/Windows/Fonts/simhei.ttf",    # 黑体
-            "/System/Library/Fonts/PingFang.ttc",  # macOS
-        ]
-        
-        font = None
-        font_size = 42
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    font = ImageFont.truetype(font_path, font_size)
-                    break
-                except:
-                    continue
-        
-        if font is None:
-            font = ImageFont.load_default()
-        
-        # 截断过长的标题
-        display_title = title if len(title) <= 20 else title[:18] + "..."
-        
-        # 计算文字位置（居中）
-        text_bbox = draw.textbbox((0, 0), display_title, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-        
-        x = (width - text_width) // 2
-        y = (height - text_height) // 2
-        
-        # 添加文字阴影
-        shadow_offset = 3
-        draw.text((x + shadow_offset, y + shadow_offset), display_title, 
-                  font=font, fill=(0, 0, 0))
-        
-        # 添加白色文字
-        draw.text((x, y), display_title, font=font, fill=(255, 255, 255))
+        img = render_fallback_cover(title, theme_name)
         
         # 保存图片
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        file_name = f"cover_{timestamp}.png"
-        file_path = output_path / file_name
-        
-        img.save(file_path, "PNG", quality=95)
-        
-        return {
-            "success": True,
-            "file_path": str(file_path),
-            "url": None,
-            "error": None,
-            "method": "fallback"
-        }
+        result = store_cover(output_dir, key, img, {
+            "title": title, "theme": theme_name, "model": "fallback", "source": "fallback", "crop_box": None,
+        })
+        result["method"] = "fallback"
+        return result
         
     except Exception as e:
         return {
@@ -414,33 +460,124 @@ def generate_cover_image_with_fallback(title: str, theme_name: str = "profession
                                        use_ai: bool = True,
                                        timeout: int = 60) -> dict:
     """
-    生成封面图，优先使用 AI，失败则使用备用方案
+    生成封面图，优先使用 AI，失败或超时则使用备用方案
     
     Args:
         title: 文章标题
         theme_name: 主题名称
         output_dir: 输出目录
         use_ai: 是否尝试使用 AI 生成
-        timeout: AI 生成超时时间（秒）
+        timeout: 等待 AI 封面的最长时间（秒）
     
     Returns:
         生成结果字典
     """
     if use_ai and POE_API_KEY:
-        print("  尝试使用 AI 生成封面图...")
-        result = generate_cover_image(title, theme_name, output_dir)
-        
-        if result["success"]:
-            result["method"] = "ai"
-            return result
-        else:
-            print(f"  AI 生成失败: {result['error']}")
-            print("  使用备用方案生成封面图...")
+        # AI 与备用方案并行，超时先返回备用封面
+        return generate_cover_hedged(title, theme_name, output_dir, deadline=timeout)
     
     # 使用备用方案
     return generate_fallback_cover(title, theme_name, output_dir)
 
 
+# ==================== AI / 备用封面并行 ====================
+# AI 封面在后台线程生成，同时在当前线程渲染备用封面；截止时间内 AI 完成就用 AI 封面，
+# 否则先返回备用封面，AI 任务继续在后台执行，完成后可凭 job_id 取回
+
+_cover_executor = ThreadPoolExecutor(max_workers=COVER_AI_WORKERS, thread_name_prefix='cover')
+_cover_jobs = OrderedDict()  # job_id -> (提交时间, Future)
+_cover_jobs_lock = threading.Lock()
+
+
+def _register_cover_job(future) -> str:
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _cover_jobs_lock:
+        # 清理过期任务（按提交时间有序）
+        while _cover_jobs:
+            oldest_id, (submitted_at, _) = next(iter(_cover_jobs.items()))
+            if now - submitted_at <= COVER_JOB_TTL:
+                break
+            _cover_jobs.pop(oldest_id)
+        _cover_jobs[job_id] = (now, future)
+    return job_id
+
+
+def get_cover_job(job_id: str) -> dict:
+    """
+    查询后台 AI 封面任务
+    
+    Returns:
+        {"status": "pending" | "done" | "failed" | "unknown", "result": 生成结果（done 时）, "error": str}
+    """
+    with _cover_jobs_lock:
+        job = _cover_jobs.get(job_id)
+    if job is None:
+        return {"status": "unknown", "result": None, "error": "任务不存在或已过期"}
+    
+    future = job[1]
+    if not future.done():
+        return {"status": "pending", "result": None, "error": None}
+    try:
+        result = future.result()
+    except Exception as e:
+        return {"status": "failed", "result": None, "error": f"{type(e).__name__}: {e}"}
+    if result.get("success"):
+        return {"status": "done", "result": result, "error": None}
+    return {"status": "failed", "result": None, "error": result.get("error")}
+
+
+def generate_cover_hedged(title: str, theme_name: str = "professional", output_dir: str = "temp",
+                          ai_task=None, poe_api_key: str = None,
+                          deadline: float = COVER_AI_DEADLINE) -> dict:
+    """
+    AI 封面与备用封面并行生成，耗时不超过 deadline
+    
+    Args:
+        title: 文章标题（备用封面使用）
+        theme_name: 主题名称
+        output_dir: 输出目录
+        ai_task: 生成 AI 封面的函数（无参数，返回 generate_cover_image 格式的结果），
+                 默认直接用标题调用 generate_cover_image
+        poe_api_key: 未传 ai_task 时使用的 POE API Key
+        deadline: 等待 AI 封面的最长时间（秒）
+    
+    Returns:
+        生成结果字典，method 为 "ai" 或 "fallback"；
+        返回备用封面且 AI 任务仍在执行时，job_id 可用于 get_cover_job 取回 AI 封面
+    """
+    start = time.monotonic()
+    future = None
+    if ai_task is not None or poe_api_key or POE_API_KEY:
+        if ai_task is None:
+            ai_task = lambda: generate_cover_image(title, theme_name, output_dir, poe_api_key)
+        future = _cover_executor.submit(ai_task)
+    
+    fallback = generate_fallback_cover(title, theme_name, output_dir)
+    
+    ai_result = None
+    if future is not None:
+        try:
+            ai_result = future.result(timeout=max(0.0, deadline - (time.monotonic() - start)))
+        except FutureTimeout:
+            pass
+        except Exception as e:
+            ai_result = {"success": False, "error": f"{type(e).__name__}: {e}"}
+    
+    if ai_result and ai_result.get("success"):
+        ai_result["method"] = "ai"
+        print(f"✓ AI 封面在截止时间内完成 ({time.monotonic() - start:.1f}s)")
+        return ai_result
+    
+    fallback["job_id"] = None
+    if ai_result is not None:
+        fallback["ai_error"] = ai_result.get("error")
+    elif future is not None:
+        fallback["job_id"] = _register_cover_job(future)
+        print(f"⏱ AI 封面超过 {deadline:g}s 未完成，先返回备用封面（任务 {fallback['job_id']}）")
+    return fallback
+
+
 if __name__ == "__main__":
     # 测试备用封面图生成
     print("测试备用封面图生成...")
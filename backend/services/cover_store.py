@@ -0,0 +1,219 @@
+"""
+封面存储
+封面按 (提示词, 主题, 模型, 尺寸) 的哈希命名（cover_<key>.jpg / .png，按字节预算编码），
+旁边的 cover_<key>.json 记录尺寸、裁剪区域、来源、编码参数等元数据；同样的请求直接命中已有文件，不再重复调用 AI。
+目录按总大小淘汰最久未使用的文件（文件 mtime 作为最近使用时间）；每写入 EVICT_INTERVAL 个封面检查一次，
+上传前规范化的图片（UPLOAD_NORMALIZE_DIR）由 image_normalizer 单独管理，不参与封面目录的淘汰
+"""
+
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+from backend.config import COVER_CACHE_MAX_MB, UPLOAD_NORMALIZE_DIR
+from backend.services.image_encoder import encode_to_budget
+
+# 封面生成 / 编码方式有变化时递增，使旧缓存失效
+COVER_STORE_VERSION = 2
+# 每写入这么多个封面检查一次目录大小（启动时另有一次全量检查）
+EVICT_INTERVAL = 20
+# 不参与封面目录淘汰的子目录（有各自的上限，文件可能正在被上传使用）
+EXCLUDED_DIRS = (UPLOAD_NORMALIZE_DIR,)
+
+_stores = 0
+
+
+def cover_key(prompt: str, theme_name: str, model: str, size: tuple) -> str:
+    """封面缓存键：(提示词, 主题, 模型, 尺寸) 的哈希"""
+    raw = json.dumps([prompt, theme_name, model, list(size), COVER_STORE_VERSION], ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cover_path(output_dir: str, key: str, ext: str = 'png') -> Path:
+    return Path(output_dir) / f"cover_{key}.{ext}"
+
+
+def _touch(*paths) -> None:
+    for path in paths:
+        try:
+            os.utime(path)  # 记录最近使用时间
+        except OSError:
+            pass
+
+
+def get_cached_cover(output_dir: str, key: str) -> dict:
+    """
+    查找已生成的封面，未命中返回 None
+
+    Returns:
+        {"success": True, "file_path", "url", "error": None, "cached": True, "cache_key", "metadata"}
+    """
+    meta_path = cover_path(output_dir, key, 'json')
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    file_path = Path(output_dir) / metadata.get("file_name", "")
+    if not metadata.get("file_name") or not file_path.is_file():
+        return None
+
+    _touch(file_path, meta_path)
+    return {
+        "success": True,
+        "file_path": str(file_path),
+        "url": metadata.get("source_url"),
+        "error": None,
+        "cached": True,
+        "cache_key": key,
+        "metadata": metadata,
+    }
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink(missing_ok=True)
+
+
+def store_cover(output_dir: str, key: str, img, metadata: dict) -> dict:
+    """
+    按字节预算编码（见 encode_to_budget）后保存封面和元数据（先写图片再写元数据，元数据存在即表示图片完整），
+    然后按目录大小淘汰
+
+    Args:
+        img: PIL 图片
+        metadata: 附加元数据（来源、原图尺寸、裁剪区域等）
+
+    Returns:
+        与 get_cached_cover 相同格式的结果（cached 为 False）
+    """
+    global _stores
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    encoded = encode_to_budget(img)
+    file_path = cover_path(output_dir, key, 'jpg' if encoded["format"] == 'JPEG' else 'png')
+    _atomic_write(file_path, lambda f: f.write(encoded["data"]))
+
+    metadata = {
+        **metadata,
+        "cache_key": key,
+        "file_name": file_path.name,
+        "format": encoded["format"],
+        "quality": encoded["quality"],
+        "ssim": encoded["ssim"],
+        "within_budget": encoded["within_budget"],
+        "width": img.width,
+        "height": img.height,
+        "bytes": encoded["bytes"],
+        "created_at": time.time(),
+    }
+    meta_bytes = json.dumps(metadata, ensure_ascii=False, indent=2).encode('utf-8')
+    _atomic_write(cover_path(output_dir, key, 'json'), lambda f: f.write(meta_bytes))
+
+    _stores += 1
+    if _stores % EVICT_INTERVAL == 0:
+        enforce_size_limit(output_dir, int(COVER_CACHE_MAX_MB * 1024 * 1024), exclude=EXCLUDED_DIRS)
+    return {
+        "success": True,
+        "file_path": str(file_path),
+        "url": metadata.get("source_url"),
+        "error": None,
+        "cached": False,
+        "cache_key": key,
+        "metadata": metadata,
+    }
+
+
+# ==================== 按大小淘汰 ====================
+
+def _scan(directory: Path, exclude=()) -> dict:
+    """按 文件路径去掉扩展名 分组（封面与其元数据同进同出），返回 {组: [(路径, 大小, mtime), ...]}；exclude 中的子目录跳过"""
+    excluded = {os.path.abspath(path) for path in exclude}
+    groups = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if os.path.abspath(os.path.join(root, name)) not in excluded]
+        for name in files:
+            if name.endswith('.tmp'):
+                continue  # 正在写入的临时文件
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            groups.setdefault(os.path.splitext(path)[0], []).append((path, stat.st_size, stat.st_mtime))
+    return groups
+
+
+def enforce_size_limit(directory, max_bytes: int, exclude=(), min_age: float = 0) -> dict:
+    """
+    目录（含子目录）总大小超过 max_bytes 时，按最近使用时间从旧到新删除文件
+
+    Args:
+        exclude: 不统计、不删除的子目录
+        min_age: 最近 min_age 秒内用过的文件不删除（可能正在使用）
+
+    Returns:
+        {"removed": 删除的文件数, "freed": 释放的字节数, "bytes": 剩余总大小}
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return {"removed": 0, "freed": 0, "bytes": 0}
+
+    groups = _scan(directory, exclude)
+    total = sum(size for files in groups.values() for _, size, _ in files)
+    removed = freed = 0
+    if total > max_bytes:
+        # 组的最近使用时间取组内最新的 mtime
+        cutoff = time.time() - min_age
+        for files in sorted(groups.values(), key=lambda files: max(mtime for _, _, mtime in files)):
+            if total <= max_bytes or max(mtime for _, _, mtime in files) > cutoff:
+                break
+            for path, size, _ in files:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                freed += size
+                removed += 1
+        print(f"🧹 {directory} 超过 {max_bytes / 1024 / 1024:.0f}MB，清理了 {removed} 个最久未使用的文件")
+    return {"removed": removed, "freed": freed, "bytes": total}
+
+
+def remove_expired_files(directory, max_age_hours: float) -> int:
+    """删除目录下（不含子目录）超过 max_age_hours 小时未修改的文件，返回删除的文件数"""
+    directory = Path(directory)
+    if not directory.is_dir() or max_age_hours <= 0:
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for path in directory.iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        print(f"🧹 {directory} 清理了 {removed} 个超过 {max_age_hours:g} 小时的文件")
+    return removed
+
+
+def cover_store_stats(output_dir: str) -> dict:
+    """封面存储的条目数和占用空间"""
+    directory = Path(output_dir)
+    covers = list(directory.glob('cover_*.json')) if directory.is_dir() else []
+    total = sum(size for files in _scan(directory, EXCLUDED_DIRS).values() for _, size, _ in files) if directory.is_dir() else 0
+    return {
+        "covers": len(covers),
+        "bytes": total,
+        "max_bytes": int(COVER_CACHE_MAX_MB * 1024 * 1024),
+    }
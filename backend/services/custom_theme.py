@@ -0,0 +1,269 @@
+"""
+AI 自定义主题
+根据风格描述让 LLM 生成主题 JSON，校验后按规范化的风格描述缓存到磁盘（LRU 淘汰 + 过期时间），
+同样的描述再次请求时跳过 LLM，直接本地渲染
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import unicodedata
+from pathlib import Path
+
+from backend.config import THEMES, THEME_CACHE_DIR, THEME_CACHE_MAX_ENTRIES, THEME_CACHE_TTL_DAYS
+from backend.services.converter import DECORATIVE_OPTIONS, HEADING_STYLES
+
+# 主题字段格式有变化时递增，使旧缓存失效
+THEME_SCHEMA_VERSION = 3
+
+IFLOW_BASE_URL = "https://apis.iflow.cn/v1"
+THEME_MODEL = "deepseek-v3"
+
+COLOR_FIELDS = (
+    'primary_color', 'secondary_color', 'accent_color', 'text_color', 'heading_color',
+    'link_color', 'code_bg', 'blockquote_border', 'blockquote_bg',
+)
+# 数值字段：(最小值, 最大值)
+NUMBER_FIELDS = {
+    'line_height': (1.2, 3.0),
+    'letter_spacing': (0, 4),
+}
+
+THEME_PROMPT = """你是一个顶级排版设计师。请根据用户描述，生成一个公众号样式的 JSON 配置。
+风格描述：{style_description}
+
+请返回以下格式的 JSON（只返回 JSON，不要其他回复）：
+{{
+    "primary_color": "#主题主色",
+    "secondary_color": "#背景色",
+    "accent_color": "#强调色",
+    "text_color": "#正文颜色",
+    "heading_color": "#标题颜色",
+    "link_color": "#链接颜色",
+    "code_bg": "#代码背景",
+    "blockquote_border": "#引用边框色",
+    "blockquote_bg": "#引用背景色",
+    "font_family": "字体栈",
+    "heading_style": "minimal/editorial/border-left/underline/background/normal",
+    "blockquote_style": "border-left/center/card",
+    "list_bullet": "dot/square/none",
+    "hr_style": "gradient/solid/dashed",
+    "line_height": 1.9,
+    "letter_spacing": 0.5,
+    "paragraph_indent": false
+}}"""
+
+_HEX_COLOR_RE = re.compile(r'^#([0-9a-fA-F]{3,4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})$')
+_RGB_COLOR_RE = re.compile(r'^rgba?\(\s*([\d.]+%?)\s*,\s*([\d.]+%?)\s*,\s*([\d.]+%?)\s*(?:,\s*[\d.]+%?\s*)?\)$')
+# 字体栈里的双引号会提前结束 style="..." 属性，统一换成单引号后再校验
+_FONT_RE = re.compile(r"^[\w\s,'\-]+$")
+_DESCRIPTION_STRIP_RE = re.compile(r'[\s\W_]+', re.UNICODE)
+
+
+# ==================== 风格描述规范化 / 主题校验 ====================
+
+def normalize_style_description(style_description: str) -> str:
+    """规范化风格描述：全半角统一、小写、去掉空白和标点（「温暖文艺风！」与「温暖 文艺风」视为同一描述）"""
+    text = unicodedata.normalize('NFKC', style_description or '').lower()
+    return _DESCRIPTION_STRIP_RE.sub('', text)
+
+
+def normalize_color(value: str) -> str:
+    """
+    颜色统一为 #rrggbb（样式表会在主色后拼接透明度，如 {primary}50），无法识别时返回 None
+
+    支持 #rgb / #rgba / #rrggbb / #rrggbbaa / rgb() / rgba()，透明度舍弃
+    """
+    value = value.strip()
+    match = _HEX_COLOR_RE.match(value)
+    if match:
+        digits = match.group(1)
+        if len(digits) <= 4:
+            digits = ''.join(ch * 2 for ch in digits[:3])
+        return '#' + digits[:6].lower()
+
+    match = _RGB_COLOR_RE.match(value)
+    if match:
+        channels = []
+        for channel in match.groups():
+            try:
+                number = float(channel[:-1]) * 2.55 if channel.endswith('%') else float(channel)
+            except ValueError:
+                return None
+            channels.append(min(255, max(0, round(number))))
+        return '#' + ''.join(f'{c:02x}' for c in channels)
+    return None
+
+
+def validate_theme(raw, base_theme: str = "professional") -> dict:
+    """
+    校验 LLM 返回的主题配置，非法或缺失的字段用基础主题补齐
+
+    Returns:
+        校验后的主题字典；raw 不是字典时返回 None
+    """
+    if not isinstance(raw, dict):
+        return None
+
+    theme = dict(THEMES[base_theme])
+    for field in COLOR_FIELDS:
+        value = raw.get(field)
+        color = normalize_color(value) if isinstance(value, str) else None
+        if color:
+            theme[field] = color
+
+    for field, (low, high) in NUMBER_FIELDS.items():
+        value = raw.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            theme[field] = min(max(value, low), high)
+
+    font_family = raw.get('font_family')
+    if isinstance(font_family, str):
+        font_family = font_family.replace('"', "'").strip()
+        if 0 < len(font_family) <= 200 and _FONT_RE.match(font_family):
+            theme['font_family'] = font_family
+
+    if raw.get('heading_style') in HEADING_STYLES:
+        theme['heading_style'] = raw['heading_style']
+
+    for field, choices in DECORATIVE_OPTIONS.items():
+        if raw.get(field) in choices:
+            theme[field] = raw[field]
+
+    if isinstance(raw.get('paragraph_indent'), bool):
+        theme['paragraph_indent'] = raw['paragraph_indent']
+
+    theme['name'] = '✨ 自定义风格'
+    theme['description'] = 'AI 根据风格描述生成'
+    return theme
+
+
+def parse_theme_json(text: str):
+    """从 LLM 回复中取出 JSON（兼容 ```json 代码块包裹）"""
+    text = text.strip()
+    if '```' in text:
+        text = text.split('```')[1]
+        if text.startswith('json'):
+            text = text[4:]
+    return json.loads(text)
+
+
+# ==================== 磁盘缓存 ====================
+# 每个主题一个文件：内容含创建时间（过期判断），文件 mtime 作为最近使用时间（LRU 淘汰）
+# 多个 worker 进程共享同一目录，写入用临时文件 + 原子替换
+
+def _cache_dir() -> Path:
+    path = Path(THEME_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _cache_path(style_description: str, prompt: str) -> Path:
+    key = '\n'.join([normalize_style_description(style_description),
+                     hashlib.sha1(prompt.encode('utf-8')).hexdigest(), str(THEME_SCHEMA_VERSION)])
+    return _cache_dir() / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+
+def get_cached_theme(style_description: str, prompt: str = THEME_PROMPT) -> dict:
+    """读取缓存的主题，未命中或已过期返回 None"""
+    path = _cache_path(style_description, prompt)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get('created_at', 0) > THEME_CACHE_TTL_DAYS * 86400:
+        path.unlink(missing_ok=True)
+        return None
+
+    try:
+        os.utime(path)  # 记录最近使用时间
+    except OSError:
+        pass
+    return entry.get('theme')
+
+
+def cache_theme(style_description: str, theme: dict, prompt: str = THEME_PROMPT) -> None:
+    """写入缓存，超出条目上限时淘汰最久未使用的主题"""
+    path = _cache_path(style_description, prompt)
+    entry = {
+        "style_description": style_description,
+        "created_at": time.time(),
+        "theme": theme,
+    }
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠ 主题缓存写入失败: {e}")
+        return
+    _evict()
+
+
+def _evict() -> None:
+    files = list(_cache_dir().glob('*.json'))
+    if len(files) <= THEME_CACHE_MAX_ENTRIES:
+        return
+
+    def mtime(path):
+        try:
+            return path.stat().st_mtime
+        except OSError:
+            return 0
+
+    files.sort(key=mtime)
+    for path in files[:len(files) - THEME_CACHE_MAX_ENTRIES]:
+        path.unlink(missing_ok=True)
+
+
+def theme_cache_stats() -> dict:
+    """主题缓存的条目数和占用空间"""
+    files = list(_cache_dir().glob('*.json'))
+    return {
+        "entries": len(files),
+        "bytes": sum(f.stat().st_size for f in files if f.exists()),
+        "max_entries": THEME_CACHE_MAX_ENTRIES,
+        "ttl_days": THEME_CACHE_TTL_DAYS,
+    }
+
+
+# ==================== 生成 ====================
+
+def request_theme_from_llm(style_description: str, api_key: str, prompt: str = THEME_PROMPT,
+                           timeout: float = None) -> dict:
+    """调用 LLM 生成主题配置，返回校验后的主题（失败抛出异常；timeout 为请求超时秒数）"""
+    import openai
+
+    client = openai.OpenAI(api_key=api_key, base_url=IFLOW_BASE_URL)
+    response = client.chat.completions.create(
+        model=THEME_MODEL,
+        messages=[{"role": "user", "content": prompt.format(style_description=style_description)}],
+        max_tokens=800,
+        timeout=timeout
+    )
+    theme = validate_theme(parse_theme_json(response.choices[0].message.content))
+    if theme is None:
+        raise ValueError("LLM 返回的主题配置不是 JSON 对象")
+    return theme
+
+
+def get_custom_theme(style_description: str, api_key: str, prompt: str = THEME_PROMPT, timeout: float = None) -> dict:
+    """
+    获取风格描述对应的主题：先查缓存，未命中再调用 LLM 并写入缓存（timeout 为 LLM 请求超时秒数）
+
+    Returns:
+        {"theme": 主题字典, "cached": 是否命中缓存}
+    """
+    theme = get_cached_theme(style_description, prompt)
+    if theme is not None:
+        print(f"🎨 主题缓存命中: {style_description}")
+        return {"theme": theme, "cached": True}
+
+    theme = request_theme_from_llm(style_description, api_key, prompt, timeout)
+    cache_theme(style_description, theme, prompt)
+    return {"theme": theme, "cached": False}
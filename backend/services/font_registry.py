@@ -0,0 +1,301 @@
+"""
+字体注册表 / 文字排版
+启动时扫描一次系统字体目录，按是否覆盖中文、字重建立索引；
+加载好的 FreeTypeFont 按 (路径, 序号, 字号) 缓存，字符宽度按字体缓存，
+提供把长标题自动换行、缩小字号放进封面文字区域的排版
+"""
+
+import os
+import re
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import ImageFont
+
+from backend.config import FONT_DIRS
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+# 字体集合（.ttc）最多读取的字体数
+MAX_COLLECTION_FACES = 16
+
+# 同样满足条件时优先使用的字体（按顺序，匹配字体族名）
+PREFERRED_FAMILIES = [
+    'microsoft yahei', 'pingfang sc', 'noto sans cjk sc', 'noto sans sc', 'source han sans sc',
+    'harmonyos sans sc', 'hiragino sans gb', 'wenquanyi micro hei', 'wenquanyi zen hei',
+    'simhei', 'heiti sc', 'noto sans cjk', 'source han sans', 'droid sans fallback',
+]
+
+# 样式名中的字重关键词（长的在前，避免 "bold" 先匹配到 "extrabold"）
+WEIGHT_KEYWORDS = [
+    ('extralight', 200), ('ultralight', 200), ('extrabold', 800), ('ultrabold', 800),
+    ('semibold', 600), ('demibold', 600), ('hairline', 100), ('thin', 100), ('light', 300),
+    ('medium', 500), ('heavy', 900), ('black', 900), ('bold', 700),
+]
+
+# 检测中文覆盖用的字符
+CJK_PROBE = '中文字体'
+# 一定不存在的字符：渲染结果即 .notdef（缺字方框）
+_MISSING_PROBE = '\U0010fffd'
+
+_CJK_RE = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+_WORD_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.\'’\-]*|\s+|.', re.S)
+
+# 不能出现在行首 / 行尾的标点（中文排版避头尾）
+NO_LINE_START = set('，。、；：！？）》」』】〕”’,.;:!?)]}…%')
+NO_LINE_END = set('（《「『【〔“‘([{')
+
+_faces = None
+_scan_lock = threading.Lock()
+_advances = {}
+
+
+# ==================== 字体扫描 ====================
+
+def font_directories() -> list:
+    """系统字体目录（存在的），FONT_DIRS 配置的目录排在最前"""
+    home = Path.home()
+    candidates = [Path(p) for p in FONT_DIRS]
+    if sys.platform.startswith('win'):
+        candidates.append(Path(os.environ.get('WINDIR', 'C:/Windows')) / 'Fonts')
+        candidates.append(home / 'AppData/Local/Microsoft/Windows/Fonts')
+    elif sys.platform == 'darwin':
+        candidates += [Path('/System/Library/Fonts'), Path('/Library/Fonts'), home / 'Library/Fonts']
+    else:
+        candidates += [Path('/usr/share/fonts'), Path('/usr/local/share/fonts'),
+                       home / '.local/share/fonts', home / '.fonts']
+    return [p for p in candidates if p.is_dir()]
+
+
+def _style_weight(style: str) -> int:
+    style = style.lower().replace(' ', '').replace('-', '')
+    for keyword, weight in WEIGHT_KEYWORDS:
+        if keyword in style:
+            return weight
+    return 400
+
+
+def _has_glyphs(font, text: str) -> bool:
+    """字体是否包含 text 中的全部字符（与缺字方框的渲染结果比较）"""
+    missing = font.getmask(_MISSING_PROBE)
+    missing = (missing.size, bytes(missing))
+    for ch in text:
+        mask = font.getmask(ch)
+        if mask.size[0] == 0 or (mask.size, bytes(mask)) == missing:
+            return False
+    return True
+
+
+def _probe_file(path: str) -> list:
+    """读取字体文件中的每个字体：族名、样式、字重、是否覆盖中文"""
+    faces = []
+    for index in range(MAX_COLLECTION_FACES):
+        try:
+            font = ImageFont.truetype(path, 16, index=index)
+        except OSError:
+            break
+        family, style = font.getname()
+        family = family or Path(path).stem
+        style = style or 'Regular'
+        faces.append({
+            "path": path,
+            "index": index,
+            "family": family,
+            "style": style,
+            "weight": _style_weight(style),
+            "italic": 'italic' in style.lower() or 'oblique' in style.lower(),
+            "cjk": _has_glyphs(font, CJK_PROBE),
+        })
+        if not path.lower().endswith(('.ttc', '.otc')):
+            break
+    return faces
+
+
+def scan_fonts(force: bool = False) -> list:
+    """扫描系统字体目录并建立索引（只扫描一次，多线程安全）"""
+    global _faces
+    if _faces is not None and not force:
+        return _faces
+
+    with _scan_lock:
+        if _faces is not None and not force:
+            return _faces
+        faces = []
+        seen = set()
+        for directory in font_directories():
+            for root, _, files in os.walk(directory):
+                for name in sorted(files):
+                    if not name.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    path = os.path.realpath(os.path.join(root, name))
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    faces.extend(_probe_file(path))
+        _faces = faces
+        cjk_count = sum(1 for face in faces if face["cjk"])
+        print(f"🔤 字体扫描完成: {len(faces)} 个字体，{cjk_count} 个支持中文")
+        if not cjk_count:
+            print("⚠ 未找到中文字体，封面中文标题将无法正常显示（可安装 Noto Sans CJK 或配置 FONT_DIRS）")
+    return _faces
+
+
+def _family_rank(family: str) -> int:
+    family = family.lower()
+    for rank, preferred in enumerate(PREFERRED_FAMILIES):
+        if preferred in family:
+            return rank
+    return len(PREFERRED_FAMILIES)
+
+
+def find_font(weight: int = 400, cjk: bool = True) -> dict:
+    """
+    按字重和中文覆盖选择字体
+
+    Args:
+        weight: 期望字重（400 常规，700 粗体）
+        cjk: 是否需要支持中文；找不到中文字体时退回任意可缩放字体
+
+    Returns:
+        字体信息字典（path/index/family/style/weight/cjk），没有可用字体时返回 None
+    """
+    faces = scan_fonts()
+    candidates = [face for face in faces if face["cjk"]] if cjk else faces
+    if not candidates:
+        candidates = faces
+    if not candidates:
+        return None
+    return min(candidates, key=lambda face: (
+        face["italic"], abs(face["weight"] - weight), _family_rank(face["family"]), face["path"], face["index"]))
+
+
+# ==================== 字体加载 / 字符测量 ====================
+
+@lru_cache(maxsize=64)
+def _load_font(path: str, index: int, size: int):
+    return ImageFont.truetype(path, size, index=index)
+
+
+@lru_cache(maxsize=32)
+def _default_font(size: int):
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1 不支持指定字号
+        return ImageFont.load_default()
+
+
+def get_font(size: int, weight: int = 400, text: str = ''):
+    """
+    获取指定字号的字体（按 (路径, 序号, 字号) 缓存）
+
+    text 含中文时只选择支持中文的字体；系统没有可用字体时返回 Pillow 默认字体。
+    """
+    face = find_font(weight, cjk=not text or bool(_CJK_RE.search(text)))
+    if face is not None:
+        try:
+            return _load_font(face["path"], face["index"], size)
+        except OSError as e:
+            print(f"⚠ 字体加载失败 {face['path']}: {e}")
+    return _default_font(size)
+
+
+def text_width(font, text: str) -> float:
+    """文字宽度：逐字符累加缓存的字宽（中文没有字距调整，与整体测量一致）"""
+    path = getattr(font, 'path', None)
+    if not isinstance(path, str):
+        return font.getlength(text)
+    widths = _advances.setdefault((path, font.index, font.size), {})
+    total = 0.0
+    for ch in text:
+        width = widths.get(ch)
+        if width is None:
+            width = widths[ch] = font.getlength(ch)
+        total += width
+    return total
+
+
+# ==================== 换行排版 ====================
+
+def wrap_text(text: str, font, max_width: float) -> list:
+    """
+    按宽度折行：中文逐字可断，英文单词不拆开（超长单词才按字符断），
+    避头尾标点（行首不出现句号、右括号等，行尾不出现左括号等）
+    """
+    lines = []
+    line = ''
+    for token in _WORD_RE.findall(text.strip()):
+        if token.isspace():
+            if line:
+                line += ' '
+            continue
+        if text_width(font, line + token) <= max_width:
+            line += token
+            continue
+        if token in NO_LINE_START and line:
+            line += token  # 标点悬挂在行尾，不挪到下一行
+            continue
+        if line.strip():
+            carry = ''
+            while len(line) > 1 and line[-1] in NO_LINE_END:
+                carry = line[-1] + carry
+                line = line[:-1]
+            lines.append(line.rstrip())
+            line = carry
+        # 超长单词按字符断开
+        for ch in token:
+            if line and text_width(font, line + ch) > max_width:
+                lines.append(line.rstrip())
+                line = ''
+            line += ch
+    if line.strip():
+        lines.append(line.rstrip())
+    return lines
+
+
+def _ellipsize(line: str, font, max_width: float) -> str:
+    while line and text_width(font, line + '…') > max_width:
+        line = line[:-1]
+    return line.rstrip() + '…'
+
+
+def layout_text(text: str, box_width: int, box_height: int, max_size: int, min_size: int,
+                weight: int = 700, max_lines: int = 3, line_spacing: float = 1.3) -> dict:
+    """
+    把文字放进 box_width x box_height 的区域：从 max_size 开始逐步缩小字号，
+    直到折行后的行数和总高度都放得下；最小字号仍放不下时截断并加省略号
+
+    Returns:
+        {"font", "size", "lines": [...], "line_height", "height": 文字块总高度}
+    """
+    size = max_size
+    while True:
+        font = get_font(size, weight, text)
+        line_height = round(size * line_spacing)
+        fit_lines = max(1, min(max_lines, (box_height - size) // line_height + 1))
+        lines = wrap_text(text, font, box_width)
+        if len(lines) <= fit_lines or size <= min_size:
+            break
+        size = max(min_size, size - max(2, size // 10))
+
+    if len(lines) > fit_lines:
+        lines = lines[:fit_lines]
+        lines[-1] = _ellipsize(lines[-1], font, box_width)
+    return {
+        "font": font,
+        "size": size,
+        "lines": lines,
+        "line_height": line_height,
+        "height": size + line_height * (len(lines) - 1) if lines else 0,
+    }
+
+
+def font_registry_stats() -> dict:
+    """字体索引和缓存统计"""
+    faces = _faces or []
+    return {
+        "faces": len(faces),
+        "cjk_faces": sum(1 for face in faces if face["cjk"]),
+        "loaded_fonts": _load_font.cache_info().currsize,
+        "measured_fonts": len(_advances),
+    }
@@ -0,0 +1,203 @@
+"""
+公众号 HTML 体积优化
+压缩内联 style、删除与继承值重复的声明、去掉公众号不支持的属性，
+减小草稿接口和预览传输的数据量
+"""
+
+import re
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+
+# 会被子元素继承的属性：子元素声明的值与继承值相同时可以省略
+INHERITED_PROPERTIES = frozenset([
+    'color', 'font-family', 'font-size', 'font-style', 'font-weight', 'line-height',
+    'letter-spacing', 'word-spacing', 'text-align', 'text-indent', 'text-transform',
+    'white-space', 'word-break', 'word-wrap', 'overflow-wrap', 'visibility',
+])
+
+# 浏览器默认样式会覆盖继承值的标签属性：这些属性不能按继承值省略，也不能向下传递
+UA_DEFAULT_PROPERTIES = {
+    'a': {'color'},
+    'h1': {'font-size', 'font-weight'}, 'h2': {'font-size', 'font-weight'},
+    'h3': {'font-size', 'font-weight'}, 'h4': {'font-size', 'font-weight'},
+    'h5': {'font-size', 'font-weight'}, 'h6': {'font-size', 'font-weight'},
+    'strong': {'font-weight'}, 'b': {'font-weight'}, 'th': {'font-weight', 'text-align'},
+    'em': {'font-style'}, 'i': {'font-style'}, 'cite': {'font-style'}, 'var': {'font-style'},
+    'dfn': {'font-style'}, 'address': {'font-style'},
+    'code': {'font-family', 'font-size'}, 'pre': {'font-family', 'font-size', 'white-space'},
+    'kbd': {'font-family', 'font-size'}, 'samp': {'font-family', 'font-size'},
+    'tt': {'font-family', 'font-size'},
+    'small': {'font-size'}, 'big': {'font-size'}, 'sub': {'font-size'}, 'sup': {'font-size'},
+    'mark': {'color'}, 'center': {'text-align'}, 'caption': {'text-align'},
+    'button': INHERITED_PROPERTIES, 'input': INHERITED_PROPERTIES,
+    'select': INHERITED_PROPERTIES, 'textarea': INHERITED_PROPERTIES,
+}
+
+# 公众号会过滤的属性（前缀匹配，含浏览器私有前缀）
+UNSUPPORTED_PROPERTIES = ('transition', 'animation', 'cursor', 'will-change', 'pointer-events')
+# position: absolute/fixed 会被过滤，对应的偏移量随之失效
+POSITION_OFFSETS = frozenset(['top', 'right', 'bottom', 'left', 'z-index'])
+
+_STYLE_ATTR_RE = re.compile(r'style="([^"]*)"')
+_WHITESPACE_RE = re.compile(r'\s+')
+_COMMA_RE = re.compile(r'\s*,\s*')
+_ZERO_PX_RE = re.compile(r'(?<![\w.#-])0px\b')
+_HEX_ALPHA_RE = re.compile(r'#([0-9a-fA-F]{8}|[0-9a-fA-F]{4})\b')
+_VENDOR_PREFIX_RE = re.compile(r'^-[a-z]+-')
+_RELATIVE_VALUE_RE = re.compile(r'[\d.](?:r?em|ex|ch|%)|^(?:inherit|bolder|lighter|larger|smaller)$')
+
+
+def _split_declarations(style: str) -> list[str]:
+    """按分号拆分声明（忽略括号、引号内的分号，如 data URI）"""
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, ch in enumerate(style):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in '"\'':
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth = max(depth - 1, 0)
+        elif ch == ';' and depth == 0:
+            parts.append(style[start:i])
+            start = i + 1
+    parts.append(style[start:])
+    return parts
+
+
+def _hex_alpha_to_rgba(match) -> str:
+    """#rrggbbaa / #rgba -> rgba()（部分环境不认 8 位十六进制颜色）"""
+    value = match.group(1)
+    if len(value) == 4:
+        value = ''.join(c * 2 for c in value)
+    r, g, b, a = (int(value[i:i + 2], 16) for i in (0, 2, 4, 6))
+    return f'rgba({r},{g},{b},{round(a / 255, 2):g})'
+
+
+def _normalize_value(value: str) -> str:
+    value = _WHITESPACE_RE.sub(' ', value.strip())
+    if '(' in value or "'" in value or '"' in value or ',' in value:
+        value = _COMMA_RE.sub(',', value)
+    if '0px' in value:
+        value = _ZERO_PX_RE.sub('0', value)
+    if '#' in value:
+        value = _HEX_ALPHA_RE.sub(_hex_alpha_to_rgba, value)
+    return value
+
+
+@lru_cache(maxsize=4096)
+def parse_style(style: str) -> tuple:
+    """
+    解析并规范化 style 字符串，返回 ((属性, 值), ...)
+
+    属性名小写、值压缩空白；同名属性保留最后一个；去掉公众号不支持的属性。
+    """
+    declarations = {}
+    for part in _split_declarations(style):
+        prop, sep, value = part.partition(':')
+        prop = prop.strip().lower()
+        value = _normalize_value(value)
+        if not sep or not prop or not value:
+            continue
+        if _VENDOR_PREFIX_RE.sub('', prop).startswith(UNSUPPORTED_PROPERTIES):
+            continue
+        declarations.pop(prop, None)  # 保留最后一次出现的位置
+        declarations[prop] = value
+
+    if declarations.get('position', '').split(' ')[0] in ('absolute', 'fixed'):
+        for prop in POSITION_OFFSETS | {'position'}:
+            declarations.pop(prop, None)
+    return tuple(declarations.items())
+
+
+def minify_style(style: str) -> str:
+    """压缩单个 style 字符串"""
+    return ';'.join(f'{prop}:{value}' for prop, value in parse_style(style))
+
+
+def _is_relative(value: str) -> bool:
+    """相对单位的值在子元素上会重新计算，不能按字符串相同省略"""
+    return _RELATIVE_VALUE_RE.search(value) is not None
+
+
+@lru_cache(maxsize=8192)
+def _optimize_element_style(tag: str, style: str, inherited: tuple) -> tuple[str, tuple]:
+    """
+    优化单个元素的 style，返回 (新 style, 传给子元素的继承上下文)
+
+    inherited 为父元素的继承上下文 ((属性, 值), ...)，按结果缓存，同类元素只计算一次。
+    """
+    context = dict(inherited)
+    for prop in UA_DEFAULT_PROPERTIES.get(tag, ()):
+        context.pop(prop, None)
+
+    kept = []
+    for prop, value in parse_style(style):
+        if prop in INHERITED_PROPERTIES:
+            if context.get(prop) == value and not _is_relative(value):
+                continue  # 与继承值相同
+            context[prop] = value
+        kept.append(f'{prop}:{value}')
+    return ';'.join(kept), tuple(sorted(context.items()))
+
+
+@lru_cache(maxsize=1024)
+def _passthrough_context(tag: str, inherited: tuple) -> tuple:
+    """没有 style 的元素：去掉浏览器默认样式覆盖的属性后向下传递"""
+    overridden = UA_DEFAULT_PROPERTIES.get(tag)
+    if not overridden:
+        return inherited
+    return tuple(item for item in inherited if item[0] not in overridden)
+
+
+def inherited_context(style: str) -> tuple:
+    """根据容器的 style 计算子元素的继承上下文"""
+    return tuple(sorted((prop, value) for prop, value in parse_style(style) if prop in INHERITED_PROPERTIES))
+
+
+def optimize_tree_styles(root, inherited: tuple = ()) -> int:
+    """
+    优化 DOM 树中全部元素的 style 属性（就地修改），返回节省的字节数
+
+    Args:
+        root: BeautifulSoup 或 Tag
+        inherited: 外层容器的继承上下文（见 inherited_context），树本身不含外层容器时使用
+    """
+    saved = 0
+    stack = [(child, inherited) for child in reversed(root.contents) if child.name]
+    while stack:
+        node, context = stack.pop()
+        style = node.attrs.get('style')
+        if style is None:
+            child_context = _passthrough_context(node.name, context)
+        else:
+            new_style, child_context = _optimize_element_style(node.name, style, context)
+            saved += len(style) - len(new_style)
+            if new_style:
+                node['style'] = new_style
+            else:
+                del node['style']
+                saved += len(' style=""')
+        stack.extend((child, child_context) for child in reversed(node.contents) if child.name)
+    return saved
+
+
+def minify_style_attributes(html: str) -> str:
+    """只压缩 HTML 字符串中的 style 属性（不解析 DOM，用于缓存的片段，如代码高亮）"""
+    return _STYLE_ATTR_RE.sub(lambda m: f'style="{minify_style(m.group(1))}"', html)
+
+
+def optimize_wechat_html(html: str) -> tuple[str, int]:
+    """
+    优化任意公众号 HTML（如 AI 直接生成的 HTML），返回 (优化后的 HTML, 节省的字节数)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    optimize_tree_styles(soup)
+    optimized = str(soup)
+    return optimized, len(html.encode('utf-8')) - len(optimized.encode('utf-8'))
@@ -0,0 +1,168 @@
+"""
+图片编码
+按字节预算选择格式（优化的 JPEG / PNG）和 JPEG 质量：在保证与原图 SSIM 不低于目标值的前提下取最小的文件，
+用于封面保存（预览下载、上传微信素材库都使用编码后的文件）
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from backend.config import COVER_MAX_KB, COVER_MIN_SSIM
+
+# JPEG 质量搜索范围
+MIN_JPEG_QUALITY = 50
+MAX_JPEG_QUALITY = 95
+# SSIM 窗口大小（像素）
+SSIM_WINDOW = 7
+# 快速 PNG（压缩级别 1）比最低质量 JPEG 大这么多倍时，认为是照片类图片，不再尝试 PNG
+PNG_CANDIDATE_RATIO = 3
+
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+
+# ==================== SSIM ====================
+
+def _luma(img: Image.Image) -> np.ndarray:
+    return np.asarray(img.convert('L'), dtype=np.float64)
+
+
+def _window_mean(x: np.ndarray, k: int) -> np.ndarray:
+    """k x k 窗口均值（积分图，只取完整窗口）"""
+    integral = np.zeros((x.shape[0] + 1, x.shape[1] + 1))
+    integral[1:, 1:] = x.cumsum(0).cumsum(1)
+    sums = integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k]
+    return sums / (k * k)
+
+
+def _reference_stats(x: np.ndarray) -> tuple:
+    """原图的窗口均值和方差（与多个候选比较时只算一次）"""
+    mu_x = _window_mean(x, SSIM_WINDOW)
+    return x, mu_x, _window_mean(x * x, SSIM_WINDOW) - mu_x * mu_x
+
+
+def _ssim_with(stats: tuple, y: np.ndarray) -> float:
+    x, mu_x, var_x = stats
+    if min(x.shape) < SSIM_WINDOW:
+        return 1.0 if np.array_equal(x, y) else 0.0
+    mu_y = _window_mean(y, SSIM_WINDOW)
+    var_y = _window_mean(y * y, SSIM_WINDOW) - mu_y * mu_y
+    cov = _window_mean(x * y, SSIM_WINDOW) - mu_x * mu_y
+
+    numerator = (2 * mu_x * mu_y + _SSIM_C1) * (2 * cov + _SSIM_C2)
+    denominator = (mu_x * mu_x + mu_y * mu_y + _SSIM_C1) * (var_x + var_y + _SSIM_C2)
+    return float((numerator / denominator).mean())
+
+
+def ssim(reference: Image.Image, candidate: Image.Image) -> float:
+    """两张同尺寸图片亮度通道的平均 SSIM（1.0 表示完全相同）"""
+    x = _luma(reference)
+    if min(x.shape) < SSIM_WINDOW:
+        return 1.0 if np.array_equal(x, _luma(candidate)) else 0.0
+    return _ssim_with(_reference_stats(x), _luma(candidate))
+
+
+# ==================== 编码 ====================
+
+def to_rgb(img: Image.Image) -> Image.Image:
+    """转换为 RGB / RGBA（调色板、CMYK 等模式无法直接缩放或保存为 PNG）"""
+    if img.mode in ('RGB', 'RGBA'):
+        return img
+    has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+    return img.convert('RGBA' if has_alpha else 'RGB')
+
+
+def _encode(img: Image.Image, fmt: str, quality: int = None) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    elif quality is not None:
+        img.save(buffer, 'PNG', compress_level=quality)
+    else:
+        img.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _has_transparency(img: Image.Image) -> bool:
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        alpha = img.convert('RGBA').getchannel('A')
+        return alpha.getextrema()[0] < 255
+    return False
+
+
+def _result(data: bytes, fmt: str, quality, score: float, max_bytes: int) -> dict:
+    return {"data": data, "format": fmt, "quality": quality, "ssim": round(score, 4),
+            "bytes": len(data), "within_budget": len(data) <= max_bytes}
+
+
+def encode_to_budget(img: Image.Image, max_bytes: int = None, min_ssim: float = None) -> dict:
+    """
+    按预算编码图片
+
+    1. 渐变、纯色、文字为主的图片：无损 PNG（优化压缩）通常比任何质量的 JPEG 都小，直接使用
+    2. 照片类图片：二分查找 SSIM 不低于 min_ssim 的最低 JPEG 质量
+    3. 超出 max_bytes 时降低 JPEG 质量直到放得下（最低 MIN_JPEG_QUALITY）
+
+    有透明通道的图片只输出 PNG。SSIM 只比较亮度通道。
+
+    Returns:
+        {"data": bytes, "format": "JPEG" | "PNG", "quality": JPEG 质量（PNG 为 None）,
+         "ssim": float, "bytes": int, "within_budget": bool}
+    """
+    max_bytes = max_bytes or COVER_MAX_KB * 1024
+    min_ssim = COVER_MIN_SSIM if min_ssim is None else min_ssim
+
+    if _has_transparency(img):
+        return _result(_encode(img, 'PNG'), 'PNG', None, 1.0, max_bytes)
+
+    rgb = img.convert('RGB')
+    trials = {}
+    stats = None
+
+    def try_quality(quality: int) -> tuple:
+        nonlocal stats
+        if quality not in trials:
+            data = _encode(rgb, 'JPEG', quality)
+            if stats is None:
+                stats = _reference_stats(_luma(rgb))
+            trials[quality] = (data, _ssim_with(stats, _luma(Image.open(io.BytesIO(data)))))
+        return trials[quality]
+
+    # PNG 候选：JPEG 体积随质量单调增长，PNG 不大于最低质量 JPEG 时直接用 PNG
+    smallest_jpeg = _encode(rgb, 'JPEG', MIN_JPEG_QUALITY)
+    png = None
+    if len(_encode(rgb, 'PNG', 1)) <= len(smallest_jpeg) * PNG_CANDIDATE_RATIO:
+        png = _encode(rgb, 'PNG')
+        if len(png) <= len(smallest_jpeg) and len(png) <= max_bytes:
+            return _result(png, 'PNG', None, 1.0, max_bytes)
+
+    # 满足 SSIM 的最低质量
+    low, high = MIN_JPEG_QUALITY, MAX_JPEG_QUALITY
+    best = MAX_JPEG_QUALITY
+    while low <= high:
+        quality = (low + high) // 2
+        if try_quality(quality)[1] >= min_ssim:
+            best = quality
+            high = quality - 1
+        else:
+            low = quality + 1
+
+    data, score = try_quality(best)
+    if png is not None and len(png) <= len(data):
+        return _result(png, 'PNG', None, 1.0, max_bytes)
+
+    if len(data) > max_bytes:
+        # 满足 SSIM 时超出预算：取放得下的最高质量
+        low, high = MIN_JPEG_QUALITY, best - 1
+        best = MIN_JPEG_QUALITY
+        while low <= high:
+            quality = (low + high) // 2
+            if len(try_quality(quality)[0]) <= max_bytes:
+                best = quality
+                low = quality + 1
+            else:
+                high = quality - 1
+        data, score = try_quality(best)
+    return _result(data, 'JPEG', best, score, max_bytes)
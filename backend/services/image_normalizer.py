@@ -0,0 +1,193 @@
+"""
+上传前图片规范化
+手机照片等大图上传图床 / 公众号前：按 EXIF 方向摆正后去掉元数据（拍摄地点等），缩小到文章显示需要的尺寸，
+WebP / HEIC / BMP 等转成 JPEG / PNG，并按字节预算编码（见 encode_to_budget）。
+解码 / 编码在进程池里执行，不占用请求线程的 GIL；结果按 (原图内容, 参数) 缓存在 UPLOAD_NORMALIZE_DIR，
+目录超过 UPLOAD_NORMALIZE_MAX_MB 时删除最久未使用的文件
+"""
+
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from backend.config import (UPLOAD_MAX_WIDTH, UPLOAD_MAX_HEIGHT, UPLOAD_MAX_KB, UPLOAD_MIN_SSIM, UPLOAD_NORMALIZE_DIR,
+                            UPLOAD_NORMALIZE_WORKERS, UPLOAD_NORMALIZE_TIMEOUT, UPLOAD_NORMALIZE_MAX_MB)
+from backend.services.cover_store import enforce_size_limit
+from backend.services.image_encoder import encode_to_budget, to_rgb
+from backend.utils.cache import file_content_hash
+from backend.utils.process_pool import SpawnProcessPool
+
+# HEIC / HEIF（iPhone 照片）需要 pillow-heif，未安装时这类图片原样上传
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+# 规范化方式有变化时递增，使旧结果失效
+NORMALIZE_VERSION = 2
+# 不需要转换的格式（公众号正文图片只支持 jpg/png，GIF 动图保持原样）
+ACCEPTED_FORMATS = ('JPEG', 'PNG')
+# EXIF 方向标签；5-8 表示宽高互换（旋转 90° / 270°）
+ORIENTATION_TAG = 0x0112
+SWAPPED_ORIENTATIONS = (5, 6, 7, 8)
+# 超出字节预算时最多再缩小几次
+MAX_DOWNSCALE_STEPS = 3
+# 每生成这么多个文件检查一次目录大小；最近 EVICT_MIN_AGE 秒内用过的文件可能正在上传，不删除
+EVICT_INTERVAL = 20
+EVICT_MIN_AGE = 600
+
+_pool = None
+_written = 0
+_pool_lock = threading.Lock()
+
+
+# ==================== 规范化（在子进程中执行） ====================
+
+def _needs_normalize(img: Image.Image, size: int, max_width: int, max_height: int, max_bytes: int) -> bool:
+    return (img.format not in ACCEPTED_FORMATS or img.width > max_width or img.height > max_height
+            or size > max_bytes or bool(img.getexif()))
+
+
+def _draft_size(img: Image.Image, max_width: int, max_height: int) -> tuple:
+    """JPEG draft 的请求尺寸（文件存储方向）：按摆正后的尺寸计算缩放比例"""
+    width, height = img.size
+    if img.getexif().get(ORIENTATION_TAG) in SWAPPED_ORIENTATIONS:
+        scale = min(1.0, max_width / height, max_height / width)
+    else:
+        scale = min(1.0, max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def normalize_image_file(source: str, target: str, max_width: int, max_height: int,
+                         max_bytes: int, min_ssim: float) -> dict:
+    """
+    规范化一张图片并写入 target（已经符合要求的图片不处理）
+
+    Returns:
+        {"path": 上传用的文件路径, "changed": 是否生成了新文件, "format", "width", "height",
+         "bytes", "original_bytes", "reason": 未处理的原因}
+    """
+    size = os.path.getsize(source)
+    with Image.open(source) as img:
+        info = {"path": source, "changed": False, "format": img.format, "width": img.width,
+                "height": img.height, "bytes": size, "original_bytes": size, "reason": None}
+        if img.format == 'GIF' and getattr(img, 'is_animated', False):
+            info["reason"] = "动图保持原样"
+            return info
+        if not _needs_normalize(img, size, max_width, max_height, max_bytes):
+            info["reason"] = "已符合要求"
+            return info
+
+        # 大 JPEG 直接按缩小后的尺寸解码（DCT 缩放），省去全尺寸解码；
+        # 目标尺寸按摆正后的方向计算，再换回文件中的存储方向
+        if img.format == 'JPEG':
+            img.draft('RGB', _draft_size(img, max_width, max_height))
+        img = ImageOps.exif_transpose(img)  # 按 EXIF 方向摆正，编码时不再写入 EXIF
+        if img.mode != 'L':
+            img = to_rgb(img)  # 调色板等模式不能用 LANCZOS 缩放（会退化为最近邻）
+        img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        encoded = encode_to_budget(img, max_bytes, min_ssim)
+        for _ in range(MAX_DOWNSCALE_STEPS):
+            if encoded["within_budget"]:
+                break
+            # 最低质量仍超出预算：按面积比例缩小后重新编码
+            scale = (max_bytes / encoded["bytes"]) ** 0.5 * 0.9
+            img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))),
+                             Image.Resampling.LANCZOS)
+            encoded = encode_to_budget(img, max_bytes, min_ssim)
+
+    target = str(Path(target).with_suffix('.jpg' if encoded["format"] == 'JPEG' else '.png'))
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded["data"])
+    os.replace(tmp_path, target)
+    info.update({"path": target, "changed": True, "format": encoded["format"], "width": img.width,
+                 "height": img.height, "bytes": encoded["bytes"]})
+    return info
+
+
+# ==================== 进程池 ====================
+
+def _get_pool() -> SpawnProcessPool:
+    """延迟创建进程池（spawn：不继承请求线程持有的锁，子进程不导入 app.py；gunicorn --preload 时也不会在主进程里创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SpawnProcessPool(max_workers=UPLOAD_NORMALIZE_WORKERS)
+    return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _evict_normalized() -> None:
+    global _written
+    _written += 1
+    if _written % EVICT_INTERVAL == 0:
+        enforce_size_limit(UPLOAD_NORMALIZE_DIR, int(UPLOAD_NORMALIZE_MAX_MB * 1024 * 1024), min_age=EVICT_MIN_AGE)
+
+
+def normalize_for_upload(image_path: str, max_bytes: int = None, max_width: int = None,
+                         max_height: int = None, min_ssim: float = None) -> dict:
+    """
+    上传前规范化图片（在进程池中执行；相同原图和参数的结果直接复用）
+
+    任何失败（无法识别的格式、进程池异常、超时）都返回原图路径，由上传流程照常处理。
+
+    Args:
+        image_path: 本地图片路径
+        max_bytes: 字节预算，默认 UPLOAD_MAX_KB
+        max_width / max_height: 最大尺寸，默认 UPLOAD_MAX_WIDTH / UPLOAD_MAX_HEIGHT
+
+    Returns:
+        {"path": 上传用的文件路径, "changed": bool, ...}，见 normalize_image_file
+    """
+    params = [max_width or UPLOAD_MAX_WIDTH, max_height or UPLOAD_MAX_HEIGHT,
+              int(max_bytes or UPLOAD_MAX_KB * 1024), UPLOAD_MIN_SSIM if min_ssim is None else min_ssim]
+    fallback = {"path": image_path, "changed": False, "reason": None}
+    try:
+        digest = file_content_hash(image_path)
+    except OSError as e:
+        return {**fallback, "reason": str(e)}
+
+    key = hashlib.sha1(json.dumps([digest, params, NORMALIZE_VERSION]).encode('utf-8')).hexdigest()
+    output_dir = Path(UPLOAD_NORMALIZE_DIR)
+    for ext in ('jpg', 'png'):
+        cached = output_dir / f"norm_{key}.{ext}"
+        if cached.is_file():
+            os.utime(cached)  # 记录最近使用时间（临时目录按大小淘汰）
+            return {"path": str(cached), "changed": True, "cached": True}
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        future = _get_pool().submit(normalize_image_file, os.path.abspath(image_path),
+                                    str((output_dir / f"norm_{key}").absolute()), *params)
+        info = future.result(timeout=UPLOAD_NORMALIZE_TIMEOUT)
+    except BrokenProcessPool as e:
+        _reset_pool()
+        print(f"⚠ 图片规范化进程池异常，已重建: {e}")
+        return {**fallback, "reason": str(e)}
+    except Exception as e:
+        print(f"⚠ 图片规范化失败，按原图上传 {image_path}: {e}")
+        return {**fallback, "reason": str(e)}
+
+    if info["changed"]:
+        _evict_normalized()
+        print(f"🖼 图片规范化: {os.path.basename(image_path)} {info['original_bytes'] / 1024:.0f}KB -> "
+              f"{info['width']}x{info['height']} {info['format']} {info['bytes'] / 1024:.0f}KB")
+    else:
+        info["path"] = image_path
+    return info
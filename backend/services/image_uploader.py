@@ -6,24 +6,45 @@
 
 import os
 import re
-import base64
+import html
+import time
+import hashlib
+import random
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
+from urllib.parse import unquote
 
-from backend.config import IMGBB_API_KEY
+from backend.config import (IMGBB_API_KEY, UPLOAD_WORKERS, UPLOAD_DEFAULT_HOST_CONCURRENCY, UPLOAD_HOST_CONCURRENCY,
+                            UPLOAD_RETRIES, UPLOAD_RETRY_BACKOFF)
+from backend.services.image_normalizer import normalize_for_upload
+from backend.services.upload_cache import cached_upload
+from backend.utils.cache import file_content_hash
+from backend.utils.multipart import MultipartStream
 
+IMGBB_UPLOAD_URL = "https://api.imgbb.com/1/upload"
 
-def upload_to_imgbb(image_path: str, api_key: str = None) -> dict:
+
+def _imgbb_expires_at(result: dict) -> Optional[float]:
+    """ImgBB 返回的 expiration 为有效秒数，0 表示不过期"""
+    expiration = int(result.get("expiration") or 0)
+    return time.time() + expiration if expiration > 0 else None
+
+
+def upload_to_imgbb(image_path: str, api_key: str = None, use_cache: bool = True) -> dict:
     """
-    上传图片到 ImgBB 图床
+    上传图片到 ImgBB 图床（内容相同的图片已上传过时直接返回缓存的链接）
     
     Args:
         image_path: 本地图片路径
         api_key: ImgBB API Key（如果不提供则使用配置文件中的）
+        use_cache: 是否查询上传缓存
     
     Returns:
-        {"success": bool, "url": str, "display_url": str, "thumb_url": str, "error": str}
+        {"success": bool, "url": str, "display_url": str, "thumb_url": str, "error": str,
+         "retryable": 失败是否可以重试（网络错误、限流、服务端错误）, "cached": 是否命中上传缓存}
     """
     api_key = api_key or IMGBB_API_KEY
     
@@ -33,23 +54,27 @@ def upload_to_imgbb(image_path: str, api_key: str = None) -> dict:
             "url": None,
             "display_url": None,
             "thumb_url": None,
-            "error": "未配置 ImgBB API Key，请在 config.py 中设置 IMGBB_API_KEY"
+            "error": "未配置 ImgBB API Key，请在 config.py 中设置 IMGBB_API_KEY",
+            "retryable": False
         }
     
+    # 缓存按账号区分：别的用户上传过同一张图片时不复用其链接
+    account = hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:16]
+    return cached_upload(image_path, f"imgbb:{account}", lambda path: _post_to_imgbb(path, api_key),
+                         expires_at=_imgbb_expires_at, use_cache=use_cache)
+
+
+def _post_to_imgbb(image_path: str, api_key: str) -> dict:
     try:
-        # 读取图片并转换为 base64
+        # 以 multipart 上传原始文件，请求体边读文件边发送（不做 base64，整个文件不进内存）
         with open(image_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode("utf-8")
-        
-        # 上传到 ImgBB
-        response = requests.post(
-            "https://api.imgbb.com/1/upload",
-            data={
-                "key": api_key,
-                "image": image_data,
-            },
-            timeout=60
-        )
+            body = MultipartStream({"key": api_key}, {"image": (os.path.basename(image_path), f)})
+            response = requests.post(
+                IMGBB_UPLOAD_URL,
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=60
+            )
         
         result = response.json()
         
@@ -61,6 +86,7 @@ def upload_to_imgbb(image_path: str, api_key: str = None) -> dict:
                 "display_url": data["display_url"],
                 "thumb_url": data["thumb"]["url"],
                 "delete_url": data.get("delete_url"),
+                "expiration": data.get("expiration"),
                 "error": None
             }
         else:
@@ -69,7 +95,8 @@ def upload_to_imgbb(image_path: str, api_key: str = None) -> dict:
                 "url": None,
                 "display_url": None,
                 "thumb_url": None,
-                "error": result.get("error", {}).get("message", "上传失败")
+                "error": result.get("error", {}).get("message", "上传失败"),
+                "retryable": response.status_code == 429 or response.status_code >= 500
             }
             
     except Exception as e:
@@ -78,17 +105,20 @@ def upload_to_imgbb(image_path: str, api_key: str = None) -> dict:
             "url": None,
             "display_url": None,
             "thumb_url": None,
-            "error": str(e)
+            "error": str(e),
+            "retryable": isinstance(e, (requests.RequestException, ValueError))
         }
 
 
-def upload_image(image_path: str, service: str = "imgbb") -> dict:
+def upload_image(image_path: str, service: str = "imgbb", use_cache: bool = True, normalize: bool = True) -> dict:
     """
     上传图片到指定图床服务
     
     Args:
         image_path: 本地图片路径
         service: 图床服务名称，目前支持 "imgbb"
+        use_cache: 是否查询上传缓存（内容相同的图片不重复上传）
+        normalize: 上传前是否规范化（缩小尺寸、去掉元数据、按字节预算压缩，见 normalize_for_upload）
     
     Returns:
         上传结果字典
@@ -97,89 +127,255 @@ def upload_image(image_path: str, service: str = "imgbb") -> dict:
         return {
             "success": False,
             "url": None,
-            "error": f"文件不存在: {image_path}"
+            "error": f"文件不存在: {image_path}",
+            "retryable": False
         }
     
     if service == "imgbb":
-        return upload_to_imgbb(image_path)
+        if normalize:
+            image_path = normalize_for_upload(image_path)["path"]
+        return upload_to_imgbb(image_path, use_cache=use_cache)
     else:
         return {
             "success": False,
             "url": None,
-            "error": f"不支持的图床服务: {service}"
+            "error": f"不支持的图床服务: {service}",
+            "retryable": False
         }
 
 
-def process_markdown_images(md_content: str, base_dir: str = ".") -> tuple[str, list]:
+# ==================== 并发上传 ====================
+# 图片上传是网络等待为主，用有界线程池并发；每个图床另有并发上限，避免触发限流
+
+_upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+_host_semaphores = {}
+_host_lock = threading.Lock()
+
+
+def _host_semaphore(host: str) -> threading.BoundedSemaphore:
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        with _host_lock:
+            semaphore = _host_semaphores.setdefault(
+                host, threading.BoundedSemaphore(UPLOAD_HOST_CONCURRENCY.get(host, UPLOAD_DEFAULT_HOST_CONCURRENCY)))
+    return semaphore
+
+
+def upload_with_retry(upload: Callable[[str], dict], image_path: str, host: str,
+                      retries: int = None, backoff: float = None) -> dict:
+    """
+    在图床并发上限内上传，可重试的失败按指数退避（带随机抖动）重试
+    
+    Args:
+        upload: 上传函数，接收本地路径，返回 {"success", "url", "error", "retryable"}；
+                没有 retryable 字段的失败不重试，抛出的异常视为可重试
+        host: 图床名称（并发上限按此区分）
+        retries: 最多重试次数，默认 UPLOAD_RETRIES
+        backoff: 第一次重试前的等待秒数，之后每次翻倍，默认 UPLOAD_RETRY_BACKOFF
+    
+    Returns:
+        上传结果，附带 attempts（尝试次数）
+    """
+    retries = UPLOAD_RETRIES if retries is None else retries
+    backoff = UPLOAD_RETRY_BACKOFF if backoff is None else backoff
+    
+    for attempt in range(retries + 1):
+        with _host_semaphore(host):
+            try:
+                result = upload(image_path)
+            except Exception as e:
+                result = {"success": False, "url": None, "error": str(e), "retryable": True}
+        result["attempts"] = attempt + 1
+        if result["success"] or not result.get("retryable") or attempt == retries:
+            return result
+        delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        print(f"  ↻ 上传失败，{delay:.1f}s 后重试 ({attempt + 1}/{retries}): {result.get('error')}")
+        time.sleep(delay)
+    return result
+
+
+# ==================== Markdown 图片替换 ====================
+# 本地图片的三种写法：行内 ![alt](path "title")、引用式 ![alt][label] + [label]: path、HTML <img src="path">
+# 代码块和行内代码里的图片语法原样保留
+
+_IMAGE_SOURCE_RE = re.compile('|'.join([
+    r'^ {0,3}(?P<fence>`{3,}|~{3,})[^\n]*$[\s\S]*?(?:^ {0,3}(?P=fence)[`~]*[ \t]*$|\Z)',
+    # 行内代码不跨空行（段落中落单的反引号不会吞掉后面段落里的图片）
+    r'(?P<tick>`+)(?!`)(?:(?!\n[ \t]*\n)[\s\S])*?(?<!`)(?P=tick)(?!`)',
+    # 括号内整体（允许空格和一层成对括号），地址和标题在 _split_destination 中拆开
+    r'!\[[^\]]*\]\((?P<inline>(?:[^()\n]|\([^()\n]*\))+)\)',
+    r'^ {0,3}\[(?P<label>[^\]]+)\]:[ \t]*(?P<definition><[^>\n]*>|\S+)',
+    r'<img\b[^>]*?\bsrc\s*=\s*(?:"(?P<src_dq>[^"]*)"|\'(?P<src_sq>[^\']*)\'|(?P<src>[^\s"\'>]+))',
+]), re.M | re.I)
+# 行内图片括号内的内容：地址 [标题]
+_DESTINATION_RE = re.compile(r'\s*(?P<path>.*?)(?:\s+(?:"[^"]*"|\'[^\']*\'|\([^)]*\)))?\s*', re.S)
+# 引用式图片：![alt][label]、![label][]、![label]
+_IMAGE_REFERENCE_RE = re.compile(r'!\[([^\]]*)\](?:\[([^\]]*)\])?(?!\()')
+
+
+def _normalize_label(label: str) -> str:
+    return ' '.join(label.split()).lower()
+
+
+def find_markdown_images(md_content: str) -> list:
+    """
+    找出 Markdown 中所有图片地址的位置（按文档顺序）
+    
+    引用式图片只返回被图片引用的链接定义（普通链接的定义不算）。
+    
+    Returns:
+        [{"kind": "inline" | "reference" | "html", "path": 图片地址, "start", "end": 地址在原文中的位置}, ...]
+    """
+    image_labels = {_normalize_label(ref or alt) for alt, ref in _IMAGE_REFERENCE_RE.findall(md_content)}
+    
+    images = []
+    for match in _IMAGE_SOURCE_RE.finditer(md_content):
+        group = match.lastgroup
+        if group in ('fence', 'tick'):
+            continue
+        if group == 'definition':
+            if _normalize_label(match.group('label')) not in image_labels:
+                continue
+            kind = 'reference'
+        else:
+            kind = 'inline' if group == 'inline' else 'html'
+        start, end = match.span(group)
+        path = match.group(group)
+        if kind == 'inline':
+            destination = _DESTINATION_RE.fullmatch(path)
+            start, end = start + destination.start('path'), start + destination.end('path')
+            path = destination.group('path')
+            if not path:
+                continue
+        if path.startswith('<') and path.endswith('>'):
+            path = path[1:-1]
+            start, end = start + 1, end - 1
+        if kind == 'html':
+            path = html.unescape(path)
+        images.append({"kind": kind, "path": path, "start": start, "end": end})
+    return images
+
+
+def _resolve_local_path(image_path: str, base_dir: str) -> Optional[str]:
+    """本地图片的完整路径（兼容 URL 编码的文件名，如 %20），不存在时返回 None"""
+    for candidate in dict.fromkeys([image_path, unquote(image_path)]):
+        full_path = os.path.join(base_dir, candidate)
+        if os.path.isfile(full_path):
+            return full_path
+    return None
+
+
+def process_markdown_images(md_content: str, base_dir: str = ".",
+                            upload: Callable[[str], dict] = None, host: str = "imgbb") -> tuple[str, list]:
     """
     处理 Markdown 中的本地图片，上传到图床并替换链接
     
+    支持行内图片、引用式图片和 HTML <img> 标签。本地图片并发上传；内容相同的文件（按内容哈希）只上传一次。
+    替换按图片地址在原文中的位置一次拼接完成，只改写地址本身（alt、标题等保持不变）。
+    结果列表按图片在文档中的顺序排列。
+    
     Args:
         md_content: Markdown 内容
         base_dir: 基础目录（用于解析相对路径）
+        upload: 上传函数（接收本地路径），默认 upload_image；如公众号正文图片可传 WeChatPublisher.upload_content_image
+        host: 图床名称（用于并发上限）
     
     Returns:
         (处理后的 Markdown 内容, 上传结果列表)
     """
-    # 匹配 Markdown 图片语法 ![alt](path)
-    image_pattern = r'!\[([^\]]*)\]\(([^)]+)\)'
+    upload = upload or upload_image
     
-    results = []
-    processed_content = md_content
-    
-    for match in re.finditer(image_pattern, md_content):
-        alt_text = match.group(1)
-        image_path = match.group(2)
-        original_syntax = match.group(0)
+    # 第一遍：解析路径、计算内容哈希，每个不同的内容提交一次上传
+    images = find_markdown_images(md_content)
+    uploads = {}  # 内容哈希 -> Future
+    path_hashes = {}  # 实际路径 -> 内容哈希（同一文件只读一次）
+    for entry in images:
+        entry["hash"] = entry["error"] = None
+        image_path = entry["path"]
         
         # 跳过已经是 URL 的图片
-        if image_path.startswith(('http://', 'https://', 'data:')):
+        if image_path.startswith(('http://', 'https://', 'data:', '//')):
+            continue
+        
+        # 解析相对路径
+        full_path = _resolve_local_path(image_path, base_dir)
+        if full_path is None:
+            entry["error"] = f"文件不存在: {os.path.join(base_dir, image_path)}"
+            continue
+        
+        real_path = os.path.realpath(full_path)
+        digest = path_hashes.get(real_path)
+        if digest is None:
+            try:
+                digest = path_hashes[real_path] = file_content_hash(real_path)
+            except OSError as e:
+                entry["error"] = str(e)
+                continue
+        entry["hash"] = digest
+        if digest not in uploads:
+            print(f"正在上传图片: {image_path}")
+            uploads[digest] = _upload_executor.submit(upload_with_retry, upload, full_path, host)
+    
+    # 第二遍：按文档顺序收集结果，把原文按图片地址切开后一次拼接
+    results = []
+    parts = []
+    position = 0
+    reported = set()
+    for entry in images:
+        image_path = entry["path"]
+        if entry["hash"] is None and entry["error"] is None:
             results.append({
                 "original": image_path,
                 "uploaded": image_path,
                 "success": True,
-                "skipped": True
+                "skipped": True,
+                "kind": entry["kind"]
             })
             continue
-        
-        # 解析相对路径
-        full_path = os.path.join(base_dir, image_path)
-        
-        if not os.path.exists(full_path):
+        if entry["error"]:
             results.append({
                 "original": image_path,
                 "uploaded": None,
                 "success": False,
-                "error": f"文件不存在: {full_path}"
+                "error": entry["error"],
+                "kind": entry["kind"]
             })
             continue
         
-        # 上传图片
-        print(f"正在上传图片: {image_path}")
-        upload_result = upload_image(full_path)
+        upload_result = uploads[entry["hash"]].result()
+        duplicate = entry["hash"] in reported
+        reported.add(entry["hash"])
         
         if upload_result["success"]:
             # 替换为在线链接
-            new_syntax = f'![{alt_text}]({upload_result["url"]})'
-            processed_content = processed_content.replace(original_syntax, new_syntax, 1)
+            url = upload_result["url"]
+            parts.append(md_content[position:entry["start"]])
+            parts.append(html.escape(url) if entry["kind"] == 'html' else url)
+            position = entry["end"]
             
             results.append({
                 "original": image_path,
-                "uploaded": upload_result["url"],
+                "uploaded": url,
                 "success": True,
-                "skipped": False
+                "skipped": False,
+                "duplicate": duplicate,
+                "kind": entry["kind"]
             })
-            print(f"  ✓ 上传成功: {upload_result['url']}")
+            if not duplicate:
+                print(f"  ✓ 上传成功: {image_path} -> {url}")
         else:
             results.append({
                 "original": image_path,
                 "uploaded": None,
                 "success": False,
-                "error": upload_result["error"]
+                "error": upload_result["error"],
+                "kind": entry["kind"]
             })
-            print(f"  ✗ 上传失败: {upload_result['error']}")
+            if not duplicate:
+                print(f"  ✗ 上传失败: {image_path}: {upload_result['error']}")
     
-    return processed_content, results
+    parts.append(md_content[position:])
+    return ''.join(parts), results
 
 
 if __name__ == "__main__":
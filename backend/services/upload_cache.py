@@ -0,0 +1,264 @@
+"""
+上传缓存
+图片内容哈希 -> 图床链接 的本地 SQLite 缓存（多进程共享、重启后保留），内容没变的图片不再重复上传。
+按 (内容哈希, 图床账号) 区分，记录图床给出的过期时间，不保存删除链接等私有字段；条目数超出上限时淘汰最久未使用的，
+后台线程定期用 verify_upload_cache 抽样检查缓存的链接是否还能访问，失效的删除
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable
+
+import requests
+
+from backend.config import (UPLOAD_CACHE_PATH, UPLOAD_CACHE_MAX_ENTRIES, UPLOAD_CACHE_TTL_DAYS, UPLOAD_CACHE_VERIFY_SAMPLE,
+                            UPLOAD_CACHE_VERIFY_INTERVAL_HOURS)
+from backend.utils.cache import file_content_hash
+
+# 每插入这么多条检查一次条目上限
+EVICT_INTERVAL = 100
+# 只属于上传者本人的字段（如 ImgBB 的删除链接），不写入缓存，命中缓存的其他用户拿不到
+PRIVATE_FIELDS = ("delete_url",)
+
+_local = threading.local()
+_stats = {"hits": 0, "misses": 0}
+_inserts = 0
+_verifier_pid = None
+_verifier_lock = threading.Lock()
+
+
+# ==================== 数据库 ====================
+
+def _connect() -> sqlite3.Connection:
+    """每个线程一个连接（sqlite3 连接不能跨线程使用）"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        Path(UPLOAD_CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(UPLOAD_CACHE_PATH, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')  # 读写互不阻塞，多个 worker 进程共享
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS uploads (
+                hash TEXT NOT NULL,
+                host TEXT NOT NULL,
+                url TEXT NOT NULL,
+                result TEXT,
+                expires_at REAL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hash, host)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_last_used ON uploads (last_used_at)')
+        _local.conn = conn
+    return conn
+
+
+def get_cached_upload(digest: str, host: str) -> dict:
+    """
+    查找已上传的图片，未命中或已过期返回 None
+
+    Returns:
+        上传时的结果字典（url 等），附带 cached=True
+    """
+    now = time.time()
+    try:
+        conn = _connect()
+        row = conn.execute(
+            'SELECT url, result, expires_at FROM uploads WHERE hash = ? AND host = ?', (digest, host)).fetchone()
+        if row is None or (row['expires_at'] is not None and row['expires_at'] <= now):
+            _stats["misses"] += 1
+            return None
+        conn.execute('UPDATE uploads SET last_used_at = ?, hits = hits + 1 WHERE hash = ? AND host = ?',
+                     (now, digest, host))
+    except sqlite3.Error as e:
+        print(f"⚠ 上传缓存读取失败: {e}")
+        return None
+
+    _stats["hits"] += 1
+    result = json.loads(row['result']) if row['result'] else {}
+    for field in PRIVATE_FIELDS:
+        result.pop(field, None)  # 旧版本写入的记录
+    return {**result, "success": True, "url": row['url'], "error": None, "cached": True}
+
+
+def cache_upload(digest: str, host: str, result: dict, expires_at: float = None) -> None:
+    """
+    记录上传结果
+
+    Args:
+        result: 上传结果（必须包含 url；PRIVATE_FIELDS 中的字段不保存）
+        expires_at: 图床给出的过期时间戳；没有时按 UPLOAD_CACHE_TTL_DAYS 计算
+    """
+    global _inserts
+    now = time.time()
+    if expires_at is None and UPLOAD_CACHE_TTL_DAYS > 0:
+        expires_at = now + UPLOAD_CACHE_TTL_DAYS * 86400
+    extra = {k: v for k, v in result.items()
+             if k not in ("success", "url", "error", "retryable", "attempts", "cached") + PRIVATE_FIELDS}
+    try:
+        _connect().execute(
+            'INSERT OR REPLACE INTO uploads (hash, host, url, result, expires_at, created_at, last_used_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (digest, host, result["url"], json.dumps(extra, ensure_ascii=False), expires_at, now, now))
+    except sqlite3.Error as e:
+        print(f"⚠ 上传缓存写入失败: {e}")
+        return
+
+    _inserts += 1
+    if _inserts % EVICT_INTERVAL == 0:
+        evict_upload_cache()
+
+
+def invalidate_upload(digest: str, host: str) -> None:
+    """删除一条缓存（链接已失效）"""
+    try:
+        _connect().execute('DELETE FROM uploads WHERE hash = ? AND host = ?', (digest, host))
+    except sqlite3.Error as e:
+        print(f"⚠ 上传缓存删除失败: {e}")
+
+
+def evict_upload_cache(max_entries: int = None) -> int:
+    """删除已过期的条目，再按最近使用时间淘汰超出上限的条目，返回删除的条目数"""
+    max_entries = UPLOAD_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    try:
+        conn = _connect()
+        removed = conn.execute('DELETE FROM uploads WHERE expires_at IS NOT NULL AND expires_at <= ?',
+                               (time.time(),)).rowcount
+        removed += conn.execute('''
+            DELETE FROM uploads WHERE rowid IN (
+                SELECT rowid FROM uploads ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,)).rowcount
+    except sqlite3.Error as e:
+        print(f"⚠ 上传缓存清理失败: {e}")
+        return 0
+    if removed:
+        print(f"🧹 上传缓存清理了 {removed} 条过期 / 最久未使用的记录")
+    return removed
+
+
+# ==================== 带缓存的上传 ====================
+
+def cached_upload(image_path: str, host: str, upload: Callable[[str], dict],
+                  expires_at: Callable[[dict], float] = None, use_cache: bool = True) -> dict:
+    """
+    内容相同的图片已上传过时直接返回缓存的链接，否则调用 upload 上传并记录
+
+    Args:
+        image_path: 本地图片路径
+        host: 图床名称（缓存按此区分；同一图床的不同账号应使用不同名称，如 imgbb:<账号指纹>）
+        upload: 实际上传函数，接收本地路径
+        expires_at: 从上传结果中取出过期时间戳的函数（图床不过期时返回 None）
+        use_cache: False 时跳过查询，但仍记录新的结果
+
+    Returns:
+        上传结果，附带 cached（是否命中缓存）
+    """
+    try:
+        digest = file_content_hash(image_path)
+    except OSError:
+        return upload(image_path)  # 文件读取失败由上传函数给出错误
+
+    if use_cache:
+        cached = get_cached_upload(digest, host)
+        if cached is not None:
+            return cached
+
+    result = upload(image_path)
+    if result.get("success") and result.get("url"):
+        cache_upload(digest, host, result, expires_at(result) if expires_at else None)
+    return {**result, "cached": False}
+
+
+# ==================== 抽样校验 ====================
+
+def _url_alive(url: str, timeout: float) -> bool:
+    """链接是否还能访问；网络错误无法判断时返回 None"""
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+        if response.status_code in (403, 405, 501):  # 部分图床不支持 HEAD
+            response = requests.get(url, timeout=timeout, stream=True)
+            response.close()
+    except requests.RequestException:
+        return None
+    if response.status_code in (404, 410):
+        return False
+    return response.status_code < 400 or None
+
+
+def verify_upload_cache(sample: int = None, timeout: float = 10) -> dict:
+    """
+    随机抽取 sample 条缓存，检查链接是否还能访问，确认失效（404 / 410）的删除
+
+    Returns:
+        {"checked": 检查数, "alive": 可访问数, "removed": 删除数, "unknown": 无法判断数}
+    """
+    sample = UPLOAD_CACHE_VERIFY_SAMPLE if sample is None else sample
+    try:
+        rows = _connect().execute('SELECT hash, host, url FROM uploads ORDER BY RANDOM() LIMIT ?',
+                                  (sample,)).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠ 上传缓存读取失败: {e}")
+        rows = []
+
+    summary = {"checked": len(rows), "alive": 0, "removed": 0, "unknown": 0}
+    for row in rows:
+        alive = _url_alive(row['url'], timeout)
+        if alive:
+            summary["alive"] += 1
+        elif alive is False:
+            invalidate_upload(row['hash'], row['host'])
+            summary["removed"] += 1
+        else:
+            summary["unknown"] += 1
+    print(f"🔍 上传缓存抽样校验: 检查 {summary['checked']} 条，失效 {summary['removed']} 条")
+    return summary
+
+
+def _verify_loop(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            verify_upload_cache()
+        except Exception as e:
+            print(f"⚠ 上传缓存抽样校验失败: {e}")
+
+
+def start_upload_cache_verifier() -> bool:
+    """
+    在当前进程启动后台校验线程，每隔 UPLOAD_CACHE_VERIFY_INTERVAL_HOURS 小时抽样校验一次
+
+    可重复调用：每个进程只启动一次（fork 出的 worker 需在自己的进程里调用）。返回本次是否新启动了线程
+    """
+    global _verifier_pid
+    if _verifier_pid == os.getpid() or UPLOAD_CACHE_VERIFY_INTERVAL_HOURS <= 0 or UPLOAD_CACHE_VERIFY_SAMPLE <= 0:
+        return False
+    with _verifier_lock:
+        if _verifier_pid == os.getpid():
+            return False
+        _verifier_pid = os.getpid()
+    threading.Thread(target=_verify_loop, args=(UPLOAD_CACHE_VERIFY_INTERVAL_HOURS * 3600,),
+                     name="upload-cache-verifier", daemon=True).start()
+    return True
+
+
+def upload_cache_stats() -> dict:
+    """上传缓存的条目数、命中统计"""
+    try:
+        entries = _connect().execute('SELECT COUNT(*) FROM uploads').fetchone()[0]
+        size = os.path.getsize(UPLOAD_CACHE_PATH)
+    except (sqlite3.Error, OSError):
+        entries, size = 0, 0
+    return {
+        "entries": entries,
+        "bytes": size,
+        "max_entries": UPLOAD_CACHE_MAX_ENTRIES,
+        "ttl_days": UPLOAD_CACHE_TTL_DAYS,
+        **_stats,
+    }
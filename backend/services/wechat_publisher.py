@@ -7,9 +7,15 @@
 
 import requests
 import time
+import hashlib
 from typing import Optional
 
-from backend.config import WECHAT_API_URL, WECHAT_API_KEY, WECHAT_APP_ID, WECHAT_APP_SECRET
+from backend.config import WECHAT_API_URL, WECHAT_API_KEY, WECHAT_APP_ID, WECHAT_APP_SECRET, UPLOAD_MAX_KB
+from backend.services.image_normalizer import normalize_for_upload
+from backend.services.upload_cache import cached_upload
+
+# 正文图片（media/uploadimg）大小上限
+WECHAT_CONTENT_IMAGE_MAX_KB = 1000
 
 
 # 缓存 access_token
@@ -158,7 +164,8 @@ def open_draft_switch(access_token: str) -> dict:
 class WeChatPublisher:
     """微信公众号发布器"""
     
-    def __init__(self, api_url: str = None, api_key: str = None, access_token: str = None, auto_token: bool = True):
+    def __init__(self, api_url: str = None, api_key: str = None, access_token: str = None, auto_token: bool = True,
+                 app_id: str = None):
         """
         初始化发布器
         
@@ -167,7 +174,9 @@ class WeChatPublisher:
             api_key: API Key（如果使用第三方服务）
             access_token: 微信 access_token（如果直接使用官方 API）
             auto_token: 是否自动获取 access_token
+            app_id: 公众号 AppID（上传缓存按账号区分），默认 WECHAT_APP_ID
         """
+        self.app_id = app_id or WECHAT_APP_ID
         self.api_url = api_url or WECHAT_API_URL
         self.api_key = api_key or WECHAT_API_KEY
         self.access_token = access_token
@@ -228,15 +237,19 @@ class WeChatPublisher:
                 "error": str(e)
             }
     
-    def upload_content_image(self, image_path: str) -> dict:
+    def upload_content_image(self, image_path: str, use_cache: bool = True, normalize: bool = True) -> dict:
         """
         上传图文消息内的图片（用于文章正文中的图片）
+        内容相同的图片已上传过时直接返回缓存的链接（正文图片链接长期有效）
+        微信要求 jpg/png 且小于 1MB，上传前先规范化（见 normalize_for_upload）
         
         Args:
             image_path: 本地图片路径
+            use_cache: 是否查询上传缓存
+            normalize: 上传前是否规范化
         
         Returns:
-            {"success": bool, "url": str, "error": str}
+            {"success": bool, "url": str, "error": str, "cached": bool}
         """
         if not self.access_token:
             return {
@@ -245,6 +258,13 @@ class WeChatPublisher:
                 "error": "未设置 access_token"
             }
         
+        if normalize:
+            image_path = normalize_for_upload(image_path, max_bytes=min(UPLOAD_MAX_KB, WECHAT_CONTENT_IMAGE_MAX_KB) * 1024)["path"]
+        # 缓存按公众号区分：别的账号上传过同一张图片时不复用其链接（不知道 AppID 时按 access_token 区分）
+        account = hashlib.sha1((self.app_id or self.access_token).encode('utf-8')).hexdigest()[:16]
+        return cached_upload(image_path, f"wechat:{account}", self._post_content_image, use_cache=use_cache)
+    
+    def _post_content_image(self, image_path: str) -> dict:
         try:
             url = f"{self.official_api_base}/media/uploadimg?access_token={self.access_token}"
             
@@ -0,0 +1,126 @@
+"""
+内存缓存工具
+线程安全的 LRU 缓存，按条目大小（字节）淘汰，并统计命中/未命中/淘汰次数
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+def content_hash(content) -> str:
+    """内容哈希（str 按 UTF-8 编码）"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+def file_content_hash(path, chunk_size: int = 1024 * 1024) -> str:
+    """文件内容哈希（分块读取，与 content_hash(文件内容) 相同）"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_sizeof(value: Any) -> int:
+    """估算缓存条目大小（字节）"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(default_sizeof(v) for v in value.values()) + 64
+    if isinstance(value, (list, tuple)):
+        return sum(default_sizeof(v) for v in value) + 64
+    return 64
+
+
+class LRUCache:
+    """按总字节数限制容量的 LRU 缓存"""
+    
+    def __init__(self, max_bytes: int, max_entries: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = default_sizeof):
+        """
+        Args:
+            max_bytes: 缓存总大小上限（字节）
+            max_entries: 条目数上限（可选）
+            sizeof: 计算条目大小的函数
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        
+        self._data = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        size = self.sizeof(value) if size is None else size
+        if size > self.max_bytes:
+            return  # 单个条目超过上限，不缓存
+        
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            
+            while self._data and (self._bytes > self.max_bytes or
+                                  (self.max_entries and len(self._data) > self.max_entries)):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+    
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """命中则返回缓存值，否则调用 compute() 计算并写入"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+    
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+    
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> dict:
+        """命中/未命中/淘汰计数及当前占用"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,90 @@
+"""
+流式 multipart/form-data 请求体
+文件部分按块从文件对象读取，请求体不整体放进内存；可直接作为 requests 的 data 参数（带 Content-Length）
+"""
+
+import io
+import os
+import uuid
+import mimetypes
+
+
+class MultipartStream:
+    """
+    multipart/form-data 请求体（类文件对象）
+
+    用法:
+        with open(path, 'rb') as f:
+            body = MultipartStream({"key": api_key}, {"image": (filename, f)})
+            requests.post(url, data=body, headers={"Content-Type": body.content_type})
+    """
+
+    def __init__(self, fields: dict = None, files: dict = None, boundary: str = None):
+        """
+        Args:
+            fields: 普通字段 {名称: 字符串}
+            files: 文件字段 {名称: (文件名, 文件对象[, Content-Type])}，文件对象需支持 seek / tell，从当前位置读到末尾
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self._parts = []  # bytes 或 (文件对象, 字节数)
+
+        for name, value in (fields or {}).items():
+            self._parts.append(self._header(name) + str(value).encode('utf-8') + b'\r\n')
+        for name, (filename, fileobj, *content_type) in (files or {}).items():
+            content_type = content_type[0] if content_type else (
+                mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            start = fileobj.tell()
+            size = fileobj.seek(0, os.SEEK_END) - start
+            fileobj.seek(start)
+            self._parts.append(self._header(name, filename, content_type))
+            self._parts.append((fileobj, size))
+            self._parts.append(b'\r\n')
+        self._parts.append(f'--{self.boundary}--\r\n'.encode('ascii'))
+
+        self._length = sum(len(part) if isinstance(part, bytes) else part[1] for part in self._parts)
+        self._index = 0
+        self._current = None  # 当前部分的读取器
+        self._remaining = 0
+
+    def _header(self, name: str, filename: str = None, content_type: str = None) -> bytes:
+        disposition = f'form-data; name="{_quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{_quote(os.path.basename(filename))}"'
+        header = f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n'
+        if content_type:
+            header += f'Content-Type: {content_type}\r\n'
+        return (header + '\r\n').encode('utf-8')
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _next_part(self) -> bool:
+        if self._index >= len(self._parts):
+            return False
+        part = self._parts[self._index]
+        self._index += 1
+        if isinstance(part, bytes):
+            self._current, self._remaining = io.BytesIO(part), len(part)
+        else:
+            self._current, self._remaining = part
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        """读取最多 size 字节（size < 0 时读取全部，仅用于小请求体）"""
+        chunks = []
+        wanted = self._length if size is None or size < 0 else size
+        while wanted > 0:
+            if self._remaining <= 0 and not self._next_part():
+                break
+            chunk = self._current.read(min(wanted, self._remaining))
+            if not chunk:
+                raise IOError("文件在上传过程中被截断")
+            chunks.append(chunk)
+            self._remaining -= len(chunk)
+            wanted -= len(chunk)
+        return b''.join(chunks)
+
+
+def _quote(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\r', ' ').replace('\n', ' ')
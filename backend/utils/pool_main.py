@@ -0,0 +1,4 @@
+"""
+进程池子进程的入口模块（见 process_pool.SpawnProcessPool）
+子进程以 __mp_main__ 名义导入本模块而不是 app.py，这里不要导入任何东西
+"""
@@ -0,0 +1,32 @@
+"""
+spawn 进程池
+spawn 子进程启动时会按父进程的 __main__ 重新导入入口脚本（python app.py 时即 app.py，
+预热、字体扫描、gc.freeze 会在每个子进程里再执行一遍）。提交任务（按需启动子进程）时
+临时把 __main__ 换成轻量入口模块 backend.utils.pool_main，子进程只导入任务函数所在的模块
+"""
+
+import sys
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from backend.utils import pool_main
+
+# 替换 __main__ 是进程级操作，多个线程同时提交任务时串行执行
+_main_lock = threading.Lock()
+
+
+class SpawnProcessPool(ProcessPoolExecutor):
+    """使用 spawn 启动方式、子进程不导入入口脚本的进程池（任务函数须定义在可导入的模块中）"""
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with _main_lock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = pool_main
+            try:
+                return super().submit(fn, *args, **kwargs)
+            finally:
+                sys.modules['__main__'] = main
@@ -0,0 +1,435 @@
+"""
+转换器性能基准
+用法: python benchmarks/bench_converter.py
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.config import THEMES
+from backend.services import converter
+from backend.services.converter import compile_theme, convert_markdown_to_wechat_html
+
+
+def build_article(target_chars: int = 20000) -> str:
+    """生成包含标题、列表、表格、引用、代码块的测试文章"""
+    parts = ["# 基准测试文章"]
+    i = 0
+    while sum(len(p) for p in parts) < target_chars:
+        parts.append(f"## 第 {i} 节\n\n" + "这是一段用于性能测试的中文正文，包含 **加粗** 和 *斜体* 以及 `行内代码`。" * 4)
+        parts.append("- 要点一\n- 要点二\n- 要点三\n\n1. 步骤一\n2. 步骤二")
+        parts.append("| 指标 | 数值 | 说明 |\n|---|---|---|\n" + "\n".join(f"| m{j} | {j * 7} | 说明{j} |" for j in range(5)))
+        parts.append(f"> 引用第 {i} 段，[链接](https://example.com/{i})")
+        parts.append(f"```python\nprint({i})\n```")
+        i += 1
+    return "\n\n".join(parts)
+
+
+def timeit(fn, repeat: int) -> float:
+    """返回单次调用平均耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+_HEADING_CONFIGS = {
+    1: {'size': 22, 'margin_top': 32, 'margin_bottom': 20, 'weight': 700},
+    2: {'size': 19, 'margin_top': 28, 'margin_bottom': 16, 'weight': 700},
+    3: {'size': 17, 'margin_top': 24, 'margin_bottom': 12, 'weight': 600},
+    4: {'size': 16, 'margin_top': 20, 'margin_bottom': 10, 'weight': 600},
+    5: {'size': 15, 'margin_top': 16, 'margin_bottom': 8, 'weight': 600},
+    6: {'size': 14, 'margin_top': 12, 'margin_bottom': 6, 'weight': 600},
+}
+
+
+def _theme_values(theme: dict) -> dict:
+    """改造前每次转换开头读取一次的主题配置"""
+    heading_style = theme.get('heading_style', 'border-left')
+    return {
+        "primary": theme['primary_color'],
+        "text_color": theme['text_color'],
+        "heading_color": theme['heading_color'],
+        "code_bg": theme.get('code_bg', '#f6f8fa'),
+        "blockquote_bg": theme.get('blockquote_bg', '#f8f9fa'),
+        "blockquote_border": theme.get('blockquote_border', theme['primary_color']),
+        "line_height": theme.get('line_height', 1.85),
+        "letter_spacing": theme.get('letter_spacing', 0.8),
+        "font_size": 16 if heading_style == 'editorial' else 15,
+        "indent": 'text-indent: 2em;' if theme.get('paragraph_indent', False) else '',
+    }
+
+
+def _per_element_style(el, v: dict) -> str:
+    """改造前的做法：每个元素按自己的标签拼接一次 f-string（border-left 标题风格，与 professional 一致）"""
+    name = el.name
+    if name == 'p':
+        return f'''
+            margin: 0 0 1.4em 0;
+            padding: 0;
+            font-size: {v['font_size']}px;
+            line-height: {v['line_height']};
+            color: {v['text_color']};
+            letter-spacing: {v['letter_spacing']}px;
+            word-break: break-word;
+            {v['indent']}
+        '''.strip().replace('\n', ' ').replace('  ', ' ')
+    if name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+        level = int(name[1])
+        cfg = _HEADING_CONFIGS[level]
+        base_style = f'''
+                margin: {cfg['margin_top']}px 0 {cfg['margin_bottom']}px 0;
+                font-size: {cfg['size']}px;
+                font-weight: {cfg['weight']};
+                color: {v['heading_color']};
+                line-height: 1.35;
+                letter-spacing: 0.5px;
+            '''
+        if level <= 2:
+            return (base_style + f'''
+                    padding: 10px 0 10px 14px;
+                    border-left: 3px solid {v['primary']};
+                    background: linear-gradient(90deg, {v['primary']}06 0%, transparent 60%);
+                ''').strip().replace('\n', ' ')
+        return base_style.strip().replace('\n', ' ')
+    if name == 'a':
+        return f'''
+            color: {v['primary']};
+            text-decoration: none;
+            border-bottom: 1px solid {v['primary']}50;
+            transition: all 0.2s;
+        '''.strip().replace('\n', ' ')
+    if name == 'pre':
+        return f'''
+            background: {v['code_bg']};
+            padding: 14px 18px;
+            border-radius: 6px;
+            overflow-x: auto;
+            margin: 18px 0;
+            font-family: 'SF Mono', 'Monaco', 'Menlo', 'Consolas', monospace;
+            font-size: 13px;
+            line-height: 1.55;
+            border: 1px solid {v['primary']}12;
+        '''.strip().replace('\n', ' ')
+    if name == 'code':
+        if el.parent.name == 'pre':
+            return f'color: {v["text_color"]}; font-family: inherit; background: none;'
+        return f'''
+                background: {v['code_bg']};
+                padding: 2px 6px;
+                border-radius: 3px;
+                font-family: 'SF Mono', 'Monaco', monospace;
+                font-size: 13px;
+                color: #d63384;
+            '''.strip().replace('\n', ' ')
+    if name == 'blockquote':
+        return f'''
+                margin: 20px 0;
+                padding: 16px 18px;
+                background: {v['blockquote_bg']};
+                border-left: 3px solid {v['blockquote_border']};
+                border-radius: 0 6px 6px 0;
+            '''.strip().replace('\n', ' ')
+    if name == 'ul':
+        return '''
+            margin: 16px 0;
+            padding-left: 0;
+            list-style: none;
+        '''.strip().replace('\n', ' ')
+    if name == 'ol':
+        return f'''
+            margin: 16px 0;
+            padding-left: 24px;
+            color: {v['text_color']};
+        '''.strip().replace('\n', ' ')
+    if name == 'li':
+        if el.parent.name == 'ul':
+            style = f'''
+                margin: 8px 0;
+                line-height: 1.75;
+                font-size: 15px;
+                color: {v['text_color']};
+                padding-left: 20px;
+                position: relative;
+                letter-spacing: 0.5px;
+            '''.strip().replace('\n', ' ')
+            # 自定义圆点的样式也是每个列表项拼接一次
+            bullet = f'''
+                position: absolute;
+                left: 0;
+                top: 8px;
+                width: 6px;
+                height: 6px;
+                background: {v['primary']};
+                border-radius: 50%;
+            '''.strip().replace('\n', ' ')
+            return style + bullet
+        return f'''
+                margin: 8px 0;
+                line-height: 1.75;
+                font-size: 15px;
+                color: {v['text_color']};
+                letter-spacing: 0.5px;
+            '''.strip().replace('\n', ' ')
+    if name == 'table':
+        return '''
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+            font-size: 14px;
+            border-radius: 6px;
+            overflow: hidden;
+            border: 1px solid #e5e7eb;
+        '''.strip().replace('\n', ' ')
+    if name == 'th':
+        return f'''
+            padding: 10px 14px;
+            background: {v['primary']};
+            color: white;
+            text-align: left;
+            font-weight: 600;
+            font-size: 13px;
+            border: none;
+        '''.strip().replace('\n', ' ')
+    if name == 'tr':
+        bg = 'white'  # 斑马纹按行号二选一，拼接开销相同
+        return f'background: {bg};'
+    if name == 'td':
+        return f'''
+            padding: 10px 14px;
+            border-bottom: 1px solid #e5e7eb;
+            color: {v['text_color']};
+            font-size: 14px;
+            line-height: 1.5;
+        '''.strip().replace('\n', ' ')
+    if name == 'hr':
+        return f'''
+            border: none;
+            height: 1px;
+            background: linear-gradient(90deg, transparent 0%, {v['primary']}25 50%, transparent 100%);
+            margin: 28px 0;
+        '''.strip().replace('\n', ' ')
+    if name in ('strong', 'b'):
+        return f'font-weight: 600; color: {v["heading_color"]};'
+    if name in ('em', 'i'):
+        return f'font-style: italic; color: {v["text_color"]};'
+    return None
+
+
+def bench_style_lookup(article: str, repeat: int = 20):
+    """每个元素的样式开销：逐元素拼接本标签的样式 vs 预编译查表"""
+    from bs4 import BeautifulSoup
+    import markdown
+    
+    html = markdown.Markdown(extensions=['extra', 'tables', 'codehilite', 'toc', 'sane_lists']).convert(
+        converter.preprocess_markdown_tables(article))
+    elements = BeautifulSoup(html, 'html.parser').find_all(True)
+    theme = THEMES["professional"]
+    values = _theme_values(theme)
+    sheet = compile_theme(theme)
+    
+    build = lambda: [_per_element_style(el, values) for el in elements]
+    lookup = lambda: [sheet.get(el.name) for el in elements]
+    
+    # 两种做法各预热一次，再按相同次数计时
+    build()
+    lookup()
+    before = timeit(build, repeat)
+    after = timeit(lookup, repeat)
+    
+    print(f"元素数: {len(elements)}")
+    print(f"  逐元素拼接样式: {before / len(elements) * 1e6:8.2f} µs/元素")
+    print(f"  预编译样式表:   {after / len(elements) * 1e6:8.2f} µs/元素  ({before / after:.1f}x)")
+
+
+def _find_all_reference(soup, sheet) -> None:
+    """改造前的做法：每条样式规则各自 find_all 一遍整棵树（代码高亮与新版一致，只比较遍历方式）"""
+    for p in soup.find_all('p'):
+        p['style'] = sheet['p']
+    for level in range(1, 7):
+        for h in soup.find_all(f'h{level}'):
+            h['style'] = sheet[f'h{level}']
+    for a in soup.find_all('a'):
+        a['style'] = sheet['a']
+    for img in soup.find_all('img'):
+        img['style'] = sheet['img']
+        wrapper = soup.new_tag('section')
+        wrapper['style'] = sheet['img_wrapper']
+        img.wrap(wrapper)
+    for pre in soup.find_all('pre'):
+        pre['style'] = sheet['pre']
+        for code in pre.find_all('code'):
+            code['style'] = sheet['pre_code']
+            converter._highlight_code_block(code, sheet['code_highlight'])
+    for code in soup.find_all('code'):
+        if code.parent.name != 'pre':
+            code['style'] = sheet['code']
+    for blockquote in soup.find_all('blockquote'):
+        blockquote['style'] = sheet['blockquote']
+        quote_ps = blockquote.find_all('p')
+        for p in quote_ps:
+            p['style'] = sheet['blockquote_p']
+        if quote_ps:
+            quote_ps[-1]['style'] = sheet['blockquote_p_last']
+    for ul in soup.find_all('ul'):
+        ul['style'] = sheet['ul']
+    for ol in soup.find_all('ol'):
+        ol['style'] = sheet['ol']
+    for li in soup.find_all('li'):
+        if li.parent.name == 'ul':
+            li['style'] = sheet['ul_li']
+            bullet = soup.new_tag('span')
+            bullet['style'] = sheet['li_bullet']
+            bullet.string = ''
+            li.insert(0, bullet)
+        else:
+            li['style'] = sheet['li']
+    for table in soup.find_all('table'):
+        table['style'] = sheet['table']
+    for th in soup.find_all('th'):
+        th['style'] = sheet['th']
+    for i, tr in enumerate(soup.find_all('tr')):
+        if tr.find('th'):
+            continue
+        tr['style'] = sheet['tr_odd'] if i % 2 == 1 else sheet['tr_even']
+    for td in soup.find_all('td'):
+        td['style'] = sheet['td']
+    for hr in soup.find_all('hr'):
+        hr['style'] = sheet['hr']
+    for strong in soup.find_all(['strong', 'b']):
+        strong['style'] = sheet['strong']
+    for em in soup.find_all(['em', 'i']):
+        em['style'] = sheet['em']
+
+
+def bench_style_walk(article: str, repeat: int = 5):
+    """DOM 样式遍历：逐规则 find_all vs 单次遍历（不含 markdown 解析）"""
+    from bs4 import BeautifulSoup
+    import markdown
+    
+    html = markdown.Markdown(extensions=['extra', 'tables', 'codehilite', 'toc', 'sane_lists'],
+                             extension_configs=converter.MARKDOWN_EXTENSION_CONFIGS).convert(
+        converter.preprocess_markdown_tables(article))
+    sheet = compile_theme("professional")
+    
+    def walk(apply) -> float:
+        # 两种做法都会修改 DOM，各自使用新解析的树
+        soups = [BeautifulSoup(html, 'html.parser') for _ in range(repeat)]
+        start = time.perf_counter()
+        for soup in soups:
+            apply(soup, sheet)
+        return (time.perf_counter() - start) / repeat
+    
+    walk(converter.apply_wechat_styles)  # 预热代码高亮缓存，两种做法都按命中计
+    before = walk(_find_all_reference)
+    after = walk(converter.apply_wechat_styles)
+    print(f"  逐规则 find_all:  {before * 1000:8.2f} ms")
+    print(f"  单次遍历套用样式: {after * 1000:8.2f} ms  ({before / after:.1f}x)")
+
+
+def bench_convert(article: str, repeat: int = 3):
+    """整篇转换耗时（全部主题，不经过缓存）"""
+    for name in THEMES:
+        cost = timeit(lambda: converter._render_wechat_html(article, name), repeat)
+        print(f"  {name:20s} {cost * 1000:8.2f} ms")
+
+
+def bench_batch(article: str):
+    """全部主题：逐个转换 vs 一次解析批量渲染"""
+    start = time.perf_counter()
+    for name in THEMES:
+        converter._render_wechat_html(article, name)
+    separate = time.perf_counter() - start
+    
+    converter._conversion_cache.clear()
+    start = time.perf_counter()
+    converter.convert_markdown_multi_theme(article)
+    batch = time.perf_counter() - start
+    
+    print(f"  {len(THEMES)} 个主题逐个转换: {separate * 1000:8.2f} ms")
+    print(f"  {len(THEMES)} 个主题批量渲染: {batch * 1000:8.2f} ms")
+
+
+def bench_cache_hit(article: str, repeat: int = 1000):
+    """转换缓存命中耗时"""
+    convert_markdown_to_wechat_html(article, "professional")
+    cost = timeit(lambda: convert_markdown_to_wechat_html(article, "professional"), repeat)
+    print(f"  缓存命中: {cost * 1e6:8.2f} µs  {converter.conversion_cache_stats()}")
+
+
+def bench_code_highlight(blocks: int = 40, repeat: int = 3):
+    """代码密集型文章：首次转换 vs 高亮缓存命中后的重复转换（绕过整篇缓存）"""
+    from backend.services import code_highlight
+    
+    snippet = "```python\ndef handler(event, context):\n    items = [x * 2 for x in event['items'] if x > 0]\n    return {'count': len(items), 'items': items}\n```"
+    article = "# 代码示例\n\n" + "\n\n".join(f"第 {i} 段说明。\n\n" + snippet.replace('handler', f'handler_{i}') for i in range(blocks))
+    
+    code_highlight._highlight_cache.clear()
+    cold = timeit(lambda: converter._render_wechat_html(article, "professional"), 1)
+    warm = timeit(lambda: converter._render_wechat_html(article, "professional"), repeat)
+    print(f"{blocks} 个代码块:")
+    print(f"  首次转换:     {cold * 1000:8.2f} ms")
+    print(f"  高亮缓存命中: {warm * 1000:8.2f} ms  {code_highlight.highlight_cache_stats()}")
+
+
+def _multi_pass_reference(md_content: str) -> dict:
+    """改造前的做法：表格预处理、标题、摘要、图片各自扫描一遍全文"""
+    lines = md_content.split('\n')
+    result, table_lines, in_table = [], [], False
+    for line in lines:
+        stripped = line.strip()
+        if stripped and (stripped.startswith('|') or stripped.endswith('|') or re.match(r'^\|?[\s\-:|]+\|?$', stripped)):
+            in_table = True
+            table_lines.append(line)
+        elif in_table:
+            if stripped:
+                result.extend(table_lines + [''])
+                table_lines, in_table = [], False
+                result.append(line)
+        else:
+            result.append(line)
+    normalized = '\n'.join(result + table_lines)
+    
+    lines = md_content.strip().split('\n')
+    start = next((i + 1 for i, line in enumerate(lines) if line.strip().startswith('# ')), 0)
+    remaining = '\n'.join(lines[start:]).strip()
+    
+    text = re.sub(r'!\[.*?\]\(.*?\)', '', remaining)
+    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+    text = re.sub(r'[#*`_~>\-]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()[:120]
+    
+    images = re.findall(r'!\[.*?\]\((.*?)\)', md_content)
+    return {"normalized": normalized, "content": remaining, "summary": text, "images": images}
+
+
+def bench_scan(target_chars: int = 100000, repeat: int = 20):
+    """预处理 + 元数据提取：多次扫描 vs 单次扫描"""
+    article = build_article(target_chars)
+    before = timeit(lambda: _multi_pass_reference(article), repeat)
+    after = timeit(lambda: converter.scan_markdown(article), repeat)
+    print(f"输入 {len(article)} 字符:")
+    print(f"  多次扫描: {before * 1000:8.2f} ms")
+    print(f"  单次扫描: {after * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    article = build_article(20000)
+    print(f"📝 文章长度: {len(article)} 字符")
+    print("=" * 50)
+    bench_style_lookup(article)
+    bench_style_walk(article)
+    print("=" * 50)
+    bench_scan(100000)
+    print("=" * 50)
+    print("整篇转换:")
+    bench_convert(article)
+    bench_cache_hit(article)
+    bench_code_highlight()
+    print("=" * 50)
+    print("多主题:")
+    bench_batch(article)
@@ -0,0 +1,140 @@
+"""
+备用封面性能基准：逐个主题统计每秒可生成的封面数
+用法: python benchmarks/bench_cover.py
+"""
+
+import io
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from backend.config import THEMES
+from backend.services import cover_generator
+from backend.services.cover_generator import COVER_SIZE, fit_cover, render_fallback_cover
+from backend.services.image_encoder import encode_to_budget
+
+TITLE = "备用封面性能基准测试标题"
+
+
+def timeit(fn, repeat: int) -> float:
+    """返回单次调用平均耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def _row_loop_gradient(primary_color: str) -> Image.Image:
+    """改造前的渐变绘制：逐行 draw.line（用于对比）"""
+    width, height = COVER_SIZE
+    primary_rgb = cover_generator._hex_to_rgb(primary_color)
+    img = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(img)
+    for y in range(height):
+        ratio = y / height
+        r = int(primary_rgb[0] * (1 - ratio * 0.5) + 30 * ratio)
+        g = int(primary_rgb[1] * (1 - ratio * 0.5) + 30 * ratio)
+        b = int(primary_rgb[2] * (1 - ratio * 0.5) + 60 * ratio)
+        draw.line([(0, y), (width, y)], fill=(r, g, b))
+    return img
+
+
+def _encode_png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def bench_background(repeat: int = 20):
+    """渐变绘制：逐行画线 vs NumPy 数组运算（不含缓存）"""
+    primary = THEMES["professional"]["primary_color"]
+    rgb = cover_generator._hex_to_rgb(primary)
+    end = (rgb[0] * 0.5 + 30, rgb[1] * 0.5 + 30, rgb[2] * 0.5 + 60)
+
+    before = timeit(lambda: _row_loop_gradient(primary), repeat)
+    vertical = timeit(lambda: cover_generator.gradient_image(COVER_SIZE, rgb, end), repeat)
+    diagonal = timeit(lambda: cover_generator.gradient_image(COVER_SIZE, rgb, end, "diagonal"), repeat)
+    print("渐变绘制:")
+    print(f"  逐行 draw.line:     {before * 1000:8.2f} ms")
+    print(f"  NumPy 垂直渐变:     {vertical * 1000:8.2f} ms")
+    print(f"  NumPy 对角渐变:     {diagonal * 1000:8.2f} ms")
+
+
+def bench_covers(repeat: int = 20):
+    """每个主题每秒生成的封面数：仅渲染 / 渲染 + PNG 编码"""
+    cover_generator._fallback_background.cache_clear()
+    print(f"{'主题':<20}{'首次(ms)':>10}{'渲染/s':>10}{'含编码/s':>10}")
+    totals = [0.0, 0.0]
+    for name in THEMES:
+        first = timeit(lambda: render_fallback_cover(TITLE, name), 1)
+        render = timeit(lambda: render_fallback_cover(TITLE, name), repeat)
+        encode = timeit(lambda: _encode_png(render_fallback_cover(TITLE, name)), max(repeat // 4, 1))
+        totals[0] += render
+        totals[1] += encode
+        print(f"{name:<20}{first * 1000:>10.2f}{1 / render:>10.0f}{1 / encode:>10.0f}")
+    print(f"{'全部主题平均':<16}{'':>10}{len(THEMES) / totals[0]:>10.0f}{len(THEMES) / totals[1]:>10.0f}")
+
+
+def _sample_image(width: int, height: int, fmt: str) -> bytes:
+    """模拟模型返回的大图（渐变 + 噪声，接近照片的压缩率）"""
+    rng = np.random.default_rng(0)
+    ys, xs = np.mgrid[0:height, 0:width]
+    pixels = np.stack([xs * 255 // width, ys * 255 // height, (xs + ys) % 256], axis=-1)
+    pixels = np.clip(pixels + rng.integers(-20, 20, pixels.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, fmt, quality=90)
+    return buffer.getvalue()
+
+
+def _disk_roundtrip(data: bytes, directory: str) -> Image.Image:
+    """改造前：原图写盘 -> 重新打开 -> 全分辨率解码裁剪 -> LANCZOS 缩放 -> 再写盘"""
+    path = os.path.join(directory, 'cover.png')
+    with open(path, 'wb') as f:
+        f.write(data)
+    img = Image.open(path)
+    img = img.crop(cover_generator._crop_box(*img.size)).resize(COVER_SIZE, Image.Resampling.LANCZOS)
+    img.save(path, "PNG")
+    return img
+
+
+def bench_decode(repeat: int = 5):
+    """AI 原图处理：写盘重开全尺寸解码 vs 内存解码（JPEG draft）+ 一次 resize"""
+    print(f"{'原图':<18}{'改造前(ms)':>12}{'改造后(ms)':>12}{'解码像素':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height, fmt in [(2048, 2048, 'JPEG'), (4096, 4096, 'JPEG'), (4096, 1743, 'JPEG'), (2048, 2048, 'PNG')]:
+            data = _sample_image(width, height, fmt)
+            before = timeit(lambda: _disk_roundtrip(data, directory), repeat)
+            after = timeit(lambda: _encode_png(fit_cover(data)[0]), repeat)
+            decoded = fit_cover(data)[1]["decoded_size"]
+            label = f"{width}x{height} {fmt}"
+            print(f"{label:<18}{before * 1000:>12.1f}{after * 1000:>12.1f}"
+                  f"{width * height / 1e6:>7.1f}M -> {decoded[0] * decoded[1] / 1e6:.1f}M")
+
+
+def bench_encode(repeat: int = 3):
+    """封面编码：一律 PNG vs 按预算选择格式和质量"""
+    photo = fit_cover(_sample_image(2048, 2048, 'JPEG'))[0].filter(ImageFilter.GaussianBlur(1.2))
+    samples = [("备用封面", render_fallback_cover(TITLE, "tech")), ("照片类封面", photo)]
+    print(f"{'封面':<12}{'PNG(KB)':>10}{'预算编码(KB)':>14}{'格式':>6}{'质量':>6}{'SSIM':>8}{'耗时(ms)':>10}")
+    for label, img in samples:
+        png = _encode_png(img)
+        encoded = encode_to_budget(img)
+        elapsed = timeit(lambda: encode_to_budget(img), repeat)
+        print(f"{label:<12}{len(png) / 1024:>10.1f}{encoded['bytes'] / 1024:>14.1f}{encoded['format']:>6}"
+              f"{encoded['quality'] or '-':>6}{encoded['ssim']:>8.4f}{elapsed * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    bench_background()
+    print()
+    bench_covers()
+    print()
+    bench_decode()
+    print()
+    bench_encode()
@@ -0,0 +1,67 @@
+"""
+输出体积回归基准：逐个主题统计转换结果的字节数
+用法: python benchmarks/bench_output_size.py [--update]
+
+与 output_size_baseline.json 对比，任一主题体积增长超过阈值时以非零状态退出；
+--update 用当前结果覆盖基线。
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.config import THEMES
+from backend.services import converter
+from bench_converter import build_article
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output_size_baseline.json')
+# 允许的体积增长比例
+TOLERANCE = 0.01
+
+
+def measure(article: str) -> dict:
+    """每个主题：未优化 / 优化后的字节数"""
+    sizes = {}
+    for name in THEMES:
+        raw = converter._render_wechat_html(article, name, optimize=False)
+        optimized = converter._render_wechat_html(article, name)
+        sizes[name] = {"raw": len(raw.encode('utf-8')), "optimized": len(optimized.encode('utf-8'))}
+    return sizes
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--update", action="store_true", help="用当前结果覆盖基线")
+    args = arg_parser.parse_args()
+
+    article = build_article(20000)
+    sizes = measure(article)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print(f"📝 文章长度: {len(article)} 字符")
+    print(f"{'主题':<14}{'未优化':>10}{'优化后':>10}{'节省':>8}{'基线':>10}")
+    regressions = []
+    for name, size in sizes.items():
+        saved = 1 - size["optimized"] / size["raw"]
+        base = baseline.get(name)
+        mark = ''
+        if base and size["optimized"] > base * (1 + TOLERANCE):
+            regressions.append(name)
+            mark = ' ⚠'
+        print(f"{name:<14}{size['raw']:>10}{size['optimized']:>10}{saved:>8.0%}{base or '-':>10}{mark}")
+
+    if args.update:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({name: size["optimized"] for name, size in sizes.items()}, f, indent=2, ensure_ascii=False)
+        print(f"✅ 基线已更新: {BASELINE_PATH}")
+    elif regressions:
+        print(f"❌ 输出体积增长超过 {TOLERANCE:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
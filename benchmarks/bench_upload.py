@@ -0,0 +1,118 @@
+"""
+图片上传内存基准：base64 字符串上传 vs 流式 multipart 上传
+本地起一个模拟 ImgBB 的 HTTP 服务（只读取并丢弃请求体），每种方式在独立子进程里上传 10MB 图片，
+统计 Python 分配峰值（tracemalloc）和进程峰值 RSS 的增长
+用法: python benchmarks/bench_upload.py
+"""
+
+import os
+import sys
+import json
+import base64
+import tempfile
+import threading
+import tracemalloc
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+IMAGE_SIZES_MB = [1, 10]
+
+
+class FakeImgbbHandler(BaseHTTPRequestHandler):
+    """读取并丢弃请求体，返回 ImgBB 格式的成功响应"""
+
+    def do_POST(self):
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 65536)))
+        body = json.dumps({"success": True, "data": {
+            "url": "https://i.ibb.co/x/a.png", "display_url": "https://i.ibb.co/x/a.png",
+            "thumb": {"url": "https://i.ibb.co/x/t.png"}, "expiration": "0"}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _base64_upload(url: str, path: str) -> None:
+    """改造前：整个文件读入内存、base64 编码成字符串后作为表单字段上传"""
+    with open(path, 'rb') as f:
+        image_data = base64.b64encode(f.read()).decode('utf-8')
+    requests.post(url, data={"key": "bench", "image": image_data}, timeout=60).json()
+
+
+def _stream_upload(url: str, path: str) -> None:
+    """改造后：upload_to_imgbb 流式 multipart 上传（跳过上传缓存）"""
+    from backend.services import image_uploader
+    image_uploader.IMGBB_UPLOAD_URL = url
+    result = image_uploader.upload_to_imgbb(path, api_key="bench", use_cache=False)
+    assert result["success"], result["error"]
+
+
+def _rss_kb() -> int:
+    """当前 RSS（KB），读取不到时返回 0"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _measure(method: str, url: str, path: str, queue) -> None:
+    upload = _base64_upload if method == 'base64' else _stream_upload
+    import backend.services.image_uploader  # noqa: F401  导入开销不计入
+    before = _rss_kb()
+    tracemalloc.start()
+    upload(url, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    if sys.platform == 'darwin':
+        peak_rss //= 1024  # macOS 单位是字节
+    queue.put((peak, max(0, peak_rss - before) if before else None))
+
+
+def run(method: str, url: str, path: str) -> tuple:
+    """在新的子进程里上传一次，返回 (Python 分配峰值字节, 峰值 RSS 增长 KB)"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(method, url, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def bench_upload_memory():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeImgbbHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/1/upload"
+
+    print(f"{'图片':<8}{'方式':<10}{'分配峰值(MB)':>14}{'RSS 增长(MB)':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in IMAGE_SIZES_MB:
+            path = os.path.join(directory, f'{size_mb}mb.png')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size_mb * 1024 * 1024))
+            for method in ('base64', 'stream'):
+                peak, rss = run(method, url, path)
+                rss_text = f"{rss / 1024:>14.1f}" if rss is not None else f"{'-':>14}"
+                print(f"{f'{size_mb}MB':<8}{method:<10}{peak / 1024 / 1024:>14.2f}{rss_text}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    bench_upload_memory()
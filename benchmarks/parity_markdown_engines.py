@@ -0,0 +1,111 @@
+"""
+Markdown 渲染后端一致性检查 + 性能对比
+用法: python benchmarks/parity_markdown_engines.py [--engine markdown-it] [--parser lxml]
+
+以 python-markdown + html.parser 为基准，逐篇对比候选后端套用主题后的 HTML，
+并按文档大小报告加速比。
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.services.converter import (
+    _style_tree,
+    parse_html_tree,
+    preprocess_markdown_tables,
+    render_markdown,
+)
+from bench_converter import build_article
+
+# 一致性语料：重点覆盖表格预处理、代码块、嵌套列表
+CORPUS = {
+    "标题与段落": "# 标题\n\n第一段 **加粗** *斜体* `code` [链接](https://example.com)\n\n## 小节\n\n第二段",
+    "表格": "| 名称 | 数值 |\n|------|------|\n| a | 1 |\n| b | 2 |",
+    "表格行间空行": "| 名称 | 数值 |\n\n|------|------|\n\n| a | 1 |\n\n| b | 2 |\n\n表格后的段落",
+    "连续表格": "| a |\n|---|\n| 1 |\n\n文字\n\n| b |\n|---|\n| 2 |\n| 3 |",
+    "围栏代码": "```python\ndef foo():\n    return 1\n```\n\n```\nplain\n```",
+    "缩进代码": "段落\n\n    indented = True\n    print(indented)",
+    "无序列表": "- 一\n- 二\n- 三",
+    "嵌套列表（4 空格）": "- 一\n    - 一.一\n    - 一.二\n- 二\n\n1. 步骤\n    1. 子步骤\n    2. 子步骤",
+    "松散列表": "- 一\n\n- 二\n\n    续行段落\n\n- 三",
+    "引用": "> 引用一\n>\n> 引用二 **重点**\n\n> > 嵌套引用",
+    "图片": "![图](https://example.com/a.png)\n\n文字 ![图2](b.png)",
+    "分割线": "上\n\n---\n\n下",
+    "重复标题": "# 标题\n\n# 标题\n\n## Title\n\n## Title",
+}
+
+VARIANTS = [
+    ("python-markdown", "lxml"),
+    ("markdown-it", "html.parser"),
+    ("markdown-it", "lxml"),
+]
+
+
+def render(md_content: str, engine: str, parser: str, theme: str = "professional") -> str:
+    html_content = render_markdown(preprocess_markdown_tables(md_content), engine=engine)
+    return _style_tree(parse_html_tree(html_content, parser), theme)
+
+
+def normalize(html: str) -> str:
+    """忽略紧邻标签的空白差异（块级标签前后的换行不影响渲染）"""
+    return re.sub(r'\s+(?=<)|(?<=>)\s+', '', html).strip()
+
+
+def first_diff(a: str, b: str, width: int = 80) -> str:
+    i = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+    return f"\n      基准: {a[max(0, i - 20):i + width]!r}\n      候选: {b[max(0, i - 20):i + width]!r}"
+
+
+def check_parity(engine: str, parser: str) -> int:
+    """返回不一致的篇数"""
+    mismatches = 0
+    for name, md_content in CORPUS.items():
+        expected = render(md_content, "python-markdown", "html.parser")
+        actual = render(md_content, engine, parser)
+        if expected == actual:
+            status = "✓ 一致"
+        elif normalize(expected) == normalize(actual):
+            status = "≈ 仅空白不同"
+        else:
+            status = "✗ 不一致" + first_diff(normalize(expected), normalize(actual))
+            mismatches += 1
+        print(f"  {name:16s} {status}")
+    return mismatches
+
+
+def bench_sizes(engine: str, parser: str, repeat: int = 3):
+    for size in (1000, 5000, 20000, 100000):
+        article = build_article(size)
+        timings = []
+        for eng, par in (("python-markdown", "html.parser"), (engine, parser)):
+            render(article, eng, par)  # 预热
+            start = time.perf_counter()
+            for _ in range(repeat):
+                render(article, eng, par)
+            timings.append((time.perf_counter() - start) / repeat)
+        print(f"  {len(article):7d} 字符  基准 {timings[0] * 1000:8.2f} ms  "
+              f"候选 {timings[1] * 1000:8.2f} ms  加速 {timings[0] / timings[1]:5.2f}x")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--engine", help="候选渲染后端，默认检查全部组合")
+    arg_parser.add_argument("--parser", default="html.parser", help="候选 HTML 解析器")
+    args = arg_parser.parse_args()
+    
+    variants = [(args.engine, args.parser)] if args.engine else VARIANTS
+    total = 0
+    for engine, parser in variants:
+        print("=" * 50)
+        print(f"🔍 {engine} + {parser}")
+        total += check_parity(engine, parser)
+        print("⏱️ 按文档大小:")
+        bench_sizes(engine, parser)
+    
+    sys.exit(1 if total else 0)
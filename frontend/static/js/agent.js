@@ -106,6 +106,11 @@ async function doGenerateCover() {
             
             // 显示下一步
             showNextStepOptions('cover');
+            
+            // AI 封面超时先用了备用封面，后台完成后自动替换
+            if (data.fallback && data.job_id) {
+                pollAiCover(data.job_id);
+            }
         } else {
             throw new Error(data.error || '封面生成失败');
         }
@@ -115,6 +120,28 @@ async function doGenerateCover() {
     }
 }
 
+// 轮询后台 AI 封面任务（每 5 秒，最多 3 分钟）
+async function pollAiCover(jobId) {
+    for (let i = 0; i < 36; i++) {
+        await new Promise(resolve => setTimeout(resolve, 5000));
+        let data;
+        try {
+            data = await getCoverJobApi(jobId);
+        } catch (e) {
+            continue;
+        }
+        if (data.status === 'pending') continue;
+        if (data.status === 'done' && data.image_url) {
+            state.coverUrl = data.image_url;
+            addMessage(`
+                <div style="margin-bottom: 8px;">🎨 AI 封面已生成，已替换备用封面</div>
+                <img src="${data.image_url}" style="width: 100%; max-width: 280px; border-radius: 8px;">
+            `);
+        }
+        return;
+    }
+}
+
 function getToolDisplayName(action) {
     const names = {
         'write_article': '写作引擎',
@@ -81,6 +81,11 @@ async function generateCoverApi(title, summary, theme, style) {
     return res.json();
 }
 
+async function getCoverJobApi(jobId) {
+    const res = await apiRequest(`/api/generate-cover/${jobId}`);
+    return res.json();
+}
+
 async function uploadFile(formData) {
     return apiRequest('/api/upload', {
         method: 'POST',
@@ -0,0 +1,44 @@
+"""流式转换器的内存上界"""
+
+from backend.services.block_converter import StreamingConverter
+
+MAX_CHARS = 1024
+
+
+def _buffered(converter):
+    return converter._block_chars + len(converter._partial_line)
+
+
+def test_unclosed_code_fence_is_flushed_in_bounded_blocks():
+    converter = StreamingConverter(max_block_chars=MAX_CHARS)
+    blocks = converter.feed("```python\n")
+    for i in range(2000):
+        blocks += converter.feed(f"line_{i}\n")
+        assert _buffered(converter) <= MAX_CHARS * 2
+    blocks += converter.finish()
+
+    assert len(blocks) > 10
+    html = ''.join(block["html"] for block in blocks)
+    assert 'line_0' in html and 'line_1999' in html
+    # 每块都是完整的代码块，不会把代码当作正文渲染
+    assert all('<pre' in block["html"] for block in blocks)
+
+
+def test_line_without_newline_is_bounded():
+    converter = StreamingConverter(max_block_chars=MAX_CHARS)
+    blocks = []
+    for _ in range(500):
+        blocks += converter.feed("没有换行的长文本" * 10)
+        assert _buffered(converter) <= MAX_CHARS * 2
+    blocks += converter.finish()
+
+    assert len(blocks) > 10
+    assert sum(block["html"].count("没有换行的长文本") for block in blocks) == 5000
+
+
+def test_closed_fence_stays_one_block():
+    converter = StreamingConverter(max_block_chars=MAX_CHARS)
+    blocks = converter.feed("```\ncode\n```\n\n段落\n")
+    blocks += converter.finish()
+
+    assert len(blocks) == 2
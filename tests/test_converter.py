@@ -0,0 +1,31 @@
+"""Markdown 元数据提取"""
+
+import re
+
+from backend.services.converter import extract_summary
+
+
+def _whole_document_summary(md, max_length=120):
+    """改造前的做法：整篇一次性清理"""
+    text = re.sub(r'!\[.*?\]\(.*?\)', '', md)
+    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+    text = re.sub(r'[#*`_~>\-]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text[:max_length] + '...' if len(text) > max_length else text
+
+
+def test_summary_matches_whole_document_cleaning():
+    samples = [
+        "普通 [链接](https://a.example) 文本\n\n![图](a.png) 第二段 **加粗**",
+        "段内换行的 [链接\n文字](https://a.example) 与 ![多行\n图片](b.png)\n\n- 列表 > 引用",
+        "长段落。" * 60,
+    ]
+    for md in samples:
+        assert extract_summary(md) == _whole_document_summary(md)
+
+
+def test_link_spanning_blank_line_keeps_its_syntax():
+    md = "见 [第一行\n\n第二行](https://a.example) 结尾"
+
+    assert _whole_document_summary(md) == "见 第一行 第二行 结尾"
+    assert extract_summary(md) == "见 [第一行 第二行](https://a.example) 结尾"
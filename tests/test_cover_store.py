@@ -0,0 +1,37 @@
+"""临时目录清理：按大小淘汰、排除子目录、上传目录按时间过期"""
+
+import os
+import time
+
+from backend.services.cover_store import enforce_size_limit, remove_expired_files
+
+
+def _write(path, size, age):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_size_limit_skips_excluded_dir_and_recent_files(tmp_path):
+    _write(tmp_path / "cover_old.png", 100, 300)
+    _write(tmp_path / "cover_old.json", 10, 300)
+    _write(tmp_path / "cover_new.png", 100, 10)
+    _write(tmp_path / "normalized" / "norm_a.jpg", 1000, 3600)
+
+    result = enforce_size_limit(tmp_path, 150, exclude=(tmp_path / "normalized",), min_age=60)
+
+    assert result == {"removed": 2, "freed": 110, "bytes": 100}
+    assert (tmp_path / "cover_new.png").exists()
+    assert (tmp_path / "normalized" / "norm_a.jpg").exists()
+
+    # 最近用过的文件即使超出上限也保留
+    assert enforce_size_limit(tmp_path, 50, exclude=(tmp_path / "normalized",), min_age=60)["removed"] == 0
+
+
+def test_expired_uploads_are_removed(tmp_path):
+    _write(tmp_path / "old.png", 10, 25 * 3600)
+    _write(tmp_path / "fresh.png", 10, 3600)
+
+    assert remove_expired_files(tmp_path, 24) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["fresh.png"]
@@ -0,0 +1,48 @@
+"""AI 自定义主题校验"""
+
+import re
+
+from backend.services.converter import convert_markdown_to_wechat_html
+from backend.services.custom_theme import normalize_color, validate_theme
+
+MARKDOWN = "# 标题\n\n## 小节\n\n正文 [链接](https://example.com)\n\n> 引用\n\n---\n\n- 列表\n"
+
+
+def _render(raw):
+    return convert_markdown_to_wechat_html(MARKDOWN, validate_theme(raw))
+
+
+def test_normalize_color():
+    assert normalize_color('#ABC') == '#aabbcc'
+    assert normalize_color('#abcd') == '#aabbcc'
+    assert normalize_color('#11223344') == '#112233'
+    assert normalize_color('rgb(255, 0, 16)') == '#ff0010'
+    assert normalize_color('rgba(100%, 0%, 0%, 0.5)') == '#ff0000'
+    assert normalize_color('red') is None
+    assert normalize_color('#12345') is None
+
+
+def test_short_colors_render_valid_alpha_suffixes():
+    html = _render({"primary_color": "#abc", "secondary_color": "rgba(255,255,255,0.9)", "heading_style": "underline"})
+
+    assert '#abc0' not in html
+    assert '#aabbcc' in html
+    # 主色后拼接透明度后仍是合法的 #rrggbbaa
+    for color in re.findall(r'#aabbcc[0-9a-fA-F]*', html):
+        assert len(color) in (7, 9)
+
+
+def test_double_quoted_font_stays_inside_style_attribute():
+    html = _render({"font_family": '"Noto Serif SC", serif'})
+
+    assert '"Noto Serif SC"' not in html
+    root_style = re.search(r'<section style="([^"]*)"', html).group(1)
+    assert "font-family:'Noto Serif SC',serif" in root_style
+
+
+def test_invalid_values_fall_back_to_base_theme():
+    theme = validate_theme({"primary_color": "url(x)", "font_family": "a;} body{", "line_height": 9})
+
+    assert theme["primary_color"] == validate_theme({})["primary_color"]
+    assert ';' not in theme["font_family"]
+    assert theme["line_height"] == 3.0
@@ -0,0 +1,58 @@
+"""上传前图片规范化"""
+
+import numpy as np
+from PIL import Image, JpegImagePlugin
+
+from backend.services.image_normalizer import normalize_image_file
+
+
+def _photo(width, height):
+    ys, xs = np.mgrid[0:height, 0:width]
+    pixels = np.stack([xs * 255 // width, ys * 255 // height, (xs + ys) % 256], axis=-1)
+    return Image.fromarray(pixels.astype(np.uint8))
+
+
+def test_rotated_jpeg_uses_draft_and_is_upright(tmp_path, monkeypatch):
+    source = tmp_path / "phone.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 顺时针旋转 90°：存储 4000x3000，显示 3000x4000
+    _photo(4000, 3000).save(source, quality=90, exif=exif.tobytes())
+
+    drafts = []
+    original_draft = JpegImagePlugin.JpegImageFile.draft
+
+    def record_draft(img, mode, size):
+        drafts.append(size)
+        return original_draft(img, mode, size)
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, 'draft', record_draft)
+    info = normalize_image_file(str(source), str(tmp_path / "out"), 1080, 8000, 1000 * 1024, 0.985)
+
+    # 摆正后宽 3000 -> 1080，存储方向的请求尺寸为 1440x1080
+    assert drafts == [(1440, 1080)]
+    assert (info["width"], info["height"]) == (1080, 1440)
+    with Image.open(info["path"]) as out:
+        assert out.size == (1080, 1440)
+        assert not out.getexif()
+
+
+def test_palette_png_is_resampled_smoothly(tmp_path):
+    source = tmp_path / "palette.png"
+    _photo(2400, 1200).convert('P', palette=Image.Palette.ADAPTIVE, colors=256).save(source)
+
+    info = normalize_image_file(str(source), str(tmp_path / "out"), 1080, 8000, 1000 * 1024, 0.985)
+
+    with Image.open(info["path"]) as out:
+        assert out.size == (1080, 540)
+        assert out.mode in ('RGB', 'RGBA')
+        # LANCZOS 缩放会产生调色板之外的过渡色；最近邻只会保留原调色板中的颜色
+        assert len(out.convert('RGB').getcolors(1 << 20)) > 256
+
+
+def test_small_clean_png_is_left_unchanged(tmp_path):
+    source = tmp_path / "small.png"
+    Image.new('RGB', (300, 200), 'red').save(source)
+
+    info = normalize_image_file(str(source), str(tmp_path / "out"), 1080, 8000, 1000 * 1024, 0.985)
+
+    assert info["path"] == str(source) and not info["changed"]
@@ -0,0 +1,41 @@
+"""Markdown 图片地址识别与替换"""
+
+from backend.services.image_uploader import find_markdown_images, process_markdown_images
+
+
+def _paths(md):
+    return [image["path"] for image in find_markdown_images(md)]
+
+
+def _fake_upload(path):
+    return {"success": True, "url": "https://img.example/" + path.rsplit('/', 1)[-1].replace(' ', '_'), "error": None}
+
+
+def test_inline_path_with_spaces(tmp_path):
+    (tmp_path / "my image.png").write_bytes(b"a")
+    md = '![s](my image.png) ![t](my image.png "标题")'
+
+    assert _paths(md) == ["my image.png", "my image.png"]
+    processed, results = process_markdown_images(md, str(tmp_path), upload=_fake_upload, host="test")
+    assert processed == '![s](https://img.example/my_image.png) ![t](https://img.example/my_image.png "标题")'
+    assert all(r["success"] for r in results)
+
+
+def test_inline_path_with_parentheses(tmp_path):
+    (tmp_path / "a(1).png").write_bytes(b"a")
+    md = '![p](a(1).png)'
+
+    assert _paths(md) == ["a(1).png"]
+    processed, results = process_markdown_images(md, str(tmp_path), upload=_fake_upload, host="test")
+    assert processed == '![p](https://img.example/a(1).png)'
+    assert results[0]["success"] and not results[0]["skipped"]
+
+
+def test_stray_backtick_does_not_hide_later_paragraphs():
+    md = 'a `stray tick\n\n![x](late.png)\n\nmore ` here'
+    assert _paths(md) == ["late.png"]
+
+
+def test_code_span_and_fence_are_skipped():
+    md = '`![c](c.png)` ![d](d.png)\n\n```\n![e](e.png)\n```\n'
+    assert _paths(md) == ["d.png"]
@@ -0,0 +1,34 @@
+"""spawn 进程池：子进程不重新导入入口脚本"""
+
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCRIPT = '''
+import os, sys
+sys.path.insert(0, {root!r})
+with open({marker!r}, 'a') as f:
+    f.write(f"{{__name__}}\\n")
+
+from backend.utils.process_pool import SpawnProcessPool
+
+if __name__ == '__main__':
+    with SpawnProcessPool(max_workers=2) as pool:
+        print(sorted(pool.map(abs, [-3, -2, -1, 0])))
+'''
+
+
+def test_workers_do_not_reimport_main_script(tmp_path):
+    marker = tmp_path / "imports.txt"
+    script = tmp_path / "entry.py"
+    script.write_text(SCRIPT.format(root=str(ROOT), marker=str(marker)), encoding='utf-8')
+
+    output = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=60,
+                            env={**os.environ, "PYTHONPATH": str(ROOT)})
+
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.strip() == "[0, 1, 2, 3]"
+    assert marker.read_text().split() == ["__main__"]
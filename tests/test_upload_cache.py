@@ -0,0 +1,50 @@
+"""上传缓存：账号隔离与私有字段"""
+
+from backend.services import image_uploader, upload_cache
+from backend.services.wechat_publisher import WeChatPublisher
+
+
+def test_imgbb_cache_is_scoped_per_account_and_drops_delete_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_cache, 'UPLOAD_CACHE_PATH', str(tmp_path / "uploads.sqlite3"))
+    monkeypatch.setattr(upload_cache, '_local', type(upload_cache._local)())
+    image = tmp_path / "a.png"
+    image.write_bytes(b"image")
+
+    posts = []
+
+    def fake_post(path, api_key):
+        posts.append(api_key)
+        return {"success": True, "url": f"https://i.example/{api_key}.png", "display_url": "d",
+                "delete_url": f"https://ibb.example/delete/{api_key}", "error": None}
+
+    monkeypatch.setattr(image_uploader, '_post_to_imgbb', fake_post)
+
+    first = image_uploader.upload_to_imgbb(str(image), api_key="alice")
+    again = image_uploader.upload_to_imgbb(str(image), api_key="alice")
+    other = image_uploader.upload_to_imgbb(str(image), api_key="bob")
+
+    assert first["delete_url"] == "https://ibb.example/delete/alice" and not first["cached"]
+    assert again["cached"] and again["url"] == first["url"]
+    assert "delete_url" not in again
+    assert not other["cached"] and other["url"] == "https://i.example/bob.png"
+    assert posts == ["alice", "bob"]
+
+
+def test_wechat_content_image_cache_is_scoped_per_account(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_cache, 'UPLOAD_CACHE_PATH', str(tmp_path / "uploads.sqlite3"))
+    monkeypatch.setattr(upload_cache, '_local', type(upload_cache._local)())
+    image = tmp_path / "a.png"
+    image.write_bytes(b"image")
+
+    def publisher(app_id):
+        instance = WeChatPublisher(access_token=f"token-{app_id}", auto_token=False, app_id=app_id)
+        instance._post_content_image = lambda path: {"success": True, "url": f"https://mmbiz.example/{app_id}.png",
+                                                     "error": None}
+        return instance
+
+    first = publisher("wx_a").upload_content_image(str(image), normalize=False)
+    again = publisher("wx_a").upload_content_image(str(image), normalize=False)
+    other = publisher("wx_b").upload_content_image(str(image), normalize=False)
+
+    assert not first["cached"] and again["cached"] and again["url"] == first["url"]
+    assert not other["cached"] and other["url"] == "https://mmbiz.example/wx_b.png"